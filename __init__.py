@@ -1 +1,6 @@
 from iso8601 import *
+from timearray import *
+from binary import *
+from timeindex import *
+from bucketing import *
+from intervalset import *
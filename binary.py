@@ -0,0 +1,164 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""A compact, versioned binary encoding of time units and representations.
+
+Every encoded string begins with a version byte. A value is encoded as a
+tree: each representation is a tag byte identifying its class and number of
+elements, followed by the encodings of those elements; each unit is a tag
+byte identifying its class and the kind of its value (none, integer,
+decimal, or fixed-point), followed by the value as one or two
+variable-length integers. Encoding and decoding bypass the usual checks and
+coercions, so decoding is much cheaper than reading a formatted
+representation."""
+
+from decimal import Decimal
+
+from iso8601 import TimeUnit, Year, Month, Week, \
+    Day, DayOfYear, DayOfMonth, DayOfWeek, Hour, Minute, Second, Cardinal, \
+    Years, Months, Weeks, Days, Hours, Minutes, Seconds, Recurrences, \
+    Fixed, TimeRep, CalendarDate, OrdinalDate, WeekDate, UTCOffset, UTC, utc, \
+    Time, DateTime, Duration, WeeksDuration, \
+    TimeInterval, RecurringTimeInterval
+
+__all__ = ["pack", "unpack", "pack_many", "unpack_many"]
+
+VERSION = 1
+
+# The order of these tuples is part of the encoding; append only.
+units = (TimeUnit, Year, Month, Week, Day, DayOfYear, DayOfMonth, DayOfWeek,
+         Hour, Minute, Second, Cardinal, Years, Months, Weeks, Days,
+         Hours, Minutes, Seconds, Recurrences)
+reps = (CalendarDate, OrdinalDate, WeekDate, UTCOffset, UTC, Time, DateTime,
+        Duration, WeeksDuration, TimeInterval, RecurringTimeInterval)
+
+unit_tags = dict((cls, i << 2) for i, cls in enumerate(units))
+rep_tags = dict((cls, 0x80 | i << 3) for i, cls in enumerate(reps))
+
+NONE, INT, DECIMAL, FIXED = range(4) # kinds of unit values
+
+def pack_varint(buf, n):
+    """Append a non-negative integer to buf, 7 bits at a time."""
+    while n > 0x7F:
+        buf.append(0x80 | n & 0x7F)
+        n >>= 7
+    buf.append(n)
+
+def unpack_varint(buf, i):
+    """Return an integer decoded from buf at index i and the next index."""
+    n = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+def zigzag(n):
+    """Map signed integers onto non-negative ones: 0, -1, 1, -2, ..."""
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def unzigzag(n):
+    return -((n + 1) >> 1) if n & 1 else n >> 1
+
+def pack_into(buf, obj):
+    """Append the encoding of a unit or representation to buf."""
+    if isinstance(obj, TimeUnit):
+        tag = unit_tags[type(obj)]
+        value = obj.value
+        if value is None:
+            buf.append(tag | NONE)
+        elif isinstance(value, Decimal):
+            sign, digits, exp = value.as_tuple()
+            if not isinstance(exp, int):
+                raise ValueError("can't pack %r" % obj)
+            coefficient = int("".join(map(str, digits)) or "0")
+            buf.append(tag | DECIMAL)
+            pack_varint(buf, zigzag(-coefficient if sign else coefficient) << 1
+                                 | bool(obj.signed))
+            pack_varint(buf, zigzag(exp))
+        elif isinstance(value, Fixed):
+            buf.append(tag | FIXED)
+            pack_varint(buf, zigzag(value.units) << 1 | bool(obj.signed))
+            pack_varint(buf, value.places)
+        else:
+            buf.append(tag | INT)
+            pack_varint(buf, zigzag(value) << 1 | bool(obj.signed))
+    elif isinstance(obj, UTC):
+        buf.append(rep_tags[UTC]) # always the singleton; no elements
+    elif isinstance(obj, TimeRep):
+        elements = obj.elements
+        buf.append(rep_tags[type(obj)] | len(elements))
+        for elt in elements:
+            pack_into(buf, elt)
+    else:
+        raise TypeError("can't pack %r" % obj)
+
+def unpack_from(buf, i):
+    """Decode a unit or representation from buf at index i. Returns the
+    object and the index of the next byte."""
+    tag = buf[i]
+    i += 1
+    if tag & 0x80:
+        cls = reps[tag >> 3 & 0x0F]
+        if cls is UTC:
+            return utc, i
+        elements = []
+        for n in range(tag & 0x07):
+            elt, i = unpack_from(buf, i)
+            elements.append(elt)
+        obj = cls.from_elements(tuple(elements))
+    else:
+        cls = units[tag >> 2]
+        kind = tag & 0x03
+        if kind == NONE:
+            value, signed = None, None
+        else:
+            n, i = unpack_varint(buf, i)
+            value, signed = unzigzag(n >> 1), True if n & 1 else None
+            if kind == DECIMAL:
+                exp, i = unpack_varint(buf, i)
+                value = Decimal("%dE%d" % (value, unzigzag(exp)))
+            elif kind == FIXED:
+                places, i = unpack_varint(buf, i)
+                value = Fixed(value, places)
+        obj = cls.from_value(value, signed)
+    return obj, i
+
+def check_version(buf):
+    if not buf or buf[0] != VERSION:
+        raise ValueError("unsupported encoding version %r" % \
+                             (buf[0] if buf else None))
+
+def pack(obj):
+    """Encode a time unit or representation as a string of bytes."""
+    buf = bytearray([VERSION])
+    pack_into(buf, obj)
+    return str(buf)
+
+def unpack(data):
+    """Decode a string produced by pack."""
+    buf = bytearray(data)
+    check_version(buf)
+    return unpack_from(buf, 1)[0]
+
+def pack_many(objs):
+    """Encode a sequence of time units and representations as a single
+    string of bytes."""
+    objs = list(objs)
+    buf = bytearray([VERSION])
+    pack_varint(buf, len(objs))
+    for obj in objs:
+        pack_into(buf, obj)
+    return str(buf)
+
+def unpack_many(data):
+    """Decode a string produced by pack_many into a list."""
+    buf = bytearray(data)
+    check_version(buf)
+    n, i = unpack_varint(buf, 1)
+    objs = []
+    for _ in xrange(n):
+        obj, i = unpack_from(buf, i)
+        objs.append(obj)
+    return objs
@@ -0,0 +1,183 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""Truncation of time points to reduced accuracy, and bucketing by accuracy
+or by duration.
+
+Truncating to an accuracy yields the reduced accuracy representation that
+contains the time point: e.g., a DateTime truncated to Month becomes a
+CalendarDate with just a year and month, and one truncated to Hour becomes
+a DateTime whose time has just an hour (and the original offset from UTC).
+Truncation is done in the local time of each time point. Truncating to Week
+yields a WeekDate with just a year and week."""
+
+from itertools import izip
+
+from iso8601 import Year, Month, Week, Day, Hour, Minute, Second, \
+    Date, CalendarDate, WeekDate, Time, DateTime, Duration, \
+    calendar_date, week_date, day_number, floor_divmod
+from timearray import DateTimeArray, LOCAL, ZULU
+
+__all__ = ["truncate", "truncate_all", "bucket", "bucket_all", "count"]
+
+times = (Hour, Minute, Second)
+widths = {Day: 86400, Hour: 3600, Minute: 60, Second: 1} # in seconds
+
+def floor(x):
+    return int(floor_divmod(x, 1)[0])
+
+def truncate(timepoint, accuracy):
+    """Truncate a date or date and time to the given accuracy, which must be
+    one of Year, Month, Week, Day, Hour, Minute, or Second."""
+    if isinstance(timepoint, DateTime):
+        date, time = timepoint.elements
+    elif isinstance(timepoint, Date):
+        date, time = timepoint, None
+    else:
+        raise TypeError("can't truncate %r" % timepoint)
+    if accuracy in times:
+        if time is None:
+            raise ValueError("can't truncate a date to %s" % accuracy.__name__)
+        n = times.index(accuracy) + 1
+        hour, seconds = divmod(floor(time.second_of_day()), 3600)
+        hms = (hour,) + divmod(seconds, 60)
+        return DateTime(date, Time(*(hms[:n] + (None,)*(3 - n) +
+                                     (time.elements[3],))))
+    day = date.epoch_day()
+    if accuracy is Week:
+        return WeekDate(*week_date(day)[:2])
+    elif accuracy in (Year, Month, Day):
+        return CalendarDate(*calendar_date(day)[:(Year, Month, Day).index(
+                    accuracy) + 1])
+    else:
+        raise ValueError("invalid accuracy %r" % accuracy)
+
+def truncate_array(array, accuracy):
+    """Truncate every value in a DateTimeArray without materializing them.
+    Returns a new DateTimeArray."""
+    result = array[:0]
+    scale = array.scale
+    day_width = 86400 * scale
+    monday = -3 * day_width # the first Monday before 1970-01-01
+    for instant, minutes, code in izip(array.instants, array.offsets,
+                                       array.accuracy):
+        shift = 0 if minutes in (LOCAL, ZULU) else minutes * 60 * scale
+        local = instant + shift
+        if accuracy in times:
+            width = widths[accuracy] * scale
+            local -= local % width
+            code = code & ~(3 << 4) | (times.index(accuracy) + 1) << 4
+        elif accuracy is Day:
+            local -= local % day_width
+            code = code & 1 << 6 | 0 | 3 << 2
+        elif accuracy is Week:
+            local -= (local - monday) % (7 * day_width)
+            code = code & 1 << 6 | 2 | 2 << 2
+        elif accuracy in (Year, Month):
+            year, month, day = calendar_date(local // day_width)
+            local = day_number(year, month if accuracy is Month else 1) * \
+                day_width
+            code = code & 1 << 6 | 0 | (2 if accuracy is Month else 1) << 2
+        else:
+            raise ValueError("invalid accuracy %r" % accuracy)
+        result.instants.append(local - shift)
+        result.offsets.append(minutes)
+        result.accuracy.append(code)
+    return result
+
+def truncate_all(timepoints, accuracy):
+    """Truncate each of a sequence of time points. A DateTimeArray yields
+    a new DateTimeArray; any other iterable yields an iterator."""
+    if isinstance(timepoints, DateTimeArray):
+        return truncate_array(timepoints, accuracy)
+    return (truncate(timepoint, accuracy) for timepoint in timepoints)
+
+def fixed_seconds(duration):
+    """Return the length of a duration in seconds, or None if it has years
+    or months, which vary in length."""
+    months, seconds = duration.canonical()
+    if not months:
+        return seconds
+
+def bucket(timepoint, duration, origin):
+    """Return the start of the bucket containing timepoint, where buckets
+    are the given duration long and one of them starts at origin. Both
+    timepoint and origin must be DateTimes, and the result is expressed
+    with the origin's offset from UTC.
+
+    If the duration is a number of years and/or months with no other
+    components, buckets are calendar periods starting at origin + k×duration,
+    as computed by DateTime addition."""
+    width = fixed_seconds(duration)
+    if width:
+        start = origin.epoch_seconds()
+        k = int(floor_divmod(timepoint.epoch_seconds() - start, width)[0])
+        return DateTime.from_epoch_seconds(start + k*width,
+                                           origin.time.utcoffset)
+    n, seconds = duration.canonical()
+    if not n or seconds:
+        raise ValueError("invalid bucket duration %s" % duration)
+    def start(k):
+        return origin + Duration(0, k*n) if k >= 0 else \
+            origin - Duration(0, -k*n)
+    date = timepoint.epoch_day()
+    y0, m0, d0 = calendar_date(origin.epoch_day())
+    y, m, d = calendar_date(date)
+    k = ((y - y0)*12 + m - m0) // n # an estimate; may be off by one
+    instant = timepoint.epoch_seconds()
+    while start(k).epoch_seconds() > instant:
+        k -= 1
+    while start(k + 1).epoch_seconds() <= instant:
+        k += 1
+    return start(k)
+
+def bucket_array(array, duration, origin):
+    """Bucket every value in a DateTimeArray by a fixed-length duration
+    without materializing them. The result is a DateTimeArray of bucket
+    starts in UTC. The duration must be a whole number of the array's units
+    (see DateTimeArray.resolution)."""
+    width = fixed_seconds(duration)
+    if not width:
+        raise ValueError("can't bucket an array by %s" % duration)
+    width, fraction = floor_divmod(width * array.scale, 1)
+    if fraction or width < 1:
+        raise ValueError("can't bucket an array with resolution %r by %s" % \
+                             (array.resolution, duration))
+    width = int(width)
+    start = array.instant(origin)
+    result = array[:0]
+    for instant in array.instants:
+        result.instants.append(instant - (instant - start) % width)
+        result.offsets.append(ZULU)
+        result.accuracy.append(0 | 3 << 2 | 3 << 4)
+    return result
+
+def bucket_all(timepoints, duration, origin):
+    """Bucket each of a sequence of time points; see bucket. A DateTimeArray
+    yields a new DateTimeArray; any other iterable yields an iterator."""
+    if isinstance(timepoints, DateTimeArray):
+        return bucket_array(timepoints, duration, origin)
+    return (bucket(timepoint, duration, origin) for timepoint in timepoints)
+
+def count(timepoints, by, origin=None):
+    """Count the time points in each bucket in a single pass over the input.
+    If origin is None, buckets are the reduced accuracy representations of
+    the given accuracy; otherwise, they are the given duration long and
+    aligned to origin. Returns a list of (bucket, count) pairs in order of
+    the buckets' instants."""
+    buckets = truncate_all(timepoints, by) if origin is None \
+        else bucket_all(timepoints, by, origin)
+    counts = {}
+    if isinstance(buckets, DateTimeArray):
+        for i, instant in enumerate(buckets.instants):
+            try:
+                counts[instant][1] += 1
+            except KeyError:
+                counts[instant] = [i, 1]
+        return [(buckets[i], n) for instant, (i, n) in sorted(counts.items())]
+    for b in buckets:
+        instant = b.epoch_seconds()
+        try:
+            counts[instant][1] += 1
+        except KeyError:
+            counts[instant] = [b, 1]
+    return [(b, n) for instant, (b, n) in sorted(counts.items())]
@@ -0,0 +1,145 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""Sets of time intervals, with union, intersection, and difference.
+
+An IntervalSet resolves each of its time intervals, in any of their forms,
+to a pair of canonical instants (see DateTime.epoch_seconds) once, when the
+set is built, and keeps the pairs sorted and coalesced: no two of them
+overlap or abut. Intervals are half-open, so [a, b) and [b, c) coalesce to
+[a, c). The set operations sweep the sorted boundaries of both operands in
+a single pass, and results are materialized as TimeIntervals only when they
+are iterated over."""
+
+from bisect import bisect_right
+from decimal import Decimal
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+
+from iso8601 import utc, DateTime, TimeInterval, Fixed
+
+__all__ = ["IntervalSet", "coalesce"]
+
+def normalize(spans):
+    """Sort a sequence of (start, end) pairs of instants and coalesce any
+    that overlap or abut. Empty pairs are dropped."""
+    result = []
+    for start, end in sorted(spans):
+        if end < start:
+            raise ValueError("interval ends before it starts")
+        elif end == start:
+            continue
+        elif result and start <= result[-1][1]:
+            if end > result[-1][1]:
+                result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+def boundaries(spans, bit):
+    for start, end in spans:
+        yield start, bit
+        yield end, bit
+
+def sweep(a, b, keep):
+    """Sweep the boundaries of two normalized lists of spans in order,
+    keeping the stretches where keep(in_a, in_b) is true. The result is
+    normalized, too."""
+    result = []
+    state, start = 0, None
+    for instant, events in groupby(merge(boundaries(a, 1), boundaries(b, 2)),
+                                   itemgetter(0)):
+        for _, bit in events:
+            state ^= bit
+        if keep(state & 1, state & 2):
+            if start is None:
+                start = instant
+        elif start is not None:
+            result.append((start, instant))
+            start = None
+    return result
+
+class IntervalSet(object):
+    """A set of instants, given as a union of time intervals.
+
+    The intervals may be given in any form that has end-points (see
+    TimeInterval.endpoints), and those end-points may be dates or date and
+    time values. Intervals that come out of the set are expressed with the
+    given offset from UTC; see DateTime.from_epoch_seconds."""
+
+    def __init__(self, intervals=(), offset=utc):
+        self.offset = offset
+        self.spans = normalize((start.epoch_seconds(), end.epoch_seconds())
+                               for start, end in (interval.endpoints()
+                                                  for interval in intervals))
+
+    @classmethod
+    def from_spans(cls, spans, offset=utc):
+        """Make a set from a normalized list of (start, end) pairs."""
+        obj = cls.__new__(cls)
+        obj.offset = offset
+        obj.spans = spans
+        return obj
+
+    def coerce(self, other):
+        return other.spans if isinstance(other, IntervalSet) \
+            else IntervalSet(other).spans
+
+    def union(self, other):
+        """Return the instants in either set. The other operand may be an
+        IntervalSet or any iterable of time intervals."""
+        return self.from_spans(sweep(self.spans, self.coerce(other),
+                                     lambda x, y: x or y), self.offset)
+
+    def intersection(self, other):
+        """Return the instants in both sets."""
+        return self.from_spans(sweep(self.spans, self.coerce(other),
+                                     lambda x, y: x and y), self.offset)
+
+    def difference(self, other):
+        """Return the instants in this set but not the other."""
+        return self.from_spans(sweep(self.spans, self.coerce(other),
+                                     lambda x, y: x and not y), self.offset)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def __contains__(self, timepoint):
+        """Determine whether a time point or an instant is in the set."""
+        instant = timepoint \
+            if isinstance(timepoint, (int, long, Decimal, Fixed)) \
+            else timepoint.epoch_seconds()
+        i = bisect_right(self.spans, (instant, instant)) - 1
+        if i + 1 < len(self.spans) and self.spans[i + 1][0] == instant:
+            return True
+        return i >= 0 and self.spans[i][1] > instant
+
+    def total_seconds(self):
+        """Return the number of seconds covered by the set."""
+        return sum(end - start for start, end in self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __iter__(self):
+        offset = self.offset
+        for start, end in self.spans:
+            yield TimeInterval(DateTime.from_epoch_seconds(start, offset),
+                               DateTime.from_epoch_seconds(end, offset))
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and self.spans == other.spans
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s([%s])" % (type(self).__name__, ", ".join(map(str, self)))
+
+def coalesce(intervals, offset=utc):
+    """Merge overlapping and abutting time intervals. Returns a list of
+    TimeIntervals in order."""
+    return list(IntervalSet(intervals, offset))
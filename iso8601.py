@@ -5,14 +5,17 @@
 This implementation supports not only the interchange of representations of
 dates and times, but the format representations as well."""
 
+from collections import OrderedDict
 from decimal import Decimal
+from fractions import Fraction, gcd
 from functools import wraps
-from operator import eq, add, sub
+from operator import eq, ne, lt, le, gt, ge, add, sub
+import io
 import re
 
 from slotmerger import SlotMerger
 
-__all__ = ["InvalidTimeUnit",
+__all__ = ["InvalidTimeUnit", "Fixed",
            "Year", "Month", "Week",
            "Day", "DayOfYear", "DayOfMonth", "DayOfWeek",
            "Hour", "Minute", "Second",
@@ -22,7 +25,8 @@ __all__ = ["InvalidTimeUnit",
            "UTCOffset", "UTC", "utc", "Time", "DateTime",
            "Duration", "WeeksDuration",
            "TimeInterval", "RecurringTimeInterval",
-           "StopFormat", "Format"]
+           "StopFormat", "Format", "CachingFormat", "FixedPointFormat",
+           "Transcoder", "LazyDateTime", "sort_key"]
 
 class InvalidTimeUnit(Exception):
     def __init__(self, unit, value):
@@ -37,6 +41,165 @@ class TimeUnitOverflow(OverflowError):
         self.value = value
         self.carry = carry
 
+class Fixed(object):
+    """An exact decimal number with a given number of decimal places, stored
+    as an integer count of units of 10**-places. Time units may have Fixed
+    values as an alternative to Decimals; reading, formatting, and arithmetic
+    on them need only integer operations. Arithmetic keeps the greater number
+    of places of its operands, and an integer quotient is floored."""
+
+    __slots__ = ("units", "places")
+
+    def __init__(self, units, places):
+        self.units = units
+        self.places = places
+
+    def align(self, other):
+        """Return the units of self and other at a common number of places,
+        and that number; or None if other is not an integer or Fixed."""
+        if isinstance(other, Fixed):
+            if other.places > self.places:
+                return (self.units * 10**(other.places - self.places),
+                        other.units, other.places)
+            return (self.units,
+                    other.units * 10**(self.places - other.places), self.places)
+        elif isinstance(other, (int, long)):
+            return self.units, other * 10**self.places, self.places
+
+    def decimal(self):
+        return Decimal(self.units).scaleb(-self.places)
+
+    def __add__(self, other):
+        aligned = self.align(other)
+        if aligned:
+            a, b, places = aligned
+            return Fixed(a + b, places)
+        elif isinstance(other, Decimal):
+            return self.decimal() + other
+        return NotImplemented
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self + -other if isinstance(other, (int, long, Fixed, Decimal)) \
+            else NotImplemented
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        if isinstance(other, (int, long)):
+            return Fixed(self.units * other, self.places)
+        elif isinstance(other, Decimal):
+            return self.decimal() * other
+        return NotImplemented
+    __rmul__ = __mul__
+
+    def __divmod__(self, other):
+        aligned = self.align(other)
+        if aligned:
+            a, b, places = aligned
+            q, r = divmod(a, b)
+            return q, Fixed(r, places)
+        elif isinstance(other, Decimal):
+            return divmod(self.decimal(), other)
+        return NotImplemented
+
+    def __rdivmod__(self, other):
+        if isinstance(other, (int, long)):
+            return divmod(Fixed(other, 0), self)
+        elif isinstance(other, Decimal):
+            return divmod(other, self.decimal())
+        return NotImplemented
+
+    def __floordiv__(self, other):
+        return divmod(self, other)[0]
+
+    def __rfloordiv__(self, other):
+        return divmod(other, self)[0]
+
+    def __mod__(self, other):
+        return divmod(self, other)[1]
+
+    def __rmod__(self, other):
+        return divmod(other, self)[1]
+
+    def __truediv__(self, other):
+        # A true quotient needn't have a finite number of places, so it's
+        # a Decimal, like the result of any operation on Fixed and Decimal.
+        aligned = self.align(other)
+        if aligned:
+            return Decimal(aligned[0]) / aligned[1]
+        elif isinstance(other, Decimal):
+            return self.decimal() / other
+        return NotImplemented
+    __div__ = __truediv__
+
+    def __rtruediv__(self, other):
+        if isinstance(other, (int, long, Decimal)):
+            return other / self.decimal()
+        return NotImplemented
+    __rdiv__ = __rtruediv__
+
+    def __neg__(self):
+        return Fixed(-self.units, self.places)
+
+    def __abs__(self):
+        return Fixed(abs(self.units), self.places)
+
+    def __int__(self):
+        # Truncate toward zero, like int(Decimal).
+        q = abs(self.units) // 10**self.places
+        return -q if self.units < 0 else q
+
+    def __float__(self):
+        return float(self.units) / 10**self.places
+
+    def __nonzero__(self):
+        return self.units != 0
+
+    def compare(self, other, op):
+        aligned = self.align(other)
+        if aligned:
+            return op(aligned[0], aligned[1])
+        elif isinstance(other, Decimal):
+            return op(self.decimal(), other)
+        return NotImplemented
+
+    def __eq__(self, other):
+        return self.compare(other, eq)
+
+    def __ne__(self, other):
+        return self.compare(other, ne)
+
+    def __lt__(self, other):
+        return self.compare(other, lt)
+
+    def __le__(self, other):
+        return self.compare(other, le)
+
+    def __gt__(self, other):
+        return self.compare(other, gt)
+
+    def __ge__(self, other):
+        return self.compare(other, ge)
+
+    def __hash__(self):
+        q, r = divmod(self.units, 10**self.places)
+        return hash(q) if not r else hash(self.decimal())
+
+    def __reduce__(self):
+        return (Fixed, (self.units, self.places))
+
+    def __str__(self):
+        if not self.places:
+            return str(self.units)
+        s = "%0*d" % (self.places + 1, abs(self.units))
+        return ("-" if self.units < 0 else "") + \
+            s[:-self.places] + "." + s[-self.places:]
+
+    def __repr__(self):
+        return "Fixed(%r, %r)" % (self.units, self.places)
+
 class TimeUnit(object):
     """A unit of time."""
 
@@ -44,23 +207,40 @@ class TimeUnit(object):
 
     def __init__(self, value, ordinal=True, signed=None,
                  pattern=re.compile(r"([+-])?([0-9]+)(\.[0-9]+)?")):
-        if value is None or isinstance(value, (int, Decimal)):
-            self.signed = signed
-            self.value = value
+        # Units are immutable, so their attributes are set only here.
+        attrs = self.__dict__
+        if value is None or isinstance(value, (int, Decimal, Fixed)):
+            attrs["signed"] = signed
+            attrs["value"] = value
         elif isinstance(value, basestring):
             m = pattern.match(value)
             if not m:
                 raise InvalidTimeUnit(self, value)
-            self.signed = m.group(1)
-            self.value = (Decimal if m.group(3) else int)(m.group(0))
+            attrs["signed"] = m.group(1)
+            attrs["value"] = (Decimal if m.group(3) else int)(m.group(0))
         elif isinstance(value, TimeUnit):
-            self.signed = value.signed
-            self.value = value.value
+            attrs["signed"] = value.signed
+            attrs["value"] = value.value
         else:
             raise InvalidTimeUnit(self, value)
         if ordinal and not self.isvalid():
             raise InvalidTimeUnit(self, value)
 
+    def __setattr__(self, name, value):
+        raise AttributeError("time units are immutable")
+    __delattr__ = __setattr__
+
+    @classmethod
+    def from_value(cls, value, signed=None):
+        """Make a unit from a value that is already known to be valid: None,
+        an integer, a Decimal, or a Fixed within the unit's range. This
+        bypasses the checks and coercions in __init__."""
+        obj = object.__new__(cls)
+        attrs = obj.__dict__
+        attrs["value"] = value
+        attrs["signed"] = signed
+        return obj
+
     def isvalid(self):
         """Check that an ordinal value is within the valid range."""
         if self.value is None:
@@ -74,16 +254,25 @@ class TimeUnit(object):
             return True
 
     def decimal(self):
-        """Return the value as either an integer or a Decimal."""
+        """Return the value as an integer, a Decimal, or a Fixed."""
         if self.value is None:
             return 0
-        elif isinstance(self.value, (int, Decimal)):
+        elif isinstance(self.value, (int, Decimal, Fixed)):
             return self.value
         else:
             raise TypeError
 
     def merge(self, other):
-        return self or other
+        return merge_pair(self, other)
+
+    @classmethod
+    def merger(cls, other):
+        """Return a function of two arguments that merges an instance of
+        this class with an instance of the other class. The choice depends
+        only on the classes, so it is made once for each pair; see
+        merge_pair. Subclasses extend this the way they would extend an
+        ordinary method."""
+        return lambda self, other: self or other
 
     def __or__(self, other):
         return self.merge(other) or NotImplemented
@@ -101,7 +290,7 @@ class TimeUnit(object):
         u"""Naïve subtraction (does not deal with underflow)."""
         if isinstance(other, type(self)):
             return type(self)(self.value - other.value)
-        elif isinstance(other, (int, Decimal)):
+        elif isinstance(other, (int, Decimal, Fixed)):
             return type(self)(self.value - other)
         else:
             return NotImplemented
@@ -109,7 +298,7 @@ class TimeUnit(object):
     def __eq__(self, other):
         if isinstance(other, type(self)):
             return self.value == other.value
-        elif isinstance(other, (int, Decimal)):
+        elif isinstance(other, (int, Decimal, Fixed)):
             return self.value == other
         else:
             return NotImplemented
@@ -117,7 +306,7 @@ class TimeUnit(object):
     def __ne__(self, other):
         if isinstance(other, type(self)):
             return self.value != other.value
-        elif isinstance(other, (int, Decimal)):
+        elif isinstance(other, (int, Decimal, Fixed)):
             return self.value != other
         else:
             return NotImplemented
@@ -125,13 +314,19 @@ class TimeUnit(object):
     def __lt__(self, other):
         if isinstance(other, type(self)):
             return self.value < other.value
-        elif isinstance(other, (int, Decimal)):
+        elif isinstance(other, (int, Decimal, Fixed)):
             return self.value < other
         else:
             return NotImplemented
 
     def __hash__(self):
-        return self.value
+        # Equal values hash equally, whatever their types.
+        return hash(self.value)
+
+    def __reduce__(self):
+        # Pickle as just the class and the value. Ordinal range checks were
+        # done when the unit was first made, so skip them when unpickling.
+        return (type(self), (self.value, False, self.signed))
 
     def __str__(self):
         return str(self.value)
@@ -144,13 +339,17 @@ unit = TimeUnit(None)
 class Year(TimeUnit):
     range = (0, 9999)
 
-    def merge(self, other):
-        if isinstance(other, Month):
-            return CalendarDate(self, other)
-        elif isinstance(other, Week):
-            return WeekDate(self, other)
-        elif isinstance(other, Day):
-            return OrdinalDate(self, other)
+    @classmethod
+    def merger(cls, other):
+        if issubclass(other, Month):
+            return lambda year, month: CalendarDate.from_elements(
+                (year, month, Day.from_value(None)))
+        elif issubclass(other, Week):
+            return lambda year, week: WeekDate.from_elements(
+                (year, week, Day.from_value(None)))
+        elif issubclass(other, Day):
+            return lambda year, day: OrdinalDate.from_elements((year, day))
+        return lambda self, other: None
 
 class Month(TimeUnit):
     range = (1, 12)
@@ -173,14 +372,22 @@ class DayOfWeek(Day):
 class Hour(TimeUnit):
     range = (0, 24)
 
-    def merge(self, other):
-        if isinstance(other, Minute):
-            if self.signed:
-                return UTCOffset(self, other)
-            else:
-                return Time(self, other)
-        elif isinstance(other, UTCOffset):
-            return Time(self, None, None, other)
+    @classmethod
+    def merger(cls, other):
+        if issubclass(other, Minute):
+            def merge(hour, minute):
+                if hour.signed:
+                    return UTCOffset.from_elements((hour, minute))
+                else:
+                    return Time.from_elements((hour, minute,
+                                               Second.from_value(None),
+                                               UTCOffset.from_ints(None)))
+            return merge
+        elif issubclass(other, UTCOffset):
+            return lambda hour, offset: Time.from_elements(
+                (hour, Minute.from_value(None), Second.from_value(None),
+                 offset))
+        return lambda self, other: None
 
 class Minute(TimeUnit):
     range = (0, 59)
@@ -194,8 +401,10 @@ class Cardinal(TimeUnit):
             raise ValueError("invalid cardinal %r" % value)
         super(Cardinal, self).__init__(value, False, signed)
 
-    def merge(self, other):
-        return Duration() | self | other
+    @classmethod
+    def merger(cls, other):
+        empty = Duration() # immutable, so it can be shared
+        return lambda self, other: empty | self | other
 
     def __add__(self, other):
         if isinstance(other, type(self)):
@@ -203,6 +412,9 @@ class Cardinal(TimeUnit):
         else:
             return self | other
 
+    def __reduce__(self):
+        return (type(self), (self.value, self.signed))
+
 class Years(Cardinal, Year):
     pass
 
@@ -210,8 +422,9 @@ class Months(Cardinal, Month):
     pass
 
 class Weeks(Cardinal, Week):
-    def merge(self, other):
-        return None # weeks don't mix with other elements
+    @classmethod
+    def merger(cls, other):
+        return lambda self, other: None # weeks don't mix with other elements
 
 class Days(Cardinal, Day):
     pass
@@ -226,13 +439,27 @@ class Seconds(Cardinal, Second):
     pass
 
 class Recurrences(Cardinal):
-    def merge(self, other):
-        return RecurringTimeInterval(self, other)
+    @classmethod
+    def merger(cls, other):
+        return lambda self, other: RecurringTimeInterval(self, other)
 
 def ensure_class(obj, cls):
     """Ensure that obj is an instance of cls. If cls is None, skip the check."""
     return obj if cls is None or isinstance(obj, cls) else cls(obj)
 
+mergers = {} # (left class, right class) → merge function; see merge_pair
+
+def merge_pair(left, right):
+    """Merge two units or representations, as left.merge(right) does. The
+    merge function for each pair of classes is found once, by asking the
+    left class (see TimeUnit.merger), and then looked up in a table."""
+    try:
+        merge = mergers[type(left), type(right)]
+    except KeyError:
+        merge = mergers[type(left), type(right)] = \
+            type(left).merger(type(right))
+    return merge(left, right)
+
 def units(*units):
     """A decorator factory for methods that that need to ensure their arguments
     have the correct units."""
@@ -243,11 +470,70 @@ def units(*units):
         return wrapper
     return ensure_arg_units
 
+class SyntaxTable(dict):
+    """An immutable mapping from characters in a format representation to
+    their meanings in some syntax."""
+
+    def immutable(self, *args, **kwargs):
+        raise TypeError("syntax tables are immutable")
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = \
+        immutable
+
+class Syntax(SlotMerger):
+    """The metaclass of time representations. The merged digits, designators,
+    and separators slots of each class define the syntax of format
+    representations of that class, from which the metaclass derives lookup
+    tables for the format representation parser."""
+
+    def __init__(cls, name, bases, dict):
+        super(Syntax, cls).__init__(name, bases, dict)
+        cls.syntax_tables = {}
+
+    def table(cls, outer=()):
+        """Return the syntax table for this class nested inside the given
+        tuple of outer syntax classes. It maps each character to a triple
+        (fop, unit, state): a designator or separator maps to its fop, a
+        digit to its unit class; and state is the tuple of syntax classes
+        in effect after the character.
+
+        Tables are built on first use, since some designators are added
+        after their classes are defined; the slots must not change after
+        that."""
+        try:
+            return cls.syntax_tables[outer]
+        except KeyError:
+            pass
+        state = outer + (cls,)
+        table = dict((char, (None, unit, state))
+                     for char, unit in cls.digits.items())
+        for level, syntax in enumerate(state): # inner separators win
+            for char, hard in syntax.separators.items():
+                table[char] = ((HardSeparator if hard else Separator)(char),
+                               None, state[:level+1])
+        for char, designate in cls.designators.items():
+            if designate is utc:
+                # Special case: UTC designator.
+                table[char] = (Z, None, state)
+            elif designate and issubclass(designate, TimeUnit):
+                # Postfix designator: coerce the last element.
+                table[char] = (Coerce(char, designate), None, state)
+            else:
+                # Prefix designator: possibly change syntax class.
+                table[char] = (PrefixDesignator(char, designate), None,
+                               state + (designate,) if designate else state)
+        table = cls.syntax_tables[outer] = SyntaxTable(table)
+        return table
+
 class TimeRep(object):
     """Base class for the representations of time points, durations, intervals,
-    and recurring intervals."""
+    and recurring intervals.
+
+    Representations are immutable values: their elements are a tuple of time
+    units and nested representations, which may not be replaced. They may
+    therefore be hashed, e.g., for use as dictionary keys or set members;
+    the hash is computed once, on demand."""
 
-    __metaclass__ = SlotMerger
+    __metaclass__ = Syntax
     __mergeslots__ = ["digits", "designators", "separators"]
 
     digits = {}
@@ -267,38 +553,58 @@ class TimeRep(object):
                     raise ValueError("invalid date/time accuracy reduction")
             else:
                 omitted = not elt
-        self.elements = list(elements + unchecked)
+        self.__dict__["elements"] = tuple(elements) + tuple(unchecked)
+
+    @classmethod
+    def from_elements(cls, elements):
+        """Make a representation from a tuple of elements. This bypasses the
+        __init__ method, which performs checks and coercions that must
+        already have been done, and is therefore significantly faster than
+        the naïve (but correct) cls(*elements). The critical assumption here
+        is that the only thing that matters is the elements tuple; should
+        that ever change, this will not work. (It also skips Date.__new__,
+        which looks only at the arguments to the constructor.)"""
+        obj = object.__new__(cls)
+        obj.__dict__["elements"] = elements
+        return obj
 
     def copy(self):
-        # Making a copy this way lets us bypass calling the __init__ method,
-        # which performs checks and coercions that have already been done.
-        # It's therefore significantly faster than the naïve (but correct):
-        #     return type(self)(*self.elements)
-        # The critical assumption here is that the only thing that matters is
-        # the elements list; should that ever change, this will not work.
-        obj = self.__new__(type(self))
-        obj.elements = self.elements[:]
-        return obj
+        return self.from_elements(self.elements)
 
     def merge(self, other):
-        merged = self.copy()
-        if isinstance(other, type(self)):
-            for i, elt in enumerate(merged.elements):
-                merged.elements[i] = merged.elements[i] if elt \
-                                                        else other.elements[i]
-            return merged
+        return merge_pair(self, other)
+
+    @classmethod
+    def merger(cls, other):
+        """See TimeUnit.merger. By default, a representation merges with
+        another of its own class by filling in its omitted elements, and
+        with anything else by putting it in the first element slot of its
+        class, zeroing any omitted elements before it."""
+        if issubclass(other, cls):
+            def merge(self, other):
+                elements = list(self.elements)
+                for i, elt in enumerate(elements):
+                    elements[i] = elt if elt else other.elements[i]
+                return self.from_elements(tuple(elements))
         else:
-            for i, elt in enumerate(self.elements):
-                if isinstance(other, type(elt)):
-                    merged.elements[i] = other
-                    return merged
-                elif not(merged.elements[i]):
-                    merged.elements[i] = type(merged.elements[i])(0)
+            def merge(self, other):
+                elements = list(self.elements)
+                for i, elt in enumerate(self.elements):
+                    if isinstance(other, type(elt)):
+                        elements[i] = other
+                        return self.from_elements(tuple(elements))
+                    elif not elt:
+                        elements[i] = type(elt)(0)
+        return merge
 
     def __or__(self, other):
         return self.merge(other) or NotImplemented
 
     def __getattr__(self, name):
+        if name.startswith("__") or name == "elements":
+            # Special method lookups (e.g., by pickle and copy) and lookups
+            # on uninitialized instances must not search the elements.
+            raise AttributeError(name)
         for elt in self.elements:
             if any(c.__name__.lower() == name for c in type(elt).__mro__):
                 return elt
@@ -323,8 +629,35 @@ class TimeRep(object):
                 yield elt
 
     def __eq__(self, other):
+        if not isinstance(other, TimeRep):
+            return NotImplemented
         return all(map(eq, self, other))
 
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        # Equal representations have pairwise equal units (see __eq__), and
+        # equal units hash equally.
+        try:
+            return self.__dict__["hash"]
+        except KeyError:
+            h = self.__dict__["hash"] = hash(tuple(self))
+            return h
+
+    def __setattr__(self, name, value):
+        raise AttributeError("time representations are immutable")
+    __delattr__ = __setattr__
+
+    def __reduce__(self):
+        # Pickle as the class and the element values, which the constructor
+        # will coerce back into units. Nested representations pickle
+        # themselves the same way.
+        return (type(self), tuple(elt.value if isinstance(elt, TimeUnit)
+                                           else elt
+                                  for elt in self.elements))
+
     def __str__(self):
         if hasattr(self, "stdformat"):
             # Lazily build the format object and cache it in the class.
@@ -356,11 +689,17 @@ class Date(TimePoint):
             # Subclass constructor; don't bother groveling through the args.
             return super(Date, cls).__new__(cls)
 
-    def merge(self, other):
-        if isinstance(other, Time):
-            return DateTime(self, other)
+    @classmethod
+    def merger(cls, other):
+        if issubclass(other, Time):
+            return lambda date, time: DateTime.from_elements((date, time))
         else:
-            return super(Date, self).merge(other)
+            return super(Date, cls).merger(other)
+
+    def epoch_seconds(self):
+        """Return the number of seconds from 1970-01-01T00:00:00Z to the
+        beginning of this date."""
+        return self.epoch_day()*86400
 
 def leap_year(year):
     """Determine if year is a leap year, assuming the proleptic Gregorian
@@ -368,19 +707,105 @@ def leap_year(year):
     return (year % 400 == 0) or (year % 4 == 0 and year % 100 != 0)
 
 def days_in_month(year, month,
-                  days=((31, 28, 31, 30, 31, 30, 30, 31, 30, 31, 30, 31),
-                        (31, 29, 31, 30, 31, 30, 30, 31, 30, 31, 30, 31))):
+                  days=((31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
+                        (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31))):
     """Return the number of days in the given month, assuming the proleptic
     Gregorian calendar. Months are numbered starting with 1."""
     if not 1 <= month <= 12:
         raise IndexError("invalid month %d" % month)
     return days[leap_year(year)][month-1]
 
+def weeks_in_year(year):
+    """Return the number of weeks (52 or 53) in the given ISO week-numbering
+    year, assuming the proleptic Gregorian calendar. A year has 53 weeks if
+    and only if it begins or ends on a Thursday."""
+    def dec31(y):
+        return (y + y//4 - y//100 + y//400) % 7 # day of week of 31 December
+    return 53 if dec31(year) == 4 or dec31(year-1) == 3 else 52
+
+def day_number(year, month=1, day=1):
+    """Return the number of days from 1970-01-01 to the given date in the
+    proleptic Gregorian calendar; negative for earlier dates. The arguments
+    may also be NumPy integer arrays, in which case so is the result."""
+    # This is the days_from_civil algorithm from H. Hinnant, "chrono-
+    # Compatible Low-Level Date Algorithms". Its years begin in March, so
+    # that the leap day comes at the end.
+    year = year - (month <= 2)
+    era, yoe = divmod(year, 400)
+    doy = (153*((month + 9) % 12) + 2)//5 + day - 1
+    doe = yoe*365 + yoe//4 - yoe//100 + doy
+    return era*146097 + doe - 719468
+
+def calendar_date(n):
+    """Return the (year, month, day) that is n days after 1970-01-01;
+    the inverse of day_number."""
+    era, doe = divmod(n + 719468, 146097)
+    yoe = (doe - doe//1460 + doe//36524 - doe//146096) // 365
+    doy = doe - (yoe*365 + yoe//4 - yoe//100)
+    mp = (5*doy + 2) // 153
+    day = doy - (153*mp + 2)//5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    return era*400 + yoe + (month <= 2), month, day
+
+def week_day_number(year, week=1, day=1):
+    """Return the number of days from 1970-01-01 to the given week date."""
+    jan4 = day_number(year, 1, 4) # always in week 1
+    return jan4 - (jan4 + 3) % 7 + (week - 1)*7 + (day - 1)
+
+def week_date(n):
+    """Return the (year, week, day) of the week date that is n days after
+    1970-01-01; the inverse of week_day_number."""
+    day = (n + 3) % 7 + 1 # 1970-01-01 was a Thursday
+    thursday = n - day + 4 # the week belongs to the year of its Thursday
+    year = calendar_date(thursday)[0]
+    return year, (thursday - day_number(year))//7 + 1, day
+
+def floor_divmod(a, b):
+    """Like divmod, but floors the quotient of Decimals as well as integers;
+    divmod truncates Decimal quotients toward zero."""
+    q, r = divmod(a, b)
+    if r and (r < 0) != (b < 0):
+        q, r = q - 1, r + b
+    return q, r
+
 def divmod_1(a, b):
     """Like divmod, but for 1-indexed values (e.g., month and day numbers)."""
     q, r = divmod(a-1, b)
     return q, r+1
 
+def add_months(n, months):
+    """Return the day number of the date that is the given number of months
+    after (or before) the date n days after 1970-01-01, clipping the day of
+    the month as in CalendarDate.add_sub."""
+    year, month, day = calendar_date(n)
+    carry, month = divmod(month - 1 + months, 12)
+    year += carry
+    return day_number(year, month + 1,
+                      min(day, days_in_month(year, month + 1)))
+
+month_starts = [] # (day number, length) of every month in 800 years
+month_spans = {} # least and greatest spans, by number of months
+
+def month_span(months):
+    """Return the least and greatest number of days from any date to the
+    date the given positive number of months later (see add_months). The
+    Gregorian calendar repeats every 400 years, or 4800 months, so there
+    are only that many starting months to consider."""
+    cycles, months = divmod(months, 4800)
+    if months not in month_spans:
+        if not month_starts:
+            month_starts.extend((day_number(2000 + y, m),
+                                 days_in_month(2000 + y, m))
+                                for y in range(800) for m in range(1, 13))
+        spans = [end + min(day, end_length) - start - min(day, start_length)
+                 for (start, start_length), (end, end_length)
+                     in zip(month_starts[:4800],
+                            month_starts[months:months+4800])
+                 for day in (28, 29, 30, 31)]
+        month_spans[months] = (min(spans), max(spans))
+    least, greatest = month_spans[months]
+    return cycles*146097 + least, cycles*146097 + greatest
+
 class CalendarDate(Date):
     digits = {"Y": Year, "M": Month, "D": DayOfMonth}
     stdformat = "YYYY-MM-DD"
@@ -389,26 +814,51 @@ class CalendarDate(Date):
     def __init__(self, *args):
         TimeRep.__init__(self, args)
 
+    @classmethod
+    def from_ints(cls, year, month=None, day=None):
+        """Make a calendar date from integers that are already known to be
+        a valid date, bypassing the checks and coercions in __init__."""
+        return cls.from_elements((Year.from_value(year),
+                                  Month.from_value(month),
+                                  Day.from_value(day)))
+
+    def epoch_day(self):
+        """Return the number of days from 1970-01-01 to this date. Omitted
+        components are taken to be the first of their kind."""
+        year, month, day = self.elements
+        return day_number(int(year), int(month) or 1, int(day) or 1)
+
     def __add__(self, other):
         return self.add_sub(other, add)
 
     def __sub__(self, other):
+        if isinstance(other, Date) and not isinstance(other, DateTime):
+            # The difference between two dates is a number of days.
+            days = self.epoch_day() - other.epoch_day()
+            if days < 0:
+                raise ValueError("negative duration %s days" % days)
+            return Duration.from_values(0, 0, days)
         return self.add_sub(other, sub)
 
-    def add_sub(self, other, op):
-        """Common subroutine for addition and subtraction."""
-        if not isinstance(other, Duration):
+    def add_sub(self, other, op, days=0):
+        """Common subroutine for addition and subtraction. The days argument
+        is a number of days to add or subtract in addition to those of the
+        duration; e.g., a carry from the time of day."""
+        if not isinstance(other, Duration) or isinstance(other, WeeksDuration):
             return NotImplemented
-        year = op(int(self.year), int(other.years))
-        if self.month:
-            carry, month = divmod_1(op(int(self.month), int(other.months)), 12)
+        year, month, day = self.elements
+        year = op(int(year), int(other.elements[0]))
+        Year(year) # the only component that can go out of range
+        if month:
+            carry, month = divmod_1(op(int(month), int(other.elements[1])), 12)
             year += carry
+            Year(year)
         else:
-            return CalendarDate(year)
-        if self.day:
+            return CalendarDate.from_ints(year)
+        if day:
             # Before we add in the days, we clip to the number of days in the
             # month & year calculated so far.
-            day = min(int(self.day), days_in_month(year, month))
+            day = min(int(day), days_in_month(year, month))
 
             # Now add or subtract the days. We can't just use divmod here,
             # since the number of days/month varies with month. It's also
@@ -416,7 +866,7 @@ class CalendarDate(Date):
             # itself: during subtraction, we need to decrement the month
             # before determining how many days are in the "current" month,
             # while addition needs to go in the other order.
-            day = op(day, int(other.days))
+            day = op(day, int(other.elements[2]) + days)
             while day > days_in_month(year, month) or day < 1:
                 if day < 1:
                     carry, month = divmod_1(month - 1, 12)
@@ -425,9 +875,10 @@ class CalendarDate(Date):
                     day -= days_in_month(year, month)
                     carry, month = divmod_1(month + 1, 12)
                 year += carry
+            Year(year)
         else:
-            return CalendarDate(year, month)
-        return CalendarDate(year, month, day)
+            return CalendarDate.from_ints(year, month)
+        return CalendarDate.from_ints(year, month, day)
 
 class OrdinalDate(Date):
     digits = {"Y": Year, "D": DayOfYear}
@@ -437,6 +888,15 @@ class OrdinalDate(Date):
     def __init__(self, *args):
         TimeRep.__init__(self, args)
 
+    @classmethod
+    def from_ints(cls, year, day=None):
+        """See CalendarDate.from_ints."""
+        return cls.from_elements((Year.from_value(year), Day.from_value(day)))
+
+    def epoch_day(self):
+        year, day = self.elements
+        return day_number(int(year)) + (int(day) or 1) - 1
+
 class WeekDate(Date):
     digits = {"Y": Year, "w": Week, "D": DayOfWeek}
     stdformat = "YYYY-Www-D"
@@ -445,6 +905,16 @@ class WeekDate(Date):
     def __init__(self, *args):
         TimeRep.__init__(self, args)
 
+    @classmethod
+    def from_ints(cls, year, week=None, day=None):
+        """See CalendarDate.from_ints."""
+        return cls.from_elements((Year.from_value(year), Week.from_value(week),
+                                  Day.from_value(day)))
+
+    def epoch_day(self):
+        year, week, day = self.elements
+        return week_day_number(int(year), int(week) or 1, int(day) or 1)
+
 class UTCOffset(TimePoint):
     digits = {"h": Hour, "m": Minute}
     stdformat = u"±hh:mm"
@@ -453,12 +923,27 @@ class UTCOffset(TimePoint):
     def __init__(self, hour=0, minute=None):
         TimeRep.__init__(self, (hour, minute))
 
+    @classmethod
+    def from_ints(cls, hour, minute=None):
+        """See CalendarDate.from_ints."""
+        return cls.from_elements((Hour.from_value(hour),
+                                  Minute.from_value(minute)))
+
+    def total_seconds(self):
+        """Return the signed offset from UTC in seconds."""
+        hour, minute = self.elements
+        seconds = abs(hour.decimal())*3600 + minute.decimal()*60
+        return -seconds if hour.decimal() < 0 else seconds
+
 class UTC(UTCOffset):
     stdformat = "Z"
 
     def __init__(self):
         TimeRep.__init__(self, (0, 0))
 
+    def __reduce__(self):
+        return "utc" # the singleton
+
 utc = UTC()
 
 class Time(TimePoint):
@@ -476,20 +961,53 @@ class Time(TimePoint):
         # These attribute assignments are purely for optimization purposes:
         # they speed up a common merge case by bypassing the (expensive) calls
         # to __getattr__.
-        self.hour = hour
-        self.minute = minute
-        self.second = second
-        self.utcoffset = offset
+        self.__dict__.update(hour=hour, minute=minute, second=second,
+                             utcoffset=offset)
+
+    @classmethod
+    def from_elements(cls, elements):
+        obj = object.__new__(cls)
+        hour, minute, second, offset = elements
+        obj.__dict__.update(elements=elements, hour=hour, minute=minute,
+                            second=second, utcoffset=offset)
+        return obj
 
-    def merge(self, other):
-        if isinstance(other, Hour) and other.signed:
-            return Time(self.hour, self.minute, self.second, UTCOffset(other))
-        elif isinstance(other, UTCOffset):
+    @classmethod
+    def from_values(cls, hour=None, minute=None, second=None, offset=None):
+        """Make a time from values that are already known to be valid (see
+        TimeUnit.from_value) and a UTCOffset or None, bypassing the checks
+        and coercions in __init__."""
+        return cls.from_elements((Hour.from_value(hour),
+                                  Minute.from_value(minute),
+                                  Second.from_value(second),
+                                  offset if offset is not None
+                                         else UTCOffset.from_ints(None)))
+
+    @classmethod
+    def merger(cls, other):
+        default = super(Time, cls).merger(other)
+        if issubclass(other, Hour):
+            def merge(time, hour):
+                if hour.signed:
+                    return time.from_elements(time.elements[:3] +
+                                              (UTCOffset.from_elements(
+                                                  (hour,
+                                                   Minute.from_value(None))),))
+                return default(time, hour)
+            return merge
+        elif issubclass(other, UTCOffset):
             # We need to handle this case specially so that we don't
             # accidentally zero elided low-order components.
-            return Time(self.hour, self.minute, self.second, other)
+            return lambda time, offset: time.from_elements(time.elements[:3] +
+                                                           (offset,))
         else:
-            return super(Time, self).merge(other)
+            return default
+
+    def second_of_day(self):
+        """Return the number of seconds since midnight, local time, as an
+        integer or a Decimal. Omitted components are taken to be zero."""
+        hour, minute, second = self.elements[:3]
+        return hour.decimal()*3600 + minute.decimal()*60 + second.decimal()
 
     def __add__(self, other):
         return self.add_sub(other, add)
@@ -499,25 +1017,38 @@ class Time(TimePoint):
 
     def add_sub(self, other, op):
         """Common subroutine for addition and subtraction."""
-        if not isinstance(other, Duration):
+        if not isinstance(other, Duration) or isinstance(other, WeeksDuration):
             return NotImplemented
-        elements = []
-        carry = 0
-        for x, y, m in zip((self.second, self.minute, self.hour),
-                           (other.seconds, other.minutes, other.hours),
-                           (60, 60, 24)):
-            assert isinstance(y, type(x)), "type mismatch"
-            if x:
-                carry, z = divmod(op(x.decimal(), y.decimal()) + carry, m)
-            else:
-                carry, z = 0, None
-            elements.append(z)
-        elements.reverse()
-        sum = Time(*(elements + [self.utcoffset]))
+        sum, carry = self.add_sub_carry(other, op)
         if carry:
             raise TimeUnitOverflow(sum, carry)
         return sum
 
+    def add_sub_carry(self, other, op):
+        """Add or subtract the time components of a duration, propagating
+        carries from seconds to minutes to hours in a single pass. Returns
+        the resulting time and the carry (a number of days) out of the hours,
+        rather than raising an exception on overflow."""
+        hour, minute, second, offset = self.elements
+        years, months, days, hours, minutes, seconds = other.elements
+        carry = 0
+        if second:
+            carry, second = floor_divmod(op(second.decimal(),
+                                            seconds.decimal()), 60)
+        else:
+            second = None
+        if minute:
+            carry, minute = floor_divmod(op(minute.decimal(),
+                                            minutes.decimal()) + carry, 60)
+        else:
+            minute, carry = None, 0
+        if hour:
+            carry, hour = floor_divmod(op(hour.decimal(),
+                                          hours.decimal()) + carry, 24)
+        else:
+            hour, carry = None, 0
+        return Time.from_values(hour, minute, second, offset), carry
+
     def __str__(self):
         return (super(Time, self).__str__() +
                 str(self.utcoffset) if self.utcoffset else "")
@@ -529,36 +1060,76 @@ class DateTime(Date, Time):
     def __init__(self, date, time):
         TimeRep.__init__(self, (date, time))
         # Purely an optimization; see note in Time.__init__, above.
-        self.date = date
-        self.time = time
+        self.__dict__.update(date=date, time=time)
 
-    def merge(self, other):
-        if isinstance(other, (Hour, Minute, Second, UTCOffset)):
-            return DateTime(self.date, self.time.merge(other))
-        elif isinstance(other, (DateTime, Duration)):
-            return TimeInterval(self, other)
+    @classmethod
+    def from_elements(cls, elements):
+        obj = object.__new__(cls)
+        obj.__dict__.update(elements=elements, date=elements[0],
+                            time=elements[1])
+        return obj
+
+    @classmethod
+    def merger(cls, other):
+        if issubclass(other, (Hour, Minute, Second, UTCOffset)):
+            return lambda self, other: DateTime.from_elements(
+                (self.date, merge_pair(self.time, other)))
+        elif issubclass(other, (DateTime, Duration)):
+            return lambda self, other: TimeInterval(self, other)
         else:
-            return super(DateTime, self).merge(other)
+            return super(DateTime, cls).merger(other)
 
     def __add__(self, other):
         return self.add_sub(other, add)
 
     def __sub__(self, other):
+        if isinstance(other, DateTime) and not isinstance(other, TimeInterval):
+            # The difference between two date-times is the elapsed time
+            # between their UTC-normalized instants.
+            return Duration.from_seconds(self.epoch_seconds() -
+                                         other.epoch_seconds())
         return self.add_sub(other, sub)
 
+    def epoch_day(self):
+        return self.date.epoch_day()
+
+    def second_of_day(self):
+        return self.time.second_of_day()
+
+    def epoch_seconds(self):
+        """Return the number of seconds since 1970-01-01T00:00:00Z, as an
+        integer or a Decimal. A local time is treated as though it were UTC."""
+        time = self.time
+        offset = time.utcoffset
+        return (self.date.epoch_day()*86400 + time.second_of_day() -
+                (offset.total_seconds() if offset.elements[0] else 0))
+
+    @classmethod
+    def from_epoch_seconds(cls, seconds, offset=utc):
+        """Return the calendar date and time that is the given number of
+        seconds (an integer or a Decimal) after 1970-01-01T00:00:00Z,
+        expressed as local time with the given offset from UTC. If offset
+        is None, the result is a local time that is treated as UTC."""
+        if offset is not None and offset.elements[0]:
+            seconds += offset.total_seconds()
+        day, seconds = floor_divmod(seconds, 86400)
+        minutes, second = floor_divmod(seconds, 60)
+        hour, minute = divmod(int(minutes), 60)
+        year, month, day = calendar_date(int(day))
+        Year(year) # check the range
+        return DateTime.from_elements((CalendarDate.from_ints(year, month, day),
+                                       Time.from_values(hour, minute, second,
+                                                        offset)))
+
     def add_sub(self, other, op):
-        if not isinstance(other, Duration):
+        if not isinstance(other, Duration) or isinstance(other, WeeksDuration):
             return NotImplemented
-        if self.time:
-            try:
-                time = op(self.time, other)
-            except TimeUnitOverflow as overflow:
-                time = overflow.value
-                other += Days(abs(overflow.carry))
-        else:
-            time = None
-        date = op(self.date, other)
-        return DateTime(date, time)
+        date, time = self.elements
+        if not isinstance(date, CalendarDate):
+            return NotImplemented
+        time, carry = time.add_sub_carry(other, op)
+        return DateTime.from_elements((date.add_sub(other, op, abs(carry)),
+                                       time))
 
     def __str__(self):
         return "T".join(map(str, self.elements))
@@ -573,21 +1144,143 @@ class Duration(TimeRep):
     def __init__(self, *args):
         TimeRep.__init__(self, args)
 
-    def merge(self, other):
-        if isinstance(other, Weeks):
-            return WeeksDuration(other) # weeks don't mix with other elements
-        elif isinstance(other, TimeDuration):
-            return Duration(self.years, self.months, self.days,
-                            other.hours, other.minutes, other.seconds)
-        elif isinstance(other, DateTime):
-            return TimeInterval(self, other)
+    @classmethod
+    def from_seconds(cls, seconds):
+        """Return a duration of the given number of seconds (an integer or a
+        Decimal) expressed in days, hours, minutes, and seconds."""
+        if seconds < 0:
+            raise ValueError("negative duration %s" % seconds)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(int(minutes), 60)
+        days, hours = divmod(hours, 24)
+        return cls.from_values(0, 0, days, hours, minutes, seconds)
+
+    @classmethod
+    def from_values(cls, years=None, months=None, days=None, hours=None,
+                    minutes=None, seconds=None):
+        """Make a duration from values that are already known to be valid
+        (see TimeUnit.from_value), bypassing the checks and coercions in
+        __init__."""
+        return cls.from_elements((Years.from_value(years),
+                                  Months.from_value(months),
+                                  Days.from_value(days),
+                                  Hours.from_value(hours),
+                                  Minutes.from_value(minutes),
+                                  Seconds.from_value(seconds)))
+
+    def canonical(self):
+        """Return the duration as a pair (months, seconds), taking a year to
+        be 12 months, a week 7 days, and a day 86400 seconds. The pair is
+        computed once and cached."""
+        try:
+            return self.__dict__["canonical_pair"]
+        except KeyError:
+            pass
+        if isinstance(self, WeeksDuration):
+            months, seconds = 0, self.weeks.decimal()*604800
+        else:
+            years, months, days, hours, minutes, seconds = \
+                [x.decimal() for x in self.elements]
+            months = years*12 + months
+            if months != int(months):
+                raise ValueError("fractional months in duration %s" % self)
+            months = int(months)
+            seconds += days*86400 + hours*3600 + minutes*60
+        pair = self.__dict__["canonical_pair"] = (months, seconds)
+        return pair
+
+    def total_seconds(self):
+        """Return the length of a duration with no years or months, which
+        vary in length, as a number of seconds."""
+        months, seconds = self.canonical()
+        if months:
+            raise ValueError("duration %s has no fixed length" % self)
+        return seconds
+
+    def normalize(self):
+        """Return an equivalent duration in which there are fewer than 12
+        months, 24 hours, 60 minutes, and 60 seconds; e.g., PT90M becomes
+        PT1H30M, and P1W becomes P7D. Trailing zero components are omitted."""
+        months, seconds = self.canonical()
+        values = list(divmod(months, 12) +
+                      tuple(x.value for x in
+                            Duration.from_seconds(seconds).elements[2:]))
+        while len(values) > 1 and not values[-1]:
+            values[-1:] = []
+        return Duration(*values)
+
+    def compare(self, other, anchor=None):
+        """Return -1, 0, or 1 as this duration is shorter than, as long as,
+        or longer than the other. Durations with the same number of months
+        compare by their seconds alone; e.g., P1D and PT24H are equally long.
+        Otherwise, since months vary in length, the durations are compared
+        as though each were added to the given anchor date (or date and time;
+        see add_months). Without an anchor, the comparison must come out the
+        same from every date, or a ValueError is raised: P1M is longer than
+        P27D and shorter than P32D, but P30D may be either."""
+        m1, s1 = self.canonical()
+        m2, s2 = other.canonical()
+        months, seconds = m1 - m2, s1 - s2
+        if months and anchor is not None:
+            day = anchor.epoch_day()
+            seconds += (add_months(day, m1) - add_months(day, m2))*86400
+        elif months:
+            least, greatest = month_span(abs(months))
+            if months < 0:
+                least, greatest = -greatest, -least
+            if seconds + least*86400 > 0:
+                return 1
+            elif seconds + greatest*86400 < 0:
+                return -1
+            elif least == greatest: # a whole number of 400-year cycles
+                return 0
+            raise ValueError("can't compare %s and %s without an anchor" % \
+                                 (self, other))
+        return (seconds > 0) - (seconds < 0)
+
+    def order(self, other, op):
+        if not isinstance(other, Duration):
+            return NotImplemented
+        try:
+            m1, s1 = self.__dict__["canonical_pair"]
+            m2, s2 = other.__dict__["canonical_pair"]
+        except KeyError:
+            (m1, s1), (m2, s2) = self.canonical(), other.canonical()
+        if m1 == m2:
+            return op(s1, s2) # the usual case; see compare
+        return op(self.compare(other), 0)
+
+    def __lt__(self, other):
+        return self.order(other, lt)
+
+    def __le__(self, other):
+        return self.order(other, le)
+
+    def __gt__(self, other):
+        return self.order(other, gt)
+
+    def __ge__(self, other):
+        return self.order(other, ge)
+
+    @classmethod
+    def merger(cls, other):
+        if issubclass(other, Weeks):
+            # Weeks don't mix with other elements.
+            return lambda self, weeks: WeeksDuration(weeks)
+        elif issubclass(other, TimeDuration):
+            return lambda self, other: Duration.from_elements(
+                self.elements[:3] + other.elements[3:])
+        elif issubclass(other, DateTime):
+            return lambda self, other: TimeInterval(self, other)
         else:
-            return super(Duration, self).merge(other)
+            return super(Duration, cls).merger(other)
 
     def __add__(self, other):
         if isinstance(other, type(self)):
-            return type(self)(*[a.decimal() + b.decimal() if a or b else None
-                                for a, b in zip(self.elements, other.elements)])
+            return self.from_elements(tuple(
+                    type(a).from_value(a.decimal() + b.decimal()
+                                       if a or b else None)
+                    for a, b in zip(self.elements, other.elements)))
         elif isinstance(other, (Years, Months, Days, Hours, Minutes, Seconds)):
             return Duration(*[e.decimal() + other.decimal() \
                                   if type(e) is type(other) else e
@@ -614,14 +1307,14 @@ class Duration(TimeRep):
                                              u"PTnn̲S"])
 
         # We need to transform leading 0s into Nones so that the formatter
-        # doesn't try to print them. We'll work with a copy so we don't
-        # change the original object.
-        d = self.copy()
-        for i in range(len(d.elements)):
-            if not d.elements[i].value:
-                d.elements[i].value = None
+        # doesn't try to print them.
+        elements = list(self.elements)
+        for i, elt in enumerate(elements):
+            if not elt.value:
+                elements[i] = type(elt)(None)
             else:
-                return self.formatters[i].format(d)
+                return self.formatters[i].format(
+                    self.from_elements(tuple(elements)))
         return "PT0S"
 
 class TimeDuration(Duration):
@@ -665,6 +1358,29 @@ class TimeInterval(DateTime):
         assert len(args) <= 2, "too many end-points for a time interval"
         TimeRep.__init__(self, args)
 
+    # Intervals don't cache their elements as dates and times do.
+    from_elements = TimeRep.__dict__["from_elements"]
+
+    def endpoints(self):
+        """Return the start and end of the interval as time points,
+        computing one from the other and the duration if necessary."""
+        points = [elt for elt in self.elements if isinstance(elt, TimeRep)]
+        if len(points) != 2 or all(isinstance(x, Duration) for x in points):
+            raise ValueError("interval %s has no end-points" % self)
+        start, end = points
+        if isinstance(start, Duration):
+            return end - start, end
+        elif isinstance(end, Duration):
+            return start, start + end
+        else:
+            return start, end
+
+    def span(self):
+        """Return the exact length of the interval as a duration in days,
+        hours, minutes, and seconds."""
+        start, end = self.endpoints()
+        return end - start
+
     def __str__(self):
         return "/".join(map(str, self.elements))
 
@@ -677,11 +1393,177 @@ class RecurringTimeInterval(TimeInterval):
         assert len(args) <= 3
         TimeRep.__init__(self, args)
 
-    def merge(self, other):
-        if isinstance(other, (DateTime, Duration)):
-            return RecurringTimeInterval(*(self.elements + [other]))
+    @classmethod
+    def merger(cls, other):
+        if issubclass(other, (DateTime, Duration)):
+            return lambda self, other: RecurringTimeInterval(
+                *(self.elements + (other,)))
+        else:
+            return super(RecurringTimeInterval, cls).merger(other)
+
+    def schedule(self):
+        """Return the constants that determine the start of every occurrence:
+        (count, first, last, months, seconds, day, base). The start of the
+        k'th occurrence after the anchor is the anchor plus k×duration, where
+        the duration is some number of months plus some number of seconds;
+        the month arithmetic clips the anchor's day of the month, as in
+        CalendarDate.add_sub. The anchor is at the given epoch day plus base
+        seconds. Occurrences are numbered from first to last (exclusive);
+        when the duration precedes the end, they are numbered back from the
+        end with negative k. A count of None means an unbounded schedule,
+        and then first or last is None, too."""
+        return self.constants()[:7]
+
+    def constants(self):
+        """Return the schedule, followed by the anchor's calendar date and
+        offset from UTC. These are computed once and cached."""
+        try:
+            return self.__dict__["schedule_constants"]
+        except KeyError:
+            pass
+        count = self.elements[0].value
+        points = self.elements[1:]
+        if len(points) != 2 or all(isinstance(x, Duration) for x in points):
+            raise ValueError("interval %s has no end-points" % self)
+        if isinstance(points[0], Duration):
+            duration, anchor = points
+            first, last = (-count if count is not None else None), 0
+        else:
+            anchor, duration = points
+            first, last = 0, count
+        if not isinstance(duration, Duration):
+            months = 0
+            seconds = duration.epoch_seconds() - anchor.epoch_seconds()
+        else:
+            months, seconds = duration.canonical()
+        if seconds <= 0 and months <= 0:
+            raise ValueError("invalid recurrence duration %s" % duration)
+        day = anchor.epoch_day()
+        offset = anchor.time.utcoffset if isinstance(anchor, DateTime) else None
+        constants = self.__dict__["schedule_constants"] = \
+            (count, first, last, months, seconds, day,
+             anchor.epoch_seconds() - day*86400, calendar_date(day), offset)
+        return constants
+
+    def occurrence_start(self, k):
+        """Return the instant (in seconds since 1970-01-01T00:00:00Z) at
+        which the k'th occurrence starts; see schedule. Calendar durations
+        need only one clipped month calculation, whatever k is."""
+        (count, first, last, months, seconds, day, base,
+         (y0, m0, d0), offset) = self.constants()
+        if months:
+            year, month = divmod(m0 - 1 + k*months, 12)
+            year += y0
+            day = day_number(year, month + 1,
+                             min(d0, days_in_month(year, month + 1)))
+        return day*86400 + base + k*seconds
+
+    def locate(self, timepoint):
+        """Return the number k of the last occurrence (counting beyond the
+        bounds of the schedule) that starts at or before the given time
+        point or instant. For a fixed-length duration this is a single
+        division; for a calendar duration, an estimate based on the average
+        length of a month is corrected by at most a few steps."""
+        instant = timepoint \
+            if isinstance(timepoint, (int, long, Decimal, Fixed)) \
+            else timepoint.epoch_seconds()
+        (count, first, last, months, seconds, day, base,
+         ymd, offset) = self.constants()
+        if not months:
+            return int(floor_divmod(instant - (day*86400 + base), seconds)[0])
+        step = months*30.436875*86400 + float(seconds) # on average
+        k = int(float(instant - (day*86400 + base)) // step)
+        while self.occurrence_start(k) > instant:
+            k -= 1
+        while self.occurrence_start(k + 1) <= instant:
+            k += 1
+        return k
+
+    def occurrence(self, timepoint):
+        """Return the number of the occurrence that contains the given time
+        point or instant, or None if it is outside all of them. Consecutive
+        occurrences abut, so each instant is in at most one."""
+        count, first, last = self.constants()[:3]
+        k = self.locate(timepoint)
+        if (first is None or k >= first) and (last is None or k < last):
+            return k
+
+    def covers(self, timepoint):
+        """Determine whether any occurrence contains the given time point
+        or instant."""
+        return self.occurrence(timepoint) is not None
+
+    def next_start(self, timepoint):
+        """Return the start of the first occurrence that starts after the
+        given time point or instant, expressed with the anchor's offset from
+        UTC, or None if there is no such occurrence."""
+        constants = self.constants()
+        first, last, offset = constants[1], constants[2], constants[-1]
+        k = self.locate(timepoint) + 1
+        if first is not None and k < first:
+            k = first
+        if last is not None and k >= last:
+            return None
+        return DateTime.from_epoch_seconds(self.occurrence_start(k), offset)
+
+    def expand(self, start=None, end=None, resolution="s"):
+        """Return the starts of the occurrences of this recurring interval as
+        a NumPy datetime64 array with the given resolution ("s", "ms", "us",
+        or "ns"); any finer fraction of a second is truncated. If start or
+        end are given, only occurrences that start in the window [start, end)
+        are included; an unbounded number of recurrences requires them."""
+        import numpy as np
+
+        scale = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}[resolution]
+        count, first, last, months, seconds, day, base = self.schedule()
+        step = months*30.436875*86400 + float(seconds) # on average
+        anchor = day*86400 + base
+        if start is not None:
+            lo = int(float(start.epoch_seconds() - anchor) // step) - 2
+            first = lo if first is None else max(first, lo)
+        if end is not None:
+            hi = int(float(end.epoch_seconds() - anchor) // step) + 3
+            last = hi if last is None else min(last, hi)
+        if first is None or last is None:
+            raise ValueError("can't expand an unbounded number of recurrences")
+
+        k = np.arange(first, max(first, last), dtype=np.int64)
+        if months:
+            y0, m0, d0 = calendar_date(day)
+            total = m0 - 1 + k*months
+            year, month = y0 + total//12, total % 12 + 1
+            leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+            lengths = np.array([[days_in_month(y, m) for m in range(1, 13)]
+                                for y in (1970, 1972)])
+            days = day_number(year, month,
+                              np.minimum(d0, lengths[leap.astype(int),
+                                                     month - 1]))
         else:
-            return super(RecurringTimeInterval, self).merge(other)
+            days = day
+        def scaled(x):
+            return int(floor_divmod(x*scale, 1)[0])
+        def exact(x):
+            return Fraction(x.units, 10**x.places) if isinstance(x, Fixed) \
+                else Fraction(x)
+
+        # Occurrence k starts base + k*seconds into its day. Compute that
+        # exactly, over a common denominator, and floor it only once, so
+        # that a fractional step neither drifts nor collapses. The integers
+        # fall back to Python's if they might overflow 64 bits.
+        step, offset = exact(seconds)*scale, exact(base)*scale
+        denominator = step.denominator * offset.denominator // \
+            gcd(step.denominator, offset.denominator)
+        step = step.numerator * (denominator // step.denominator)
+        offset = offset.numerator * (denominator // offset.denominator)
+        if abs(offset) + max(abs(first), abs(last))*abs(step) >= 2**62:
+            k = k.astype(object)
+        instants = days*86400*scale + (offset + k*step) // denominator
+        if start is not None:
+            instants = instants[instants >= scaled(start.epoch_seconds())]
+        if end is not None:
+            instants = instants[instants < scaled(end.epoch_seconds())]
+        return np.asarray(instants, dtype=np.int64).astype(
+            "datetime64[%s]" % resolution)
 
     def __str__(self):
         return "R" + super(RecurringTimeInterval, self).__str__()
@@ -722,6 +1604,18 @@ class FormatOp(object):
         stack should be merged, and False otherwise."""
         raise StopFormat
 
+    def match(self, m):
+        """Match zero or more characters from the input without constructing
+        any elements. Returns True if the input matched, False otherwise.
+        Must not raise an exception on invalid input."""
+        return False
+
+    def more(self, m):
+        """Return True if the rest of the input might be a proper prefix of
+        what this fop reads; i.e., if reading now could fail or stop short
+        only because the input ends too soon."""
+        return False
+
 class Literal(FormatOp):
     """Produce or consume a literal string."""
 
@@ -743,6 +1637,17 @@ class Literal(FormatOp):
             raise StopFormat("expected [%s], got [%s]" % \
                                  (self.lit, m.input[m.i:m.i+self.n]))
 
+    def match(self, m):
+        if not self.lit or m.input.startswith(self.lit, m.i):
+            m.i += self.n
+            return True
+        else:
+            return False
+
+    def more(self, m):
+        return (len(m.input) - m.i < self.n and
+                self.lit.startswith(m.input[m.i:]))
+
     def __eq__(self, other):
         return ((isinstance(other, basestring) and self.lit == other.upper()) or
                 (isinstance(other, type(self)) and self.lit == other.lit))
@@ -766,6 +1671,15 @@ class HardSeparator(Separator):
         m.push(unit)
         return False
 
+    def match(self, m):
+        # A hard separator begins a new time point, so forget the date
+        # components of the previous one.
+        if super(HardSeparator, self).match(m):
+            m.date = [None, None, None]
+            return True
+        else:
+            return False
+
 class Designator(Literal):
     """A designator indicates a change in syntax in the format representation;
      e.g., from date to time."""
@@ -775,6 +1689,12 @@ class Designator(Literal):
         self.cls = cls
 
 class PrefixDesignator(Designator):
+    def __init__(self, lit, cls):
+        super(PrefixDesignator, self).__init__(lit, cls)
+        # Representations are immutable, so every read can start from the
+        # same empty one.
+        self.empty = cls() if cls else None
+
     def format(self, m, elt):
         # Only format a prefix designator if an element follows.
         if elt:
@@ -783,7 +1703,7 @@ class PrefixDesignator(Designator):
     def read(self, m):
         super(PrefixDesignator, self).read(m)
         if self.cls:
-            m.push(self.cls())
+            m.push(self.empty)
         return True
 
     def __eq__(self, other):
@@ -820,6 +1740,7 @@ class Element(FormatOp):
                  separator=",", signed=False):
         assert issubclass(cls, TimeUnit)
         self.cls = cls
+        self.field = self.date_field(cls)
         self.min, self.max = digits
         self.frac_min, self.frac_max = frac
         self.separator = separator
@@ -831,6 +1752,19 @@ class Element(FormatOp):
                                         (self.frac_min, self.frac_max or "")) \
                                        if self.frac_min else ""))
 
+        # The prefix pattern matches anything that might become a match
+        # given more input, and the maximum length, if there is one, is the
+        # length of the longest possible match.
+        prefix = ("[0-9]{0,%s}" % (self.max or "")) + \
+                 (("(?:[.,][0-9]{0,%s})?" % (self.frac_max or "")) \
+                      if self.frac_min else "")
+        self.prefix = re.compile(("(?:[+-]%s)?" if signed else "%s") % prefix +
+                                 r"\Z")
+        self.max_len = (int(signed) + self.max +
+                        (1 + self.frac_max if self.frac_min else 0)) \
+                       if self.max and (self.frac_max or not self.frac_min) \
+                       else None
+
     def format(self, m, elt):
         if elt and issubclass(type(elt), self.cls):
             s = m.separators.pop() if m.separators else ""
@@ -841,13 +1775,17 @@ class Element(FormatOp):
             s += ("%0*d" % (self.min, whole))[0:self.max]
             if self.frac_min is not None:
                 s += self.separator
-                if frac and isinstance(frac, Decimal):
+                if frac and isinstance(frac, Fixed):
+                    # Like the Decimal case below, but with integers only.
+                    n = self.frac_max or max(frac.places, self.frac_min)
+                    units = frac.units * 10**n // 10**frac.places
+                    s += "%0*d" % (n, units)
+                elif frac and isinstance(frac, Decimal):
                     q = (Decimal(10) ** -self.frac_max) if self.frac_max \
                                                         else frac
                     exp = frac.quantize(q).as_tuple()[2]
-                    frac *= Decimal(10) ** (-exp if -exp > self.frac_min \
-                                                 else self.frac_min)
-                    s += "".join(str(int(frac)))
+                    n = max(-exp, self.frac_min)
+                    s += "%0*d" % (n, int(frac * Decimal(10) ** n))
                 else:
                     # The scaling we do above won't work for 0; just fake it.
                     s += "0"*self.frac_min
@@ -859,13 +1797,75 @@ class Element(FormatOp):
         if match:
             digits = match.group(1)
             frac = match.group(2) if self.frac_min else None
-            m.push(self.cls(Decimal(".".join((digits, frac))) if frac \
-                                                              else int(digits),
-                            signed=self.signed))
+            if not frac:
+                value = int(digits)
+            elif m.places is None:
+                value = Decimal(".".join((digits, frac)))
+            else:
+                # Excess digits are truncated.
+                frac = frac[:m.places]
+                value = Fixed(int(digits + frac), len(frac))
+            m.push(self.cls(value, signed=self.signed))
             m.i += len(match.group(0))
             return not self.signed # don't merge signed elements
         else:
-            raise StopFormat("expected digit; got [%s]" % m.input[m.i])
+            raise StopFormat("expected digit; got [%s]" % m.input[m.i:m.i+1])
+
+    def more(self, m):
+        return ((self.max_len is None or len(m.input) - m.i < self.max_len) and
+                self.prefix.match(m.input, m.i) is not None)
+
+    @staticmethod
+    def date_field(cls):
+        """Return the index in a matcher's date component list of the slot
+        that elements of the given class occupy, or None if they don't."""
+        if not issubclass(cls, Cardinal):
+            for i, c in enumerate((Year, Month, Week, Day)):
+                if issubclass(cls, c):
+                    return i
+
+    def match(self, m):
+        match = self.pattern.match(m.input, m.i)
+        if not match:
+            return False
+        whole = int(match.group(1))
+        frac = self.frac_min and int(match.group(2))
+
+        # Check the range using only integer arithmetic. Cardinals aren't
+        # ordinals, and so need only be non-negative.
+        if issubclass(self.cls, Cardinal):
+            if whole < 0:
+                return False
+        else:
+            minvalue, maxvalue = self.cls.range
+            if minvalue is not None and abs(whole) < minvalue:
+                return False
+            if maxvalue is not None and (abs(whole) > maxvalue or
+                                         (abs(whole) == maxvalue and frac)):
+                return False
+
+        # Cross-check the components of a date. Since the elements must be
+        # in most-significant-first order, the year and month or week will
+        # already have been matched by the time we get to the day.
+        if self.field is not None:
+            year, month, week = m.date
+            if self.field == 3: # day
+                if month is not None:
+                    maxday = days_in_month(2000 if year is None else year,
+                                           month)
+                elif week is not None:
+                    maxday = 7
+                else:
+                    maxday = 366 if year is None or leap_year(year) else 365
+                if not 1 <= whole <= maxday:
+                    return False
+            elif self.field == 2 and year is not None and \
+                    whole > weeks_in_year(year):
+                return False
+            else:
+                m.date[self.field] = whole
+        m.i = match.end()
+        return True
 
     def __eq__(self, other):
         return (isinstance(other, type(self)) and
@@ -878,102 +1878,237 @@ class Element(FormatOp):
                self.separator, self.signed)
 
 class FormatReprParser(object):
+    # A token is a designator or separator character, or a run of the same
+    # digit-representing character with optional sign, underline, and
+    # decimal fraction.
+    token = re.compile(ur"(±?)((.)\3*)(\u0332?)(?:([,.])(\3*)(\u0332?))?",
+                       re.U | re.S)
+
+    # Element fops keep no state of their own, so those for identical tokens
+    # are shared between formats.
+    elements = {}
+
     def __init__(self, syntax, format_repr):
         self.initial_syntax = syntax
         self.repr = re.sub(r"_(.)", ur"\1̲", format_repr) # convert _X to X̲
 
-    def __iter__(self):
-        self.i = -1
-        return self
-
-    def next(self):
-        self.i += 1
-        try:
-            return self.repr[self.i]
-        except IndexError:
-            raise StopIteration
-
-    def peek(self):
+    def element(self, unit, token):
+        """Return an Element fop for a token made of digit-representing
+        characters. An underlined character is not counted, but allows any
+        number of additional digits."""
+        key = (unit, token.group())
         try:
-            return self.repr[self.i+1]
-        except IndexError:
+            return self.elements[key]
+        except KeyError:
             pass
-
-    def designator(self, char):
-        if char in self.syntax.designators:
-            designate = self.syntax.designators[char]
-            if designate is utc:
-                # Special case: UTC designator.
-                return Z
-            elif designate and issubclass(designate, TimeUnit):
-                # Postfix designator: coerce the last element.
-                return Coerce(char, designate)
-            else:
-                # Prefix designator: possibly change syntax class.
-                if designate:
-                    self.stack.append(designate)
-                return PrefixDesignator(char, designate)
-
-    def separator(self, char):
-        for level, cls in enumerate(reversed(self.stack)):
-            if char in cls.separators:
-                for i in range(level):
-                    self.stack.pop()
-                return (HardSeparator if cls.separators[char] \
-                                      else Separator)(char)
-
-    def element(self, char):
-        """Consume as many of the same digit-representing characters as
-        possible from the format representation and return an Element fop."""
-        signed = False
-        if char == u"±":
-            signed = True
-            char = self.next()
-
-        def snarf():
-            n = 0
-            repeat = False
-            while self.peek() == char:
-                n += 1
-                self.next()
-            if self.peek() == u"\u0332": # combining low line (underline)
-                repeat = True
-                n -= 1 # last char was underlined; don't count it
-                self.next() # discard underline
-            return n, repeat
-        digits, repeat = snarf()
-        digits += 1 # for the char that sparked this call
-        if self.peek() in (",", "."):
-            separator = self.next()
-            frac, frac_repeat = snarf()
-            return Element(self.syntax.digits[char],
-                           (digits, None if repeat else digits),
-                           (frac, None if frac_repeat else frac),
-                           separator, signed)
+        signed, digits, _, repeat, separator, frac, frac_repeat = \
+            token.groups()
+        digits = len(digits) - len(repeat)
+        if separator:
+            frac = len(frac) - len(frac_repeat)
+            element = Element(unit,
+                              (digits, None if repeat else digits),
+                              (frac, None if frac_repeat else frac),
+                              separator, bool(signed))
         else:
-            return Element(self.syntax.digits[char],
-                           (digits, None if repeat else digits),
-                           signed=signed)
-
-    @property
-    def syntax(self):
-        return self.stack[-1]
+            element = Element(unit,
+                              (digits, None if repeat else digits),
+                              signed=bool(signed))
+        self.elements[key] = element
+        return element
 
     def parse(self):
-        self.stack = [self.initial_syntax]
-        for char in self:
-            yield (self.designator(char) or
-                   self.separator(char) or
-                   self.element(char))
+        """Translate the format representation into fops in a single pass,
+        driven by the syntax tables of the classes in effect."""
+        state = (self.initial_syntax,)
+        table = self.initial_syntax.table()
+        i = 0
+        while i < len(self.repr):
+            token = self.token.match(self.repr, i)
+            fop, unit, after = table[token.group(3)]
+            if after is not state:
+                state, table = after, after[-1].table(after[:-1])
+            if unit:
+                yield self.element(unit, token)
+                i = token.end()
+            elif token.group(1):
+                raise KeyError(token.group(3))
+            else:
+                yield fop
+                i += 1
+
+# Format inference works the other way around: given a representation, find
+# a format representation that reads it. The shapes below are tried in order
+# against the upper-cased parts of a time point; in their format
+# representations, a hyphen stands for whichever hyphen was matched. Bare
+# digits are taken to be a date if they could be one.
+
+date_shapes = [(re.compile(pattern, re.U), format_repr)
+               for pattern, format_repr in
+               ((ur"\d{4}([-‐])\d{2}\1\d{2}", u"YYYY-MM-DD"),
+                (ur"\d{4}([-‐])W\d{2}\1\d", u"YYYY-Www-D"),
+                (ur"\d{4}([-‐])W\d{2}", u"YYYY-Www"),
+                (ur"\d{4}([-‐])\d{3}", u"YYYY-DDD"),
+                (ur"\d{4}([-‐])\d{2}", u"YYYY-MM"),
+                (ur"\d{4}W\d{3}", u"YYYYWwwD"),
+                (ur"\d{4}W\d{2}", u"YYYYWww"),
+                (ur"\d{8}", u"YYYYMMDD"),
+                (ur"\d{7}", u"YYYYDDD"),
+                (ur"\d{4}", u"YYYY"),
+                (ur"\d{2}", u"YY"))]
+time_shapes = [(re.compile(pattern), format_repr)
+               for pattern, format_repr in
+               ((r"\d{2}:\d{2}:\d{2}", u"hh:mm:ss"),
+                (r"\d{2}:\d{2}", u"hh:mm"),
+                (r"\d{6}", u"hhmmss"),
+                (r"\d{4}", u"hhmm"),
+                (r"\d{2}", u"hh"))]
+offset_shapes = [(re.compile(pattern), format_repr)
+                 for pattern, format_repr in
+                 ((r"Z", u"Z"),
+                  (r"[+-]\d{2}:\d{2}", u"±hh:mm"),
+                  (r"[+-]\d{4}", u"±hhmm"),
+                  (r"[+-]\d{2}", u"±hh"),
+                  (r"", u""))]
+fraction = re.compile(r"[.,]\d+")
+duration_shape = re.compile(r"P(\d+([.,]\d+)?[YMWD])*"
+                            r"(T(\d+([.,]\d+)?[HMS])+)?\Z")
+
+def infer_format_repr(string):
+    """Return a format representation that reads the given representation
+    of a date, time, duration, or (recurring) time interval. Fractions are
+    given exactly as many digits as the representation has. Raises
+    ValueError if no format representation can be found."""
+    def shape(shapes, part, i, end):
+        for pattern, format_repr in shapes:
+            m = pattern.match(part, i)
+            if m and (end is None or end.match(part, m.end())):
+                hyphen = m.groups()[0] if m.groups() else None
+                return (format_repr.replace(u"-", hyphen) if hyphen \
+                            else format_repr), m.end()
+        return None, i
+
+    def time_point(part):
+        date, i = shape(date_shapes, part, 0, re.compile(r"T|\Z"))
+        format_repr = date or u""
+        if i < len(part):
+            if part[i] == "T":
+                format_repr += u"T"
+                i += 1
+            time, i = shape(time_shapes, part, i, None)
+            if not time:
+                return None
+            format_repr += time
+            m = fraction.match(part, i)
+            if m:
+                format_repr += part[i] + time[-1]*(len(m.group()) - 1)
+                i = m.end()
+            offset, i = shape(offset_shapes, part, i, None)
+            format_repr += offset
+        return format_repr if i == len(part) else None
+
+    parts = []
+    for i, part in enumerate(string.upper().split("/")):
+        if i == 0 and re.match(r"R\d*\Z", part):
+            parts.append(u"Rn̲")
+        elif duration_shape.match(part) and part not in ("P", "PT"):
+            parts.append(re.sub(r"\d+(?:([.,])\d+)?",
+                                lambda m: u"nn̲" + (m.group(1) + u"nn̲" \
+                                                       if m.group(1) else u""),
+                                part))
+        else:
+            parts.append(time_point(part))
+            if not parts[-1]:
+                raise ValueError("can't infer a format for %r" % string)
+    return u"/".join(parts)
+
+def writer(out):
+    """Return a function that writes strings to out, which may be a
+    bytearray, an io stream, or any object with a write method."""
+    if isinstance(out, bytearray):
+        return lambda s: out.extend(s.encode("utf-8"))
+    elif isinstance(out, io.TextIOBase):
+        return lambda s: out.write(unicode(s))
+    elif isinstance(out, io.IOBase):
+        return lambda s: out.write(s.encode("utf-8"))
+    else:
+        return out.write
 
 class Format(object):
+    places = None # see FixedPointFormat
+
     def __init__(self, format_repr, syntax=RecurringTimeInterval):
         self.ops = list(FormatReprParser(syntax, format_repr).parse())
 
+    @classmethod
+    def infer(cls, samples, *args, **kwargs):
+        """Infer a format representation from a sample of representations,
+        all of which it must read, and return a new format for it. Any
+        further arguments are passed to the constructor.
+
+        The samples may differ only in the number of digits in decimal
+        fractions, which are then given the least number of digits in any
+        sample, with more allowed."""
+        fractions = re.compile(ur"([.,])(h+|m+|s+)")
+        format_reprs = set()
+        digits = None
+        for string in samples:
+            format_repr = infer_format_repr(string)
+            n = [len(m.group(2)) for m in fractions.finditer(format_repr)]
+            if digits is None:
+                digits = [(x, x) for x in n]
+            elif len(n) == len(digits):
+                digits = [(min(lo, x), max(hi, x))
+                          for (lo, hi), x in zip(digits, n)]
+            format_reprs.add(fractions.sub(
+                    lambda m: m.group(1) + m.group(2)[0], format_repr))
+            if len(format_reprs) > 1:
+                raise ValueError("samples have different formats: %s" % \
+                                     ", ".join(sorted(format_reprs)))
+        if not format_reprs:
+            raise ValueError("no samples")
+        digits = iter(digits)
+        def fraction(m):
+            lo, hi = digits.next()
+            char = m.group(2)[0]
+            return m.group(1) + (char*lo if lo == hi \
+                                     else char*lo + char + u"\u0332")
+        return cls(fractions.sub(fraction, format_reprs.pop()), *args, **kwargs)
+
     def format(self, timerep):
-        self.separators = []
         self.stack = []
         self.push = self.stack.append
+        self.emit(timerep)
+        return "".join(self.stack)
+
+    def format_into(self, out, timerep):
+        """Format a representation and write it to out; see format_many."""
+        return self.format_many((timerep,), out, "")
+
+    def format_many(self, timereps, out, end="\n", bufsize=4096):
+        """Format each of a sequence of representations, followed by end,
+        and write them to out, which may be a bytearray, an io stream, or
+        any object with a write method. Rather than making a string for
+        each representation, the pieces are collected in a buffer that is
+        written out whenever it holds at least bufsize of them. Returns out."""
+        write = writer(out)
+        buf = []
+        self.push = push = buf.append
+        for timerep in timereps:
+            self.emit(timerep)
+            if end:
+                push(end)
+            if len(buf) >= bufsize:
+                write("".join(buf))
+                del buf[:]
+        if buf:
+            write("".join(buf))
+        return out
+
+    def emit(self, timerep):
+        """Run the format machine on a representation, passing each string
+        it produces to self.push."""
+        self.separators = []
         if isinstance(timerep, TimeRep):
             elts = iter(timerep)
         elif isinstance(timerep, TimeUnit):
@@ -1005,7 +2140,27 @@ class Format(object):
                         elt = elts = None
                 else:
                     break
-        return "".join(self.stack)
+
+    def mismatch(self, string):
+        """Validate a representation without constructing any elements or
+        raising any exceptions. Returns None if the entire string is a valid
+        representation in this format, and otherwise the index in the string
+        at which validation failed.
+
+        In addition to the syntax, this checks the range of each component,
+        the day of the month, and whether week 53 exists in the given year.
+        Unlike read, trailing characters are treated as an error."""
+        self.input = string.upper()
+        self.i = 0
+        self.date = [None, None, None] # year, month, week
+        for op in self.ops:
+            if not op.match(self):
+                return self.i
+        return None if self.i == len(self.input) else self.i
+
+    def match(self, string):
+        """Return True if string is a valid representation in this format."""
+        return self.mismatch(string) is None
 
     def read(self, string):
         self.input = string.upper()
@@ -1015,17 +2170,542 @@ class Format(object):
         for op in self.ops:
             if op.read(self):
                 try:
-                    merged = self.stack[-2].merge(self.stack[-1])
+                    merged = merge_pair(self.stack[-2], self.stack[-1])
                 except IndexError:
                     continue
                 if merged:
                     self.stack[-2:] = [merged]
+        return self.result()
 
-        # Now we merge bottom-up. These merges must all succeed.
+    def reader(self):
+        """Return an incremental reader for this format."""
+        return FormatReader(self)
+
+    def transcoder(self, target):
+        """Return a transcoder from this format to the target format."""
+        return Transcoder(self, target)
+
+    def result(self):
+        """Merge the elements on the stack bottom-up and return the result.
+        These merges must all succeed."""
         obj = self.stack[0]
         for other in self.stack[1:]:
-            merged = obj.merge(other)
+            merged = merge_pair(obj, other)
             if not merged:
                 raise StopFormat("can't merge elements %r, %r" % (obj, other))
             obj = merged
         return obj
+
+    def key_fields(self):
+        """Return a list of (element, slot, scale) triples for the elements
+        of a time point format, where slot indexes the list (year, month,
+        week, day, hour, minute, second, offset hour, offset minute) and
+        scale is the number of nanoseconds in one unit of a time element.
+        Raises ValueError if the format is not one for time points."""
+        fields = []
+        for op in self.ops:
+            if isinstance(op, (HardSeparator, Coerce)) or \
+                    isinstance(op, Element) and issubclass(op.cls, Cardinal):
+                raise ValueError("can't make sort keys for this format")
+            elif isinstance(op, Element):
+                if op.signed and issubclass(op.cls, Hour):
+                    fields.append((op, 7, None))
+                elif fields and fields[-1][1] == 7:
+                    fields.append((op, 8, None))
+                else:
+                    for slot, cls, scale in key_units:
+                        if issubclass(op.cls, cls):
+                            fields.append((op, slot, scale))
+                            break
+        return fields
+
+    def field_positions(self, string=None):
+        """Return the (start, end, fraction start, fraction end) positions
+        of the elements of this format in the given string, and the index
+        just past the last of them. Without a string, return the positions
+        that every representation in this format has, or None if they vary
+        because some element has no fixed width."""
+        positions = []
+        i = 0
+        for op in self.ops:
+            if not isinstance(op, Element):
+                i += op.n
+            elif string is not None:
+                match = op.pattern.match(string, i)
+                if not match:
+                    raise ValueError("expected digit at %d in %r" % \
+                                         (i, string))
+                start, end = match.span(1)
+                positions.append((start, end) +
+                                 (match.span(2) if op.frac_min \
+                                      else (end, end)))
+                i = match.end()
+            elif op.max is None or op.frac_min and op.frac_max is None:
+                return None
+            else:
+                start = i
+                i = end = start + op.signed + op.max
+                if op.frac_min:
+                    i = end + 1 + op.frac_max
+                    positions.append((start, end, end + 1, i))
+                else:
+                    positions.append((start, end, end, end))
+        return positions, i
+
+    def key(self, string):
+        """Return an integer sort key for a representation of a time point
+        in this format without reading it: the number of nanoseconds from
+        1970-01-01T00:00:00Z to the instant it represents. Reduced accuracy
+        representations stand for the instant at which they begin, local
+        times are treated as UTC, and fractions beyond nanoseconds are
+        truncated. The components are taken from their positions in the
+        string; unlike read, this checks neither literals nor ranges (use
+        match for that), but it does raise ValueError on misplaced digits."""
+        try:
+            fields, plan = self.key_plan
+        except AttributeError:
+            fields = self.key_fields()
+            positions = self.field_positions()
+            plan = positions and ([field + position for field, position
+                                   in zip(fields, positions[0])],
+                                  positions[1])
+            self.key_plan = fields, plan
+        if plan:
+            plan, length = plan
+            if len(string) != length:
+                raise ValueError("expected %d characters, got %r" % \
+                                     (length, string))
+        else:
+            positions, length = self.field_positions(string)
+            plan = [field + position for field, position
+                    in zip(fields, positions)]
+
+        values = [None, None, None, None, 0, 0, 0, 0, 0]
+        nanoseconds = 0
+        sign = 1
+        for op, slot, scale, start, end, frac_start, frac_end in plan:
+            if slot == 7:
+                # The sign of an offset applies to its minutes, too.
+                sign = -1 if string[start] == "-" else 1
+                start += 1
+            values[slot] = int(string[start:end])
+            if frac_end > frac_start:
+                nanoseconds += int(string[frac_start:frac_end]) * scale // \
+                    10**(frac_end - frac_start)
+        year, month, week, day, hour, minute, second, hours, minutes = values
+        if year is None:
+            days = 0
+        elif month:
+            days = day_number(year, month, day or 1)
+        elif week:
+            days = week_day_number(year, week, day or 1)
+        else:
+            days = day_number(year) + (day or 1) - 1
+        offset = (hours*60 + minutes)*sign
+        return (((days*24 + hour)*60 + minute - offset)*60 +
+                second)*10**9 + nanoseconds
+
+key_units = ((0, Year, None), (1, Month, None), (2, Week, None),
+             (3, Day, None), (4, Hour, 3600*10**9), (5, Minute, 60*10**9),
+             (6, Second, 10**9)) # slot, class, and scale; see key_fields
+
+class FormatReader(Format):
+    """An incremental reader for representations that may be split across
+    several chunks of input. The reader keeps its position in the list of
+    fops and its stack between feeds, and only the (short) tail of a chunk
+    that a single fop could not finish reading is retained; whole chunks
+    are never concatenated.
+
+    Typical usage for a stream of back-to-back values looks like this:
+
+        reader = format.reader()
+        for chunk in chunks:
+            i = reader.feed(chunk)
+            while i is not None:
+                handle(reader.value)
+                reader.reset()
+                i = reader.feed(chunk, i)
+        handle(reader.close())"""
+
+    lookahead = 32 # initial number of characters used to finish a fop
+
+    def __init__(self, format):
+        self.ops = format.ops
+        self.places = format.places
+        self.chunk = self.upper = None
+        self.reset()
+
+    def reset(self):
+        """Prepare to read a new value."""
+        self.n = 0 # index of the next fop
+        self.stack = []
+        self.push = self.stack.append
+        self.pending = "" # tail of the previous chunk not yet read
+        self.value = None
+
+    def feed(self, chunk, start=0):
+        """Feed a chunk of input to the reader, starting at the given index.
+        Returns None if more input is needed, or the index in chunk just past
+        the end of the value, which is then available as the value attribute.
+        Raises StopFormat if the input is invalid."""
+        if chunk is not self.chunk:
+            # Feeding the same chunk repeatedly is common (one value after
+            # another), so remember its case-folded form.
+            self.chunk, self.upper = chunk, chunk.upper()
+        return self.run(self.upper, start, False)
+
+    def close(self):
+        """Signal the end of the input and return the value, or None if no
+        input has been fed since the last reset. Raises StopFormat if the
+        input ends before the value is complete."""
+        if self.value is None and (self.n or self.pending):
+            self.run("", 0, True)
+        return self.value
+
+    def step(self, final):
+        """Run the next fop. Returns False if it needs more input."""
+        op = self.ops[self.n]
+        if not final and op.more(self):
+            return False
+        if op.read(self):
+            try:
+                merged = merge_pair(self.stack[-2], self.stack[-1])
+            except IndexError:
+                merged = None
+            if merged:
+                self.stack[-2:] = [merged]
+        self.n += 1
+        return True
+
+    def run(self, chunk, start, final):
+        while self.n < len(self.ops):
+            if self.pending:
+                # Finish the pending fop using a window on the new chunk
+                # just wide enough for it to complete.
+                k = self.lookahead
+                while True:
+                    self.input = self.pending + chunk[start:start+k]
+                    self.i = 0
+                    if self.step(final):
+                        break
+                    elif start + k >= len(chunk):
+                        self.pending = self.input
+                        return None
+                    k *= 2
+                if self.i < len(self.pending):
+                    self.pending = self.pending[self.i:]
+                else:
+                    start += self.i - len(self.pending)
+                    self.pending = ""
+            else:
+                self.input = chunk
+                self.i = start
+                if not self.step(final):
+                    self.pending = chunk[start:]
+                    return None
+                start = self.i
+        if not self.stack:
+            raise StopFormat("no input")
+        self.value = self.result()
+        return start
+
+def date_form(slots):
+    """Classify a set of date slots (see Format.key_fields)."""
+    return ("week" if 2 in slots else "calendar" if 1 in slots else
+            "ordinal" if 3 in slots else "year" if 0 in slots else None)
+
+class Transcoder(object):
+    """A translator of representations of time points from one format to
+    another that never reads them. The target format is compiled into a
+    template whose slots are filled with the digits of the corresponding
+    source elements, sliced out of the input at their positions; digits are
+    reformatted only where the widths of the elements differ. Only a change
+    of date form (e.g., from an ordinal date to a calendar date) requires
+    any computation.
+
+    The target may reduce the accuracy of the source, and a decimal fraction
+    is truncated or padded with zeros to fit; the Z designator becomes an
+    offset of zero, and a whole-hour offset gains zero minutes. Any other
+    component of the target must be present in the source, or ValueError
+    is raised. Like Format.key, this doesn't validate its input, but a
+    value too wide for the target also raises ValueError."""
+
+    def __init__(self, source, target):
+        self.source, self.target = source, target
+        try:
+            fields = source.key_fields()
+            target_fields = target.key_fields()
+        except ValueError:
+            raise ValueError("can only transcode representations "
+                             "of time points")
+        slots = dict((slot, (i, op)) for i, (op, slot, _) in enumerate(fields))
+        utc = any(isinstance(op, UTCDesignator) for op in source.ops)
+        target_slots = set(slot for op, slot, _ in target_fields)
+        source_date = set(slot for slot in slots if slot < 4)
+        target_date = set(slot for slot in target_slots if slot < 4)
+        self.source_form = date_form(source_date)
+        self.target_form = date_form(target_date)
+        if not target_date or target_date <= source_date and \
+                (self.target_form == self.source_form or
+                 self.target_form == "year" and self.source_form != "week"):
+            self.date = None
+        elif 0 in source_date and 3 in source_date:
+            # Indices of the source's year, month, week, and day.
+            self.date = [slots[slot][0] if slot in slots else None
+                         for slot in range(4)]
+        else:
+            raise ValueError("can't convert an incomplete date")
+        if (utc or 7 in slots) and target_slots & set([4, 5, 6]) and not \
+                (7 in target_slots or
+                 any(isinstance(op, UTCDesignator) for op in target.ops)):
+            raise ValueError("target format has no offset from UTC")
+
+        self.template = template = []
+        elements = iter(target_fields)
+        for op in target.ops:
+            if not isinstance(op, Element):
+                if isinstance(op, UTCDesignator) and not utc:
+                    raise ValueError("can't transcode an offset to UTC")
+                template.append((LITERAL, op.lit))
+                continue
+            op, slot, _ = elements.next()
+            if self.date and slot < 4:
+                template.append((DATE, slot, op.min, op.max, op.signed))
+            elif slot in slots:
+                i, source_op = slots[slot]
+                if source_op.signed == op.signed and \
+                        source_op.min == source_op.max == op.min == op.max:
+                    template.append((COPY, i))
+                else:
+                    template.append((INTEGER, i, op.min, op.max,
+                                     op.signed, source_op.signed))
+            elif slot == 7 and utc:
+                template.append((LITERAL, "+" + "0"*op.min))
+            elif slot == 8 and (utc or 7 in slots):
+                template.append((LITERAL, "0"*op.min))
+            else:
+                raise ValueError("source format has no %s" % \
+                                     op.cls.__name__.lower())
+            if op.frac_min:
+                if slot in slots and slots[slot][1].frac_min:
+                    template.append((FRACTION, slots[slot][0], op.separator,
+                                     op.frac_min, op.frac_max))
+                else:
+                    template.append((LITERAL, op.separator + "0"*op.frac_min))
+
+        # Adjacent literals can be joined once and for all.
+        for j in range(len(template) - 1, 0, -1):
+            if template[j][0] is LITERAL and template[j-1][0] is LITERAL:
+                template[j-1:j+1] = [(LITERAL,
+                                      template[j-1][1] + template[j][1])]
+        self.positions = source.field_positions()
+
+    def transcode(self, string):
+        """Translate a representation in the source format into one in
+        the target format."""
+        if self.positions:
+            positions, length = self.positions
+            if len(string) != length:
+                raise ValueError("expected %d characters, got %r" % \
+                                     (length, string))
+        else:
+            positions = self.source.field_positions(string)[0]
+        if self.date:
+            date = self.convert_date(string, positions)
+        out = []
+        push = out.append
+        for piece in self.template:
+            kind = piece[0]
+            if kind is LITERAL:
+                push(piece[1])
+            elif kind is COPY:
+                start, end = positions[piece[1]][:2]
+                push(string[start:end])
+            elif kind is FRACTION:
+                i, separator, frac_min, frac_max = piece[1:]
+                start, end = positions[i][2:]
+                digits = string[start:end][:frac_max]
+                push(separator + digits + "0"*(frac_min - len(digits)))
+            else:
+                if kind is INTEGER:
+                    i, digits, max_digits, signed, source_signed = piece[1:]
+                    start, end = positions[i][:2]
+                    if source_signed:
+                        # Keep the sign even if the value is zero.
+                        sign, start = string[start], start + 1
+                    else:
+                        sign = "+"
+                    value = int(string[start:end])
+                else:
+                    slot, digits, max_digits, signed = piece[1:]
+                    value = date[slot]
+                    sign, value = "-" if value < 0 else "+", abs(value)
+                value = "%0*d" % (digits, value)
+                if signed:
+                    push(sign)
+                elif sign == "-" and int(value):
+                    raise ValueError("target format has no sign for %r" % \
+                                         string)
+                if max_digits is not None and len(value) > max_digits:
+                    raise ValueError("too many digits for target format "
+                                     "in %r" % string)
+                push(value)
+        return "".join(out)
+
+    def convert_date(self, string, positions):
+        """Return the (year, month, week, day) of the source date in the
+        target's date form; components not in that form are None."""
+        year, month, week, day = [None if i is None else
+                                  int(string[positions[i][0]:
+                                             positions[i][1]])
+                                  for i in self.date]
+        if self.source_form == "calendar":
+            n = day_number(year, month, day)
+        elif self.source_form == "week":
+            n = week_day_number(year, week, day)
+        else:
+            n = day_number(year) + day - 1
+        if self.target_form == "week":
+            year, week, day = week_date(n)
+            return year, None, week, day
+        year, month, day = calendar_date(n)
+        if self.target_form == "ordinal":
+            return year, None, None, n - day_number(year) + 1
+        return year, month, None, day
+
+    def transcode_many(self, strings, out, end="\n", bufsize=4096):
+        """Transcode each of a sequence of strings (e.g., the lines of a
+        file; a trailing newline is ignored), followed by end, and write
+        the results to out; see Format.format_many. Returns out."""
+        write = writer(out)
+        transcode = self.transcode
+        buf = []
+        for string in strings:
+            buf.append(transcode(string.rstrip("\r\n")))
+            if end:
+                buf.append(end)
+            if len(buf) >= bufsize:
+                write("".join(buf))
+                del buf[:]
+        if buf:
+            write("".join(buf))
+        return out
+
+LITERAL, COPY, INTEGER, FRACTION, DATE = \
+    "literal", "copy", "integer", "fraction", "date" # kinds of template pieces
+
+class CachingFormat(Format):
+    """A format whose read method memoizes its results in a bounded cache
+    keyed by the input string, evicting the least recently used entry when
+    the cache is full. Consecutive duplicate inputs (common in logs) are
+    caught by a separate fast path before the cache is consulted.
+
+    Results are shared between all callers that read the same string, and
+    so must be treated as immutable. Errors are not cached."""
+
+    def __init__(self, format_repr, syntax=RecurringTimeInterval,
+                 maxsize=1024):
+        super(CachingFormat, self).__init__(format_repr, syntax)
+        if maxsize < 1:
+            raise ValueError("cache size must be at least 1")
+        self.maxsize = maxsize
+        self.clear_cache()
+
+    def clear_cache(self):
+        self.cache = OrderedDict()
+        self.last = self.last_value = None
+        self.hits = self.misses = 0
+
+    def read(self, string):
+        if string == self.last:
+            self.hits += 1
+            return self.last_value
+        cache = self.cache
+        try:
+            value = cache.pop(string)
+        except KeyError:
+            value = super(CachingFormat, self).read(string)
+            self.misses += 1
+            if len(cache) >= self.maxsize:
+                cache.popitem(last=False)
+        else:
+            self.hits += 1
+        cache[string] = value # most recently used entries are last
+        self.last, self.last_value = string, value
+        return value
+
+class FixedPointFormat(Format):
+    """A format that reads decimal fractions as Fixed values rather than as
+    Decimals. Fractions are kept to at most the given number of places (by
+    default, 9; i.e., nanoseconds of a second); further digits are truncated.
+    To combine this with caching, derive a class from both this class and
+    CachingFormat."""
+
+    places = 9
+
+class LazyDateTime(DateTime):
+    """A date and time value that keeps its representation in some format
+    and reads it only when its elements are first needed, e.g., to compare
+    it, hash it, or do arithmetic with it. The representation is validated
+    (see Format.mismatch) when the value is made, and str returns it
+    exactly as given. Values derived from a lazy one are ordinary ones.
+    The format must be one for dates and times, or TypeError is raised."""
+
+    def __init__(self, string, format):
+        format = ensure_class(format, Format)
+        try:
+            slots = set(slot for op, slot, _ in format.key_fields())
+        except ValueError:
+            slots = ()
+        if not (any(slot < 4 for slot in slots) and
+                any(4 <= slot < 7 for slot in slots)):
+            raise TypeError("format is not one for dates and times")
+        i = format.mismatch(string)
+        if i is not None:
+            raise StopFormat("invalid representation %r at index %d" % \
+                                 (string, i))
+        self.__dict__.update(string=string, format=format)
+
+    @classmethod
+    def from_elements(cls, elements):
+        return DateTime.from_elements(elements)
+
+    def __getattr__(self, name):
+        if name in ("elements", "date", "time") and "string" in self.__dict__:
+            # Read with a reader of our own, since the format's state may be
+            # in use; e.g., if it's formatting this very value.
+            reader = self.format.reader()
+            reader.feed(self.string)
+            value = reader.close()
+            if type(value) is not DateTime:
+                raise TypeError("%r is not a date and time" % self.string)
+            self.__dict__.update(value.__dict__)
+            return self.__dict__[name]
+        return super(LazyDateTime, self).__getattr__(name)
+
+    def __reduce__(self):
+        # Pickle as an ordinary value, since formats don't pickle.
+        return (DateTime, self.elements)
+
+    def __str__(self):
+        return self.string
+
+key_formats = {} # shape of a representation → format; see sort_key
+digit_shapes = dict((ord(digit), u"0") for digit in u"0123456789")
+
+def sort_key(string):
+    """Return an integer sort key for a representation of a time point in
+    any calendar, ordinal, or week date and time format that can be
+    inferred (see infer_format_repr), such that the keys of representations
+    in different formats and with different offsets from UTC order them by
+    the instants they represent. Suitable for sorted(strings, key=sort_key).
+
+    A format is inferred only once for each shape of representation (its
+    characters, with every digit the same), and its key method does the
+    rest; see Format.key."""
+    shape = unicode(string).translate(digit_shapes)
+    try:
+        format = key_formats[shape]
+    except KeyError:
+        format = key_formats[shape] = Format(infer_format_repr(string))
+    return format.key(string)
@@ -0,0 +1,485 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""Micro-benchmarks for the iso8601 module. Run them from the top-level
+directory with, e.g.,
+
+    PYTHONPATH=. python test/benchmark.py [name ...]
+
+Each benchmark reports the best time per call, in microseconds, for each of
+its variants, along with the speedup of each variant relative to the first."""
+
+from decimal import Decimal
+from timeit import Timer
+import sys
+
+from iso8601 import *
+from iso8601 import TimeDuration, calendar_date
+
+benchmarks = []
+
+def benchmark(func):
+    """Register a benchmark function. It should return a list of (label,
+    microseconds) pairs, the first of which is the baseline."""
+    benchmarks.append(func)
+    return func
+
+def bench(func, number=10000, repeat=3):
+    """Return the best time per call of func, in microseconds."""
+    return min(Timer(func).repeat(repeat, number)) / number * 1e6
+
+@benchmark
+def match():
+    """Format.match versus Format.read"""
+    format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    string = "1985-04-12T23:20:50Z"
+    return [("read", bench(lambda: format.read(string))),
+            ("match", bench(lambda: format.match(string)))]
+
+@benchmark
+def caching():
+    """CachingFormat.read versus Format.read on 1000 repetitive strings"""
+    strings = ["1985-04-12T23:%02d:%02dZ" % (i // 600, i // 10 % 60)
+               for i in range(1000)] # each repeated 10 times in a row
+    def read_all(format):
+        def read():
+            for string in strings:
+                format.read(string)
+        return read
+    return [("read", bench(read_all(Format(u"YYYY-MM-DDThh:mm:ssZ")),
+                           number=10)),
+            ("cached", bench(read_all(CachingFormat(u"YYYY-MM-DDThh:mm:ssZ")),
+                             number=10))]
+
+@benchmark
+def binary():
+    """Round trip through binary.pack and unpack versus format and read"""
+    from binary import pack, unpack
+    format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    value = format.read("1985-04-12T23:20:50Z")
+    return [("format+read", bench(lambda: format.read(format.format(value)))),
+            ("pack+unpack", bench(lambda: unpack(pack(value))))]
+
+@benchmark
+def pickling():
+    """Pickle round trip with the default protocol and with __reduce__"""
+    import cPickle, copy_reg
+    import iso8601
+    value = Format(u"YYYY-MM-DDThh:mm:ss±hh:mm").read("1985-04-12T23:20:50-04:00")
+    def round_trip():
+        cPickle.loads(cPickle.dumps(value, 2))
+
+    # The default protocol 2 reduction pickles the instance dictionary.
+    classes = [cls for cls in vars(iso8601).values()
+               if isinstance(cls, type) and
+                  issubclass(cls, (iso8601.TimeUnit, iso8601.TimeRep))]
+    for cls in classes:
+        copy_reg.pickle(cls, lambda obj: (copy_reg.__newobj__, (type(obj),),
+                                          obj.__dict__))
+    try:
+        default = ("default (%d bytes)" % len(cPickle.dumps(value, 2)),
+                   bench(round_trip))
+    finally:
+        for cls in classes:
+            del copy_reg.dispatch_table[cls]
+    return [default,
+            ("reduce (%d bytes)" % len(cPickle.dumps(value, 2)),
+             bench(round_trip))]
+
+@benchmark
+def carry():
+    """DateTime plus duration, with and without crossing midnight"""
+    from iso8601 import TimeUnitOverflow, Days
+    # DateTime.add_sub as it was, for comparison: overflow of the time raised
+    # an exception, which was caught in order to make a new duration.
+    def time_add(self, other):
+        elements = []
+        carry = 0
+        for x, y, m in zip((self.second, self.minute, self.hour),
+                           (other.seconds, other.minutes, other.hours),
+                           (60, 60, 24)):
+            assert isinstance(y, type(x)), "type mismatch"
+            if x:
+                carry, z = divmod(x.decimal() + y.decimal() + carry, m)
+            else:
+                carry, z = 0, None
+            elements.append(z)
+        elements.reverse()
+        sum = Time(*(elements + [self.utcoffset]))
+        if carry:
+            raise TimeUnitOverflow(sum, carry)
+        return sum
+    def datetime_add(self, other):
+        try:
+            time = time_add(self.time, other)
+        except TimeUnitOverflow as overflow:
+            time = overflow.value
+            other += Days(abs(overflow.carry))
+        return DateTime(self.date + other, time)
+    value = DateTime(CalendarDate(1985, 4, 12), Time(23, 20, 50))
+    short, long = TimeDuration(0, 5, 15), TimeDuration(1, 5, 15)
+    return [("raising, same day", bench(lambda: datetime_add(value, short))),
+            ("raising, next day", bench(lambda: datetime_add(value, long))),
+            ("carry, same day", bench(lambda: value + short)),
+            ("carry, next day", bench(lambda: value + long))]
+
+@benchmark
+def expand():
+    """A year of minutes by repeated addition versus RecurringTimeInterval.expand"""
+    start = DateTime(CalendarDate(2024, 1, 1), Time(0, 0, 0, utc))
+    minute = TimeDuration(0, 1, 0)
+    schedule = RecurringTimeInterval(366*1440, start, minute)
+    def add_all():
+        t = start
+        for i in xrange(366*1440):
+            t += minute
+    return [("addition", bench(add_all, number=1, repeat=1)),
+            ("expand", bench(schedule.expand, number=10))]
+
+@benchmark
+def occurrences():
+    """Next occurrence after a time point, by expansion versus arithmetic"""
+    import numpy as np
+    start = DateTime(CalendarDate(2024, 1, 31), Time(12, 0, 0, utc))
+    t = DateTime(CalendarDate(2025, 6, 15), Time(8, 0, 0, utc))
+    def expand_next(schedule):
+        starts = schedule.expand(end=t + Duration(0, 2))
+        return starts[starts > np.datetime64(t.epoch_seconds(), "s")][0]
+    fixed = RecurringTimeInterval(100000, start, TimeDuration(0, 15, 0))
+    calendar = RecurringTimeInterval(1000, start, Duration(0, 1))
+    return [("expand, fixed", bench(lambda: expand_next(fixed), number=100)),
+            ("expand, calendar",
+             bench(lambda: expand_next(calendar), number=100)),
+            ("next_start, fixed", bench(lambda: fixed.next_start(t))),
+            ("next_start, calendar", bench(lambda: calendar.next_start(t)))]
+
+@benchmark
+def ordering():
+    """Comparing 1000 pairs of durations, and sorting 1000 durations"""
+    import random
+    random.seed(0)
+    durations = [Duration(0, 0, random.randrange(30), random.randrange(24),
+                          random.randrange(60), random.randrange(60))
+                 for i in range(1000)]
+    pairs = zip(durations, reversed(durations))
+    # What callers had to do before: add up the elements on every call.
+    def seconds(duration):
+        years, months, days, hours, minutes, seconds = \
+            [x.decimal() for x in duration.elements]
+        return days*86400 + hours*3600 + minutes*60 + seconds
+    def compare_elements():
+        for a, b in pairs:
+            seconds(a) < seconds(b)
+    def compare():
+        for a, b in pairs:
+            a < b
+    return [("compare elements", bench(compare_elements, number=10)),
+            ("compare", bench(compare, number=10)),
+            ("sort by elements", bench(lambda: sorted(durations, key=seconds),
+                                       number=10)),
+            ("sort by total_seconds",
+             bench(lambda: sorted(durations, key=Duration.total_seconds),
+                   number=10))]
+
+@benchmark
+def constructing():
+    """Checked constructors versus trusted ones"""
+    offset = UTCOffset(-4, 0)
+    return [("CalendarDate()", bench(lambda: CalendarDate(1985, 4, 12))),
+            ("CalendarDate.from_ints", bench(lambda: CalendarDate.from_ints(
+                        1985, 4, 12))),
+            ("Time()", bench(lambda: Time(23, 20, 50, offset))),
+            ("Time.from_values", bench(lambda: Time.from_values(
+                        23, 20, 50, offset))),
+            ("Duration()", bench(lambda: Duration(0, 0, 1, 2, 3, 4))),
+            ("Duration.from_values", bench(lambda: Duration.from_values(
+                        0, 0, 1, 2, 3, 4)))]
+
+@benchmark
+def parsing():
+    """Reading five kinds of value, choosing merges anew or from the table"""
+    from iso8601 import mergers
+    samples = [(Format(u"YYYY-MM-DDThh:mm:ss±hh:mm"),
+                "1985-04-12T23:20:50-04:00"),
+               (Format(u"YYYY-DDDThh:mmZ"), "1985-102T23:20Z"),
+               (Format(u"YYYY-Www-D"), "1985-W15-5"),
+               (Format(u"Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S"), "P1Y2M10DT2H30M15S"),
+               (Format(u"Rn̲/YYYY-MM-DDThh:mm:ssZ/Pnn̲D"),
+                "R12/1985-04-12T23:20:50Z/P1D")]
+    def read_all():
+        for format, string in samples:
+            format.read(string)
+    def read_all_anew():
+        for format, string in samples:
+            mergers.clear()
+            format.read(string)
+    return [("anew", bench(read_all_anew, number=1000)),
+            ("table", bench(read_all, number=1000))]
+
+@benchmark
+def compiling():
+    """Compiling 100 distinct format representations"""
+    import re
+    from iso8601 import FormatReprParser, Element, HardSeparator, Separator, \
+        PrefixDesignator, Coerce, TimeUnit, Z, utc
+    # The parser as it was, for comparison: it probed the slots of each
+    # syntax class on the stack for every character, and made new fops for
+    # every format.
+    class ProbingParser(object):
+        def __init__(self, syntax, format_repr):
+            self.initial_syntax = syntax
+            self.repr = re.sub(r"_(.)", ur"\1̲", format_repr)
+        def __iter__(self):
+            self.i = -1
+            return self
+        def next(self):
+            self.i += 1
+            try:
+                return self.repr[self.i]
+            except IndexError:
+                raise StopIteration
+        def peek(self):
+            try:
+                return self.repr[self.i+1]
+            except IndexError:
+                pass
+        def designator(self, char):
+            if char in self.stack[-1].designators:
+                designate = self.stack[-1].designators[char]
+                if designate is utc:
+                    return Z
+                elif designate and issubclass(designate, TimeUnit):
+                    return Coerce(char, designate)
+                else:
+                    if designate:
+                        self.stack.append(designate)
+                    return PrefixDesignator(char, designate)
+        def separator(self, char):
+            for level, cls in enumerate(reversed(self.stack)):
+                if char in cls.separators:
+                    for i in range(level):
+                        self.stack.pop()
+                    return (HardSeparator if cls.separators[char] \
+                                          else Separator)(char)
+        def element(self, char):
+            signed = False
+            if char == u"±":
+                signed = True
+                char = self.next()
+            def snarf():
+                n = 0
+                repeat = False
+                while self.peek() == char:
+                    n += 1
+                    self.next()
+                if self.peek() == u"\u0332":
+                    repeat = True
+                    n -= 1
+                    self.next()
+                return n, repeat
+            digits, repeat = snarf()
+            digits += 1
+            if self.peek() in (",", "."):
+                separator = self.next()
+                frac, frac_repeat = snarf()
+                return Element(self.stack[-1].digits[char],
+                               (digits, None if repeat else digits),
+                               (frac, None if frac_repeat else frac),
+                               separator, signed)
+            else:
+                return Element(self.stack[-1].digits[char],
+                               (digits, None if repeat else digits),
+                               signed=signed)
+        def parse(self):
+            self.stack = [self.initial_syntax]
+            for char in self:
+                yield (self.designator(char) or
+                       self.separator(char) or
+                       self.element(char))
+    dates = [u"YYYY-MM-DD", u"YYYYMMDD", u"YYYY-DDD", u"YYYY-Www-D", u"YYYY"]
+    times = [u"hh:mm:ss", u"hhmmss", u"hh:mm", u"hh:mm:ss,ss", u"hh"]
+    offsets = [u"Z", u"±hh:mm", u"±hhmm", u""]
+    format_reprs = [u"%sT%s%s" % (d, t, o) for d in dates for t in times
+                    for o in offsets[:2]]
+    format_reprs += [u"Rn̲/%s/Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S" % r
+                     for r in format_reprs]
+    def compile_all(parser):
+        def compile():
+            for format_repr in format_reprs:
+                list(parser(RecurringTimeInterval, format_repr).parse())
+        return compile
+    return [("probing", bench(compile_all(ProbingParser), number=100)),
+            ("tables", bench(compile_all(FormatReprParser), number=100))]
+
+@benchmark
+def streaming():
+    """Writing 1000 formatted values to a cStringIO, one per line"""
+    from cStringIO import StringIO
+    format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    values = [format.read("1985-04-12T23:%02d:%02dZ" % divmod(i, 60))
+              for i in range(1000)]
+    def write_each():
+        out = StringIO()
+        for value in values:
+            out.write(format.format(value))
+            out.write("\n")
+    def write_many():
+        format.format_many(values, StringIO())
+    return [("format+write", bench(write_each, number=20)),
+            ("format_many", bench(write_many, number=20))]
+
+def fixed_point_setup():
+    format_repr = u"YYYY-MM-DDThh:mm:ss,ssssssZ"
+    string = "1985-04-12T23:20:50,123456Z"
+    decimal, fixed = Format(format_repr), FixedPointFormat(format_repr)
+    return string, (decimal, fixed), (decimal.read(string), fixed.read(string))
+
+@benchmark
+def fixed_read():
+    """Reading fractional seconds as Decimal versus Fixed"""
+    string, (decimal, fixed), values = fixed_point_setup()
+    return [("Decimal", bench(lambda: decimal.read(string))),
+            ("Fixed", bench(lambda: fixed.read(string)))]
+
+@benchmark
+def fixed_format():
+    """Formatting Decimal versus Fixed fractional seconds"""
+    string, (decimal, fixed), values = fixed_point_setup()
+    return [("Decimal", bench(lambda: decimal.format(values[0]))),
+            ("Fixed", bench(lambda: fixed.format(values[1])))]
+
+@benchmark
+def fixed_add():
+    """Adding a duration to Decimal versus Fixed fractional seconds"""
+    string, formats, values = fixed_point_setup()
+    decimal = TimeDuration(0, 0, Decimal("10.5"))
+    fixed = TimeDuration(0, 0, Fixed(105, 1))
+    return [("Decimal", bench(lambda: values[0] + decimal)),
+            ("Fixed", bench(lambda: values[1] + fixed))]
+
+@benchmark
+def dedup():
+    """A set of 1000 parsed values, hashing anew and with cached hashes"""
+    format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    strings = ["1985-04-12T23:%02d:%02dZ" % divmod(i % 500, 60)
+               for i in range(1000)]
+    def read_all():
+        return [format.read(string) for string in strings]
+    values = read_all()
+    set(values) # compute and cache the hashes
+    return [("fresh", bench(lambda: set(read_all()), number=10) -
+                      bench(read_all, number=10)),
+            ("cached", bench(lambda: set(values), number=10))]
+
+@benchmark
+def coalescing():
+    """Coalescing 500 overlapping intervals, pairwise versus IntervalSet"""
+    from intervalset import IntervalSet
+    start = DateTime(CalendarDate(1985, 4, 12), Time(0, 0, 0, utc))
+    intervals = [TimeInterval(start + TimeDuration(0, i*7 % 500, 0),
+                              TimeDuration(0, 3, 0))
+                 for i in range(500)]
+    # Merging each interval into a list of disjoint ones, resolving the
+    # end-points of each interval whenever it is compared.
+    def pairwise():
+        merged = []
+        for interval in intervals:
+            a, b = interval.endpoints()
+            rest = []
+            for other in merged:
+                c, d = other.endpoints()
+                if c.epoch_seconds() <= b.epoch_seconds() and \
+                        a.epoch_seconds() <= d.epoch_seconds():
+                    if c.epoch_seconds() < a.epoch_seconds():
+                        a = c
+                    if d.epoch_seconds() > b.epoch_seconds():
+                        b = d
+                else:
+                    rest.append(other)
+            merged = rest + [TimeInterval(a, b)]
+        return merged
+    return [("pairwise", bench(pairwise, number=1)),
+            ("sweep", bench(lambda: list(IntervalSet(intervals)), number=1))]
+
+@benchmark
+def sorting():
+    """Sorting 1000 strings in mixed formats, by reading versus by sort_key"""
+    from iso8601 import infer_format_repr
+    shapes = ("1985-04-12T%02d:%02d:00Z", "19850412T%02d%02d00+0100",
+              "1985-102T%02d:%02d:00.5-05:00", "1985W155T%02d%02d00Z")
+    strings = [shapes[i % 4] % divmod(i*7 % 1440, 60) for i in range(1000)]
+    # Reading gets the right format for each string for free.
+    formats = [Format(infer_format_repr(shape % (0, 0))) for shape in shapes]
+    format_of = dict((string, formats[i % 4])
+                     for i, string in enumerate(strings))
+    def read(string):
+        return format_of[string].read(string).epoch_seconds()
+    return [("read", bench(lambda: sorted(strings, key=read), number=10)),
+            ("sort_key", bench(lambda: sorted(strings, key=sort_key),
+                               number=10))]
+
+@benchmark
+def transcoding():
+    """Basic to extended format, read-then-format versus a Transcoder"""
+    source = Format(u"YYYYMMDDThhmmssZ")
+    target = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    transcoder = source.transcoder(target)
+    string = "20240115T103000Z"
+    return [("read+format", bench(lambda: target.format(source.read(string)))),
+            ("transcode", bench(lambda: transcoder.transcode(string)))]
+
+@benchmark
+def transcoding_dates():
+    """Ordinal to calendar dates, computing the date in the transcoder"""
+    source = Format(u"YYYY-DDDThh:mm:ss,ss")
+    target = Format(u"YYYYMMDDThhmmss,ss")
+    string = "1985-102T23:20:50,25"
+    transcoder = source.transcoder(target)
+    # Reading an ordinal date and formatting it as a calendar date needs
+    # an explicit conversion.
+    def read_format():
+        value = source.read(string)
+        date = value.date
+        n = date.epoch_day()
+        return target.format(DateTime(CalendarDate(*calendar_date(n)),
+                                      value.time))
+    return [("read+format", bench(read_format)),
+            ("transcode", bench(lambda: transcoder.transcode(string)))]
+
+@benchmark
+def transcoding_stream():
+    """Transcoding 1000 lines, read-then-format_many versus transcode_many"""
+    from cStringIO import StringIO
+    source = Format(u"YYYYMMDDThhmmssZ")
+    target = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    transcoder = source.transcoder(target)
+    lines = ["19850412T23%02d%02dZ\n" % divmod(i, 60) for i in range(1000)]
+    return [("format_many", bench(lambda: target.format_many(
+                    (source.read(line.rstrip()) for line in lines),
+                    StringIO()), number=10)),
+            ("transcode_many", bench(lambda: transcoder.transcode_many(
+                    lines, StringIO()), number=10))]
+
+@benchmark
+def lazy():
+    """Reading and writing back 1000 values, eagerly versus lazily"""
+    format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    strings = ["1985-04-12T23:%02d:%02dZ" % divmod(i, 60) for i in range(1000)]
+    def eager():
+        return [str(format.read(string)) for string in strings]
+    def lazy():
+        return [str(LazyDateTime(string, format)) for string in strings]
+    return [("eager", bench(eager, number=10)),
+            ("lazy", bench(lazy, number=10))]
+
+def run(names=()):
+    for func in benchmarks:
+        if names and func.__name__ not in names:
+            continue
+        results = func()
+        print "%s: %s" % (func.__name__, func.__doc__)
+        baseline = results[0][1]
+        for label, usec in results:
+            print "    %-24s %10.2f usec %8.2fx" % (label, usec, baseline/usec)
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
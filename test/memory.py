@@ -0,0 +1,204 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""Memory footprint benchmarks for the iso8601 module. Run them from the
+top-level directory with, e.g.,
+
+    PYTHONPATH=. python test/memory.py [-n count] [--json] [name ...]
+
+For each kind of representation, two numbers are reported: the bytes per
+object, which is the size of one parsed value and everything it refers to
+that isn't shared with every other value (its elements, nested
+representations, per-instance dictionaries, and numbers); and the peak
+memory used to parse count distinct values into a list, which is measured
+in a child process so that the benchmarks don't disturb one another. With
+--json, the results are written as a JSON object, so that they may be
+saved and compared from one revision to the next.
+
+Python 2 has no tracemalloc, so sizes are computed with sys.getsizeof and
+peaks are taken from getrusage. At the default count of a million values,
+the largest representations need several gigabytes of memory."""
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+from iso8601 import *
+from iso8601 import calendar_date
+
+memory_benchmarks = []
+
+def memory_benchmark(func):
+    """Register a memory benchmark. It should return a function that reads
+    a representation, such as a format's read method, and a function of an
+    integer i that returns the i'th of many distinct representations."""
+    memory_benchmarks.append(func)
+    return func
+
+def footprint(obj, sizes, seen):
+    """Add the size in bytes of obj and of the objects it refers to that
+    aren't in seen to sizes, a dictionary keyed by category. Classes, None,
+    booleans, the small integers that Python caches, UTC, and formats are
+    shared by every value, and so aren't counted; neither are the keys of
+    dictionaries, which are interned attribute names."""
+    if id(obj) in seen or obj is None or obj is utc or \
+            isinstance(obj, (type, bool, Format)) or \
+            type(obj) is int and -5 <= obj <= 256:
+        return
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    sizes["objects"] += 1
+    if isinstance(obj, dict):
+        sizes["dicts"] += size
+        for value in obj.values():
+            footprint(value, sizes, seen)
+    elif isinstance(obj, (tuple, list)):
+        sizes["sequences"] += size
+        for elt in obj:
+            footprint(elt, sizes, seen)
+    else:
+        sizes["instances"] += size
+        if hasattr(obj, "__dict__"):
+            footprint(obj.__dict__, sizes, seen)
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                footprint(getattr(obj, slot, None), sizes, seen)
+
+def sizes_of(obj):
+    sizes = dict.fromkeys(["objects", "dicts", "sequences", "instances"], 0)
+    footprint(obj, sizes, set())
+    sizes["bytes"] = sizes["dicts"] + sizes["sequences"] + sizes["instances"]
+    return sizes
+
+def max_rss():
+    """Return the peak resident set size of this process, in bytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024 # KiB on Linux
+
+def bulk_parse(read, strings):
+    """Parse strings into a list in a child process, and return the growth
+    of its peak resident set size and the time taken."""
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        baseline, start = max_rss(), time.time()
+        values = [read(string) for string in strings]
+        result = (max_rss() - baseline, time.time() - start)
+        os.write(w, json.dumps(result))
+        os._exit(0)
+    os.close(w)
+    data = []
+    while True:
+        chunk = os.read(r, 4096)
+        if not chunk:
+            break
+        data.append(chunk)
+    os.close(r)
+    if os.waitpid(pid, 0)[1] != 0:
+        raise RuntimeError("bulk parse failed (out of memory?)")
+    return json.loads("".join(data))
+
+def timestamp(i):
+    """Return the i'th of a series of distinct date and time values, as a
+    tuple (year, month, day, hour, minute, second)."""
+    days, seconds = divmod(i * 7919, 86400)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return calendar_date(days) + (hour, minute, second)
+
+@memory_benchmark
+def datetime():
+    """DateTime with an offset from UTC"""
+    offsets = ["+01:00", "-05:00", "+05:30", "-03:30"]
+    return (Format(u"YYYY-MM-DDThh:mm:ss±hh:mm").read,
+            lambda i: "%04d-%02d-%02dT%02d:%02d:%02d" % timestamp(i) +
+                      offsets[i % 4])
+
+@memory_benchmark
+def datetime_utc():
+    """DateTime in UTC"""
+    return (Format(u"YYYY-MM-DDThh:mm:ssZ").read,
+            lambda i: "%04d-%02d-%02dT%02d:%02d:%02dZ" % timestamp(i))
+
+@memory_benchmark
+def lazy_datetime():
+    """LazyDateTime in UTC, unread"""
+    format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+    return (lambda string: LazyDateTime(string, format),
+            lambda i: "%04d-%02d-%02dT%02d:%02d:%02dZ" % timestamp(i))
+
+@memory_benchmark
+def duration():
+    """Duration with every component"""
+    return (Format(u"Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S").read,
+            lambda i: "P%dY%dM%dDT%dH%dM%dS" % (i % 300, i % 12, i % 31,
+                                                 i % 24, i % 60, i % 997))
+
+@memory_benchmark
+def recurring():
+    """RecurringTimeInterval with a start and a duration"""
+    return (Format(u"Rn̲/YYYY-MM-DDThh:mm:ssZ/PTnn̲Hnn̲M").read,
+            lambda i: "R%d/%04d-%02d-%02dT%02d:%02d:%02dZ" % \
+                ((i % 1000,) + timestamp(i)) +
+                "/PT%dH%dM" % (i % 24 + 1, i % 60))
+
+def run(names=(), count=10**6):
+    """Run the memory benchmarks and return their results, keyed by name."""
+    results = {}
+    for func in memory_benchmarks:
+        if names and func.__name__ not in names:
+            continue
+        read, make = func()
+        strings = [make(i) for i in xrange(count)]
+        sizes = sizes_of(read(strings[-1]))
+        peak, seconds = bulk_parse(read, strings)
+        del strings
+        results[func.__name__] = {
+            "description": func.__doc__,
+            "bytes_per_object": sizes["bytes"],
+            "objects_per_value": sizes["objects"],
+            "dict_bytes_per_object": sizes["dicts"],
+            "sequence_bytes_per_object": sizes["sequences"],
+            "instance_bytes_per_object": sizes["instances"],
+            "count": count,
+            "peak_bytes": peak,
+            "peak_bytes_per_value": float(peak) / count,
+            "seconds": seconds,
+        }
+    return results
+
+def report(results):
+    for name, result in sorted(results.items()):
+        print "%s: %s" % (name, result["description"])
+        print "    %-24s %10d (%d objects; %d in dicts)" % \
+            ("bytes per object", result["bytes_per_object"],
+             result["objects_per_value"], result["dict_bytes_per_object"])
+        print "    %-24s %10d (%.1f per value, %d values in %.1f s)" % \
+            ("peak bytes", result["peak_bytes"],
+             result["peak_bytes_per_value"], result["count"],
+             result["seconds"])
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure the memory footprint of "
+                                        "parsed time representations.")
+    parser.add_argument("-n", "--count", type=int, default=10**6,
+                        help="number of values to parse in bulk")
+    parser.add_argument("--json", action="store_true",
+                        help="write the results as JSON")
+    parser.add_argument("names", nargs="*", help="benchmarks to run")
+    args = parser.parse_args()
+    results = run(args.names, args.count)
+    if args.json:
+        json.dump({"python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "count": args.count,
+                   "results": results},
+                  sys.stdout, indent=2, separators=(",", ": "),
+                  sort_keys=True)
+        print
+    else:
+        report(results)
@@ -0,0 +1,65 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+from decimal import Decimal
+from unittest import *
+
+from iso8601 import *
+from iso8601 import TimeUnit
+from binary import *
+
+april_12 = DateTime(CalendarDate(1985, 4, 12), Time(23, 20, 50))
+june_25 = DateTime(CalendarDate(1985, 6, 25), Time(10, 30, 0, utc))
+duration = Duration(1, 2, 15, 12, 30, Decimal("0.5"))
+
+class TestBinary(TestCase):
+    values = [Year(1985), Hour(-5, signed=True),
+              TimeUnit(Decimal("-1.25"), signed=True),
+              TimeUnit(Fixed(-125, 2), signed=True), Second(Fixed(50, 3)),
+              CalendarDate(1985, 4, 12), CalendarDate(1985, 4),
+              OrdinalDate(1985, 102), WeekDate(1985, 15, 5), WeekDate(1985, 15),
+              UTCOffset(-4, 30), UTCOffset(1), utc,
+              Time(23, 20, Decimal("50.5")), Time(23, None, None, utc),
+              april_12, june_25, duration, WeeksDuration(6),
+              TimeInterval(april_12, june_25), TimeInterval(duration),
+              RecurringTimeInterval(12, april_12, duration),
+              RecurringTimeInterval(3, duration, june_25)]
+
+    def assertSame(self, a, b):
+        self.assertEqual(type(a), type(b))
+        self.assertEqual(a, b)
+        self.assertEqual(str(a), str(b))
+
+    def test_round_trip(self):
+        """Pack and unpack single values"""
+        for value in self.values:
+            self.assertSame(unpack(pack(value)), value)
+        self.assertTrue(unpack(pack(utc)) is utc)
+        self.assertTrue(unpack(pack(Hour(-5, signed=True))).signed)
+        self.assertEqual(repr(unpack(pack(Second(Fixed(50, 3)))).value),
+                         "Fixed(50, 3)")
+
+    def test_many(self):
+        """Pack and unpack batches"""
+        for a, b in zip(unpack_many(pack_many(self.values)), self.values):
+            self.assertSame(a, b)
+        self.assertEqual(unpack_many(pack_many([])), [])
+
+    def test_compact(self):
+        """Encodings are smaller than strings"""
+        self.assertEqual(len(pack(june_25)), 18)
+        self.assertTrue(len(pack(june_25)) < len(str(june_25)))
+
+    def test_version(self):
+        """Reject unknown versions"""
+        self.assertRaises(ValueError, lambda: unpack("\xff" + pack(utc)[1:]))
+        self.assertRaises(ValueError, lambda: unpack(""))
+
+def suite():
+    return TestSuite([TestLoader().loadTestsFromTestCase(cls) \
+                          for cls in (TestBinary,)])
+
+def run(runner=TextTestRunner, **args):
+    return runner(**args).run(suite())
+
+if __name__ == "__main__":
+    run(verbosity=2)
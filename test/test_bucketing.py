@@ -0,0 +1,138 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+from decimal import Decimal
+from unittest import *
+
+from iso8601 import *
+from iso8601 import TimeDuration
+from timearray import *
+from bucketing import *
+
+april_12 = DateTime(CalendarDate(1985, 4, 12),
+                    Time(23, 20, Decimal("50.5"), UTCOffset(-5, 0)))
+
+class TestTruncate(TestCase):
+    def test_date(self):
+        """Truncate to date accuracies"""
+        self.assertEqual(truncate(april_12, Year), CalendarDate(1985))
+        self.assertEqual(truncate(april_12, Month), CalendarDate(1985, 4))
+        self.assertEqual(truncate(april_12, Day), CalendarDate(1985, 4, 12))
+        self.assertEqual(truncate(april_12, Week), WeekDate(1985, 15))
+        self.assertEqual(truncate(OrdinalDate(1985, 102), Month),
+                         CalendarDate(1985, 4))
+
+    def test_time(self):
+        """Truncate to time accuracies in local time"""
+        date = CalendarDate(1985, 4, 12)
+        offset = UTCOffset(-5, 0)
+        self.assertEqual(truncate(april_12, Hour),
+                         DateTime(date, Time(23, None, None, offset)))
+        self.assertEqual(str(truncate(april_12, Minute)),
+                         "1985-04-12T23:20-05:00")
+        self.assertEqual(truncate(april_12, Second),
+                         DateTime(date, Time(23, 20, 50, offset)))
+        self.assertEqual(truncate(DateTime(date, Time(23, Decimal("20.8"))),
+                                  Second),
+                         DateTime(date, Time(23, 20, 48)))
+        self.assertRaises(ValueError, lambda: truncate(date, Hour))
+
+    def test_array(self):
+        """Truncate arrays without materializing values"""
+        values = [april_12,
+                  DateTime(WeekDate(1985, 15, 5), Time(10, 15, 30, utc)),
+                  DateTime(CalendarDate(1969, 12, 31), Time(23, 59, 59))]
+        array = DateTimeArray(values, "ms")
+        for accuracy in (Year, Month, Week, Day, Hour, Minute, Second):
+            for a, b in zip(truncate_all(array, accuracy), values):
+                # Arrays always materialize DateTimes.
+                expected = truncate(b, accuracy)
+                if isinstance(expected, DateTime):
+                    self.assertEqual(a, expected)
+                    self.assertEqual(a.epoch_seconds(),
+                                     expected.epoch_seconds())
+                else:
+                    self.assertEqual(type(a.date), type(expected))
+                    self.assertEqual(a.date, expected)
+
+class TestBucket(TestCase):
+    origin = DateTime(CalendarDate(1985, 1, 31), Time(0, 0, 0, utc))
+
+    def test_fixed(self):
+        """Buckets of fixed duration"""
+        self.assertEqual(bucket(april_12, Duration(0, 0, 0, 6), self.origin),
+                         DateTime(CalendarDate(1985, 4, 13), Time(0, 0, 0, utc)))
+        self.assertEqual(bucket(april_12, WeeksDuration(1), self.origin),
+                         DateTime(CalendarDate(1985, 4, 11), Time(0, 0, 0, utc)))
+        before = DateTime(CalendarDate(1985, 1, 30), Time(23, 0, 0, utc))
+        self.assertEqual(bucket(before, Duration(0, 0, 1), self.origin),
+                         DateTime(CalendarDate(1985, 1, 30), Time(0, 0, 0, utc)))
+
+    def test_fixed_point(self):
+        """Bucket values read with fixed-point fractions"""
+        format = FixedPointFormat(u"YYYY-MM-DDThh:mm:ss,sssZ")
+        value = format.read("1985-04-12T23:20:50,500Z")
+        self.assertEqual(bucket(value, Duration(0, 0, 0, 6), self.origin),
+                         DateTime(CalendarDate(1985, 4, 12),
+                                  Time(18, 0, 0, utc)))
+        self.assertEqual(bucket(value, TimeDuration(0, 0, Decimal("0.25")),
+                                self.origin),
+                         DateTime(CalendarDate(1985, 4, 12),
+                                  Time(23, 20, Decimal("50.5"), utc)))
+
+    def test_calendar(self):
+        """Buckets of calendar months, with clipping"""
+        month = Duration(0, 1)
+        self.assertEqual(bucket(april_12, month, self.origin),
+                         DateTime(CalendarDate(1985, 3, 31), Time(0, 0, 0, utc)))
+        self.assertEqual(bucket(DateTime(CalendarDate(1985, 3, 1),
+                                         Time(0, 0, 0, utc)),
+                                month, self.origin),
+                         DateTime(CalendarDate(1985, 2, 28), Time(0, 0, 0, utc)))
+        self.assertRaises(ValueError,
+                          lambda: bucket(april_12, Duration(0, 1, 1),
+                                         self.origin))
+
+    def test_array(self):
+        """Bucket arrays by fixed durations"""
+        values = [april_12, self.origin]
+        array = DateTimeArray(values)
+        hours = Duration(0, 0, 0, 6)
+        self.assertEqual(list(bucket_all(array, hours, self.origin)),
+                         [bucket(x, hours, self.origin) for x in values])
+
+        # Buckets must be a whole number of the array's units wide.
+        array_ms = DateTimeArray(values, "ms")
+        for seconds in (Decimal("0.5"), Decimal("1.5")):
+            width = TimeDuration(0, 0, seconds)
+            self.assertRaises(ValueError,
+                              lambda: bucket_all(array, width, self.origin))
+            self.assertEqual(list(bucket_all(array_ms, width, self.origin)),
+                             [bucket(x, width, self.origin) for x in values])
+
+class TestCount(TestCase):
+    def test_count(self):
+        """Count in buckets"""
+        values = [DateTime(CalendarDate(1985, 4, d), Time(h, 0, 0, utc))
+                  for d, h in [(12, 1), (13, 2), (12, 3), (14, 4), (13, 5)]]
+        expected = [(CalendarDate(1985, 4, 12), 2),
+                    (CalendarDate(1985, 4, 13), 2),
+                    (CalendarDate(1985, 4, 14), 1)]
+        self.assertEqual(count(values, Day), expected)
+        self.assertEqual([(b.date, n)
+                          for b, n in count(DateTimeArray(values), Day)],
+                         expected)
+        origin = DateTime(CalendarDate(1985, 4, 12), Time(0, 0, 0, utc))
+        self.assertEqual(count(values, Duration(0, 0, 2), origin),
+                         [(origin, 4),
+                          (DateTime(CalendarDate(1985, 4, 14),
+                                    Time(0, 0, 0, utc)), 1)])
+
+def suite():
+    return TestSuite([TestLoader().loadTestsFromTestCase(cls) \
+                          for cls in (TestTruncate, TestBucket, TestCount)])
+
+def run(runner=TextTestRunner, **args):
+    return runner(**args).run(suite())
+
+if __name__ == "__main__":
+    run(verbosity=2)
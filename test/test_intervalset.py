@@ -0,0 +1,102 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+from decimal import Decimal
+from unittest import *
+
+from iso8601 import *
+from intervalset import *
+
+def datetime(day, hour, offset=utc):
+    return DateTime(CalendarDate(1985, 4, day), Time(hour, 0, 0, offset))
+
+def interval(start, end, day=12):
+    return TimeInterval(datetime(day, start), datetime(day, end))
+
+class TestIntervalSet(TestCase):
+    def assertIntervals(self, intervals, expected):
+        self.assertEqual(map(str, intervals), expected)
+
+    def test_coalesce(self):
+        """Coalesce overlapping and abutting intervals in any form"""
+        hours = Duration(0, 0, 0, 2)
+        self.assertIntervals(coalesce([interval(10, 12),
+                                       TimeInterval(hours, datetime(12, 15)),
+                                       interval(8, 11),
+                                       interval(12, 13),
+                                       interval(14, 14),
+                                       TimeInterval(datetime(12, 20), hours)]),
+                             ["1985-04-12T08:00:00Z/1985-04-12T15:00:00Z",
+                              "1985-04-12T20:00:00Z/1985-04-12T22:00:00Z"])
+        self.assertEqual(coalesce([]), [])
+        self.assertRaises(ValueError, lambda: coalesce([interval(12, 10)]))
+        self.assertRaises(ValueError,
+                          lambda: coalesce([TimeInterval(hours)]))
+
+    def test_offset(self):
+        """Resolve offsets and dates; express results with an offset"""
+        eastern = UTCOffset(-5, 0)
+        s = IntervalSet([TimeInterval(datetime(12, 18, eastern),
+                                      datetime(13, 1)),
+                         TimeInterval(CalendarDate(1985, 4, 13),
+                                      CalendarDate(1985, 4, 14))],
+                        offset=eastern)
+        self.assertIntervals(s, ["1985-04-12T18:00:00-05:00/"
+                                 "1985-04-13T19:00:00-05:00"])
+
+    def test_algebra(self):
+        """Union, intersection, and difference"""
+        a = IntervalSet([interval(1, 3), interval(5, 8), interval(10, 12)])
+        b = IntervalSet([interval(2, 6), interval(8, 10), interval(11, 11)])
+        self.assertIntervals(a | b,
+                             ["1985-04-12T01:00:00Z/1985-04-12T12:00:00Z"])
+        self.assertIntervals(a & b,
+                             ["1985-04-12T02:00:00Z/1985-04-12T03:00:00Z",
+                              "1985-04-12T05:00:00Z/1985-04-12T06:00:00Z"])
+        self.assertIntervals(a - b,
+                             ["1985-04-12T01:00:00Z/1985-04-12T02:00:00Z",
+                              "1985-04-12T06:00:00Z/1985-04-12T08:00:00Z",
+                              "1985-04-12T10:00:00Z/1985-04-12T12:00:00Z"])
+        self.assertIntervals(b - a,
+                             ["1985-04-12T03:00:00Z/1985-04-12T05:00:00Z",
+                              "1985-04-12T08:00:00Z/1985-04-12T10:00:00Z"])
+        self.assertEqual(a.union([interval(2, 6), interval(8, 10)]), a | b)
+        self.assertEqual(a - a, IntervalSet())
+        self.assertEqual(len(a & IntervalSet()), 0)
+        self.assertEqual((a | b).total_seconds(), 11*3600)
+
+    def test_contains(self):
+        """Membership of time points, with half-open intervals"""
+        a = IntervalSet([interval(1, 3), interval(5, 8)])
+        self.assertTrue(datetime(12, 1) in a)
+        self.assertTrue(datetime(12, 2) in a)
+        self.assertFalse(datetime(12, 3) in a)
+        self.assertFalse(datetime(12, 0) in a)
+        self.assertTrue(datetime(12, 5) in a)
+        self.assertFalse(datetime(12, 8) in a)
+        self.assertFalse(datetime(12, 9) in IntervalSet())
+
+        # Instants may be given directly, with or without fractions.
+        end = datetime(12, 3).epoch_seconds()
+        self.assertTrue(end - 1 in a)
+        self.assertFalse(end in a)
+        self.assertTrue(end - Decimal("0.5") in a)
+        self.assertTrue(end - Fixed(5, 1) in a)
+        self.assertFalse(end + Decimal("0.5") in a)
+        self.assertFalse(end + Fixed(5, 1) in a)
+
+    def test_format(self):
+        """Results format with the usual machinery"""
+        format = Format(u"YYYYMMDDThhmmZ/YYYYMMDDThhmmZ")
+        s = IntervalSet([interval(1, 3)])
+        self.assertEqual([format.format(i) for i in s],
+                         ["19850412T0100Z/19850412T0300Z"])
+
+def suite():
+    return TestSuite([TestLoader().loadTestsFromTestCase(cls) \
+                          for cls in (TestIntervalSet,)])
+
+def run(runner=TextTestRunner, **args):
+    return runner(**args).run(suite())
+
+if __name__ == "__main__":
+    run(verbosity=2)
@@ -2,12 +2,24 @@
 
 from decimal import Decimal
 from unittest import *
+from operator import add, sub
+from cStringIO import StringIO
+import copy
+import io
+import pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from iso8601 import *
 from iso8601 import TimeUnitOverflow, TimeUnit, Cardinal, \
     TimePoint, TimeDuration, \
     Element, Separator, PrefixDesignator, FormatReprParser, \
-    leap_year, days_in_month
+    leap_year, days_in_month, weeks_in_year, \
+    day_number, calendar_date, week_day_number, week_date, infer_format_repr, \
+    floor_divmod, merge_pair, mergers
 
 class TestTimeUnit(TestCase):
     def test_from_int(self):
@@ -56,6 +68,24 @@ class TestMerge(TestCase):
                          for k in range(0, end + 1)]
                     self.assertEqual(elements[i] | elements[j], Duration(*p))
 
+    def test_dispatch(self):
+        """Merge functions are chosen once per pair of classes"""
+        mergers.clear()
+        self.assertEqual(Year(1985) | Month(4), CalendarDate(1985, 4))
+        self.assertTrue((Year, Month) in mergers)
+        self.assertEqual(Year(1985) | Month(4), CalendarDate(1985, 4))
+        self.assertEqual(len(mergers), 1)
+        self.assertEqual(merge_pair(Year(1985), Week(15)), WeekDate(1985, 15))
+        self.assertEqual(merge_pair(Year(1985), Hour(1)), None)
+
+        # Some merges still depend on the values, not just their classes.
+        self.assertEqual(type(Hour(5) | Minute(0)), Time)
+        self.assertEqual(type(Hour(-5, signed="-") | Minute(0)), UTCOffset)
+        time = Time(12)
+        self.assertEqual(time | Hour(-5, signed="-"),
+                         Time(12, None, None, UTCOffset(-5)))
+        self.assertEqual(Time(None) | Hour(5), Time(5))
+
 class TestFormatReprParser(TestCase):
     class X(TimePoint):
         """Dummy time element."""
@@ -96,6 +126,22 @@ class TestFormatReprParser(TestCase):
         """Designator in format representation"""
         self.assertFormatRepr("T", PrefixDesignator("T", Time))
 
+    def test_syntax_table(self):
+        """Syntax tables derived from the merged slots"""
+        table = self.X.table()
+        self.assertEqual(table["X"], (None, TimeUnit, (self.X,)))
+        self.assertEqual(table[u"‐"], (Separator(u"‐"), None, (self.X,)))
+        self.assertEqual(table["T"],
+                         (PrefixDesignator("T", Time), None, (self.X, Time)))
+        self.assertTrue(self.X.table() is table)
+        self.assertEqual(Time.table((self.X,))[u"‐"][2], (self.X,))
+        self.assertEqual(Time.table((self.X,))[":"][2], (self.X, Time))
+        def mutate():
+            table["Y"] = None
+        self.assertRaises(TypeError, mutate)
+        self.assertRaises(KeyError,
+                          lambda: list(FormatReprParser(self.X, u"±T").parse()))
+
 class TestElementFormat(TestCase):
     class FormatOneOp(Format):
         """A format machine with exactly one fop."""
@@ -124,6 +170,9 @@ class TestElementFormat(TestCase):
         self.assertElementFormat("12,00", int(d), (2, 2), (2, None))
         self.assertElementFormat("12,34", d, (2, 2), (2, None))
         self.assertElementFormat("12,3400", d, (2, 2), (4, None))
+        self.assertElementFormat("12,05", Decimal("12.05"), (2, 2), (2, None))
+        self.assertElementFormat("12,0050", Decimal("12.005"), (2, 2),
+                                 (4, None))
 
     def test_max_frac_width(self):
         """Maximum fractional width"""
@@ -585,6 +634,388 @@ class TestStandardFormats(TestCase):
         self.assertString(RecurringTimeInterval(12, april_4, june_25),
                           "R12/1985-04-12T23:20:50/1985-06-25T10:30:00")
 
+class TestMatch(TestCase):
+    def test_valid(self):
+        """Validate well-formed representations"""
+        self.assertTrue(Format(u"YYYY-MM-DDThh:mm:ssZ").match(
+                "1985-07-31T23:20:50Z"))
+        self.assertTrue(Format(u"YYYYDDD").match("1984366"))
+        self.assertTrue(Format(u"YYYY-Www-D").match("2015-W53-7"))
+        self.assertTrue(Format(u"hh:mm:ss,ss̲").match("23:59:59,5"))
+        self.assertTrue(Format(u"Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S").match(
+                "P1Y2M15DT12H30M0S"))
+        self.assertTrue(Format(u"YYYYMMDD/YYYYMMDD").match(
+                "19840229/19850228"))
+
+    def test_syntax(self):
+        """Report the position of syntax errors"""
+        format = Format(u"YYYY-MM-DDThh:mm:ss")
+        self.assertEqual(format.mismatch("1985-04-12T23:20:50"), None)
+        self.assertEqual(format.mismatch("1985/04-12T23:20:50"), 4)
+        self.assertEqual(format.mismatch("1985-04-12T23:2"), 14)
+        self.assertEqual(format.mismatch("1985-04-12T23:20:50Z"), 19)
+
+    def test_range(self):
+        """Report the position of out-of-range components"""
+        self.assertEqual(Format(u"YYYY-MM-DD").mismatch("1985-13-01"), 5)
+        self.assertEqual(Format(u"hh:mm").mismatch("23:60"), 3)
+        self.assertEqual(Format(u"hh:mm:ss,ss̲").mismatch("23:59:60,5"), 6)
+        self.assertEqual(Format(u"hh,hh̲").mismatch("24,5"), 0)
+
+    def test_day(self):
+        """Check days against months and years"""
+        self.assertEqual(Format(u"YYYY-MM-DD").mismatch("1985-02-29"), 8)
+        self.assertEqual(Format(u"YYYY-MM-DD").mismatch("1984-02-29"), None)
+        self.assertEqual(Format(u"YYYY-MM-DD").mismatch("1985-04-00"), 8)
+        self.assertEqual(Format(u"YYYYDDD").mismatch("1985366"), 4)
+        self.assertEqual(Format(u"YYYYWwwD").mismatch("1985W158"), 7)
+
+    def test_week_53(self):
+        """Check that week 53 exists"""
+        self.assertTrue(Format(u"YYYY-Www").match("2020-W53"))
+        self.assertFalse(Format(u"YYYY-Www").match("2019-W53"))
+        self.assertEqual([year for year in range(2000, 2030)
+                          if weeks_in_year(year) == 53],
+                         [2004, 2009, 2015, 2020, 2026])
+
+class TestFormatReader(TestCase):
+    def read_chunks(self, format, chunks):
+        reader = Format(format).reader()
+        values = []
+        for chunk in chunks:
+            i = reader.feed(chunk)
+            while i is not None:
+                values.append(reader.value)
+                reader.reset()
+                i = reader.feed(chunk, i)
+        value = reader.close()
+        return values + [value] if value else values
+
+    def test_split(self):
+        """Read values split at every possible point"""
+        format = u"YYYY-MM-DDThh:mm:ss,ss̲Z"
+        string = "1985-04-12T23:20:50,25Z1985-04-13t23:20:50,5Z"
+        values = [Format(format).read(string[:23]),
+                  Format(format).read(string[23:])]
+        for i in range(len(string) + 1):
+            self.assertEqual(self.read_chunks(format, [string[:i], string[i:]]),
+                             values)
+
+    def test_single_characters(self):
+        """Read a value one character at a time"""
+        string = "R12/19850412T232050/P1Y2M15DT12H30M0S"
+        self.assertEqual(self.read_chunks(u"Rn̲/YYYYMMDDThhmmss/"
+                                          u"Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S",
+                                          list(string)),
+                         [RecurringTimeInterval(12,
+                                                DateTime(CalendarDate(1985, 4,
+                                                                      12),
+                                                         Time(23, 20, 50)),
+                                                Duration(1, 2, 15,
+                                                         12, 30, 0))])
+
+    def test_need_more(self):
+        """Wait for more input at the end of a variable-width element"""
+        reader = Format(u"hh:mm:ss,ss̲").reader()
+        self.assertEqual(reader.feed("23:20:50,5"), None)
+        self.assertEqual(reader.feed("5", 0), None)
+        self.assertEqual(reader.close(), Time(23, 20, Decimal("50.55")))
+
+    def test_error(self):
+        """Invalid and incomplete input"""
+        reader = Format(u"YYYY-MM-DD").reader()
+        self.assertEqual(reader.feed("1985-0"), None)
+        self.assertRaises(StopFormat, lambda: reader.feed("x-12"))
+        reader = Format(u"YYYY-MM-DD").reader()
+        self.assertEqual(reader.feed("1985-04"), None)
+        self.assertRaises(StopFormat, reader.close)
+
+class TestCachingFormat(TestCase):
+    def test_cache(self):
+        """Memoize reads in a bounded cache"""
+        format = CachingFormat(u"YYYY-MM-DD", maxsize=2)
+        a = format.read("1985-04-12")
+        self.assertEqual(a, CalendarDate(1985, 4, 12))
+        self.assertTrue(format.read("1985-04-12") is a) # last value
+        b = format.read("1985-04-13")
+        self.assertTrue(format.read("1985-04-12") is a) # cached
+        format.read("1985-04-14") # evicts 1985-04-13
+        self.assertEqual(format.cache.keys(), ["1985-04-12", "1985-04-14"])
+        self.assertFalse(format.read("1985-04-13") is b)
+        self.assertEqual((format.hits, format.misses), (2, 4))
+
+    def test_errors(self):
+        """Don't cache errors"""
+        format = CachingFormat(u"YYYY-MM-DD")
+        self.assertRaises(StopFormat, lambda: format.read("1985/04/12"))
+        self.assertEqual(len(format.cache), 0)
+        self.assertRaises(ValueError,
+                          lambda: CachingFormat(u"YYYY-MM-DD", maxsize=0))
+
+class TestFormatInto(TestCase):
+    format = Format(u"YYYY-MM-DDThh:mm:ss,ssZ")
+    values = [DateTime(CalendarDate(1985, 4, 12), Time(23, 20, 50, utc)),
+              DateTime(CalendarDate(1985, 4, 12),
+                       Time(23, 20, Decimal("50.5"), utc))]
+    strings = ["1985-04-12T23:20:50,00Z", "1985-04-12T23:20:50,50Z"]
+
+    def test_format_into(self):
+        """Format into a file-like object or buffer"""
+        for out in (StringIO(), io.StringIO(), io.BytesIO()):
+            self.assertTrue(self.format.format_into(out, self.values[0]) is out)
+            self.assertEqual(out.getvalue(), self.strings[0])
+        out = bytearray("x")
+        self.format.format_into(out, self.values[1])
+        self.assertEqual(out, bytearray("x" + self.strings[1]))
+
+    def test_format_many(self):
+        """Format a sequence of values with buffering"""
+        for bufsize in (1, 5, 4096):
+            out = self.format.format_many(self.values*3, StringIO(),
+                                          bufsize=bufsize)
+            self.assertEqual(out.getvalue(), "\n".join(self.strings*3) + "\n")
+        out = Format(u"hh:mm").format_many([Time(23, 20), Time(0, 5)],
+                                           io.StringIO(), ",")
+        self.assertEqual(out.getvalue(), u"23:20,00:05,")
+
+class TestValues(TestCase):
+    """Immutable, hashable representations"""
+
+    def test_unit_hash(self):
+        """Equal units hash equally"""
+        self.assertEqual(hash(Second(50)), hash(Second(Decimal("50.0"))))
+        self.assertEqual(hash(Second(Decimal("50.5"))),
+                         hash(Second(Fixed(50500, 3))))
+        self.assertEqual(hash(Hour(None)), hash(Minute(None)))
+        self.assertEqual(len(set([Year(1985), Years(1985), Year(1986)])), 2)
+
+    def test_hash(self):
+        """Equal representations hash equally"""
+        time = Time(23, 20, 50, utc)
+        self.assertEqual(hash(time), hash(Time(23, 20, Decimal("50.0"), utc)))
+        self.assertEqual(time, Time(23, 20, 50, UTCOffset(0, 0)))
+        self.assertEqual(hash(time), hash(Time(23, 20, 50, UTCOffset(0, 0))))
+        self.assertFalse(time != Time(23, 20, 50, utc))
+        self.assertTrue(time != Time(23, 20, 51, utc))
+        format = Format(u"YYYY-MM-DDThh:mm:ssZ")
+        strings = ["1985-04-12T23:20:%02dZ" % (i % 7) for i in range(100)]
+        values = set(format.read(string) for string in strings)
+        self.assertEqual(len(values), 7)
+        self.assertTrue(format.read(strings[0]) in values)
+        counts = {}
+        for string in strings:
+            value = format.read(string)
+            counts[value] = counts.get(value, 0) + 1
+        self.assertEqual(sorted(counts.values()), [14]*5 + [15]*2)
+
+    def test_other_types(self):
+        """Representations are unequal to other kinds of objects"""
+        date = CalendarDate(1985, 4, 12)
+        self.assertFalse(date == None)
+        self.assertTrue(date != None)
+        self.assertFalse(date == 1985)
+        self.assertFalse(date in [None, 1, "1985-04-12"])
+        self.assertTrue(date in [None, CalendarDate(1985, 4, 12)])
+        values = {hash(date): "hash", date: "date"}
+        self.assertEqual(values[hash(date)], "hash")
+        self.assertEqual(values[date], "date")
+        lazy = LazyDateTime("1985-04-12T23:20:50Z",
+                            Format(u"YYYY-MM-DDThh:mm:ssZ"))
+        self.assertFalse(lazy == None)
+        self.assertTrue(lazy != None)
+
+    def test_immutable(self):
+        """Representations and units can't be changed"""
+        date = CalendarDate(1985, 4, 12)
+        def replace_element():
+            date.elements[0] = Year(1986)
+        self.assertRaises(AttributeError, setattr, date, "elements", ())
+        self.assertRaises(AttributeError, setattr, date.year, "value", 1986)
+        self.assertRaises(TypeError, replace_element)
+        self.assertEqual(date, CalendarDate(1985, 4, 12))
+
+        # Formatting a duration elides zeros without changing it.
+        duration = Duration(0, 0, 0, 12, 30, 0)
+        self.assertEqual(str(duration), "PT12H30M0S")
+        self.assertEqual(duration.years.value, 0)
+        self.assertEqual(Duration(0, 0, 0, 12, 30, 0) | Days(1),
+                         Duration(0, 0, 1, 12, 30, 0))
+
+class TestFixedPoint(TestCase):
+    def test_arithmetic(self):
+        """Fixed-point arithmetic"""
+        x = Fixed(505, 1)
+        self.assertEqual(str(x), "50.5")
+        self.assertEqual(str(-Fixed(5, 3)), "-0.005")
+        self.assertEqual(repr(x + Fixed(25, 2)), "Fixed(5075, 2)")
+        self.assertEqual(x + 1, Fixed(515, 1))
+        self.assertEqual(1 - x, Fixed(-495, 1))
+        self.assertEqual(x * 2, 101)
+        self.assertEqual(divmod(x, 60), (0, x))
+        self.assertEqual(divmod(-x, 60), (-1, Fixed(95, 1)))
+        self.assertEqual(floor_divmod(-x, 1), (-51, Fixed(5, 1)))
+        self.assertEqual(divmod(101, x), (2, 0))
+        self.assertEqual(floor_divmod(-1, x), (-1, Fixed(495, 1)))
+        self.assertEqual(divmod(Decimal("60.5"), x), (1, 10))
+        self.assertEqual(x / 2, Decimal("25.25"))
+        self.assertEqual(x / Fixed(5, 1), 101)
+        self.assertEqual(x / Decimal("0.5"), 101)
+        self.assertEqual(101 / x, 2)
+        self.assertEqual(Decimal(101) / x, 2)
+        self.assertEqual(int(-x), -50)
+        self.assertEqual(x, Decimal("50.5"))
+        self.assertEqual(Decimal("50.5"), x)
+        self.assertTrue(x < 51 and x > Decimal("50.4") and Decimal(51) > x)
+        self.assertEqual(hash(Fixed(500, 1)), hash(50))
+        self.assertEqual(hash(x), hash(Fixed(50500, 3)))
+        self.assertFalse(Fixed(0, 3))
+        self.assertEqual(pickle.loads(pickle.dumps(x)), x)
+
+    def test_read(self):
+        """Read fractions as fixed-point numbers"""
+        format = FixedPointFormat(u"hh:mm:ss,ss̲Z")
+        time = format.read("23:20:50,123456789Z")
+        self.assertEqual(repr(time.second.value), "Fixed(50123456789, 9)")
+        self.assertEqual(time, Format(u"hh:mm:ss,ss̲Z").read(
+                "23:20:50,123456789Z"))
+        self.assertEqual(repr(format.read("23:20:50,1234567891Z").second.value),
+                         "Fixed(50123456789, 9)") # truncated
+        format.places = 3
+        self.assertEqual(repr(format.read("23:20:50,1239Z").second.value),
+                         "Fixed(50123, 3)")
+        self.assertEqual(repr(FixedPointFormat(u"hh:mm:ssZ").read(
+                    "23:20:50Z").second.value), "50")
+        reader = FixedPointFormat(u"hh:mm:ss,sss").reader()
+        self.assertEqual(reader.feed("23:20:50,5"), None)
+        self.assertEqual(reader.feed("00"), 2)
+        self.assertEqual(repr(reader.value.second.value), "Fixed(50500, 3)")
+
+    def test_round_trip(self):
+        """Format fixed-point fractions as Decimal fractions would be"""
+        for format_repr in (u"hh:mm:ss,ss̲", u"hh:mm:ss,sss",
+                            u"hh:mm:ss,sssssssss", u"hh:mm,mm̲"):
+            fixed, decimal = FixedPointFormat(format_repr), Format(format_repr)
+            for n in range(1, 10):
+                string = "23:20:50,123456789"[:9 + n] if "s" in format_repr \
+                    else "23:20,123456789"[:6 + n]
+                if decimal.match(string):
+                    self.assertEqual(fixed.format(fixed.read(string)),
+                                     decimal.format(decimal.read(string)))
+            self.assertEqual(fixed.format(Time(23, 20, Fixed(50000, 3))),
+                             decimal.format(Time(23, 20, Decimal("50.000"))))
+
+        # Leading zeros of a fraction survive the round trip either way.
+        for format_repr, string in ((u"hh:mm:ss,ss", "23:20:50,05"),
+                                    (u"hh:mm:ss,ss̲", "23:20:50,005"),
+                                    (u"hh:mm:ss,sss", "23:20:50,001"),
+                                    (u"hh:mm:ss,ss̲", "23:20:50,000000001"),
+                                    (u"hh:mm,mm̲", "23:20,0625")):
+            for format in (Format(format_repr), FixedPointFormat(format_repr)):
+                self.assertEqual(format.format(format.read(string)), string)
+
+    def test_time_arithmetic(self):
+        """Time arithmetic with fixed-point seconds"""
+        time = Time(23, 59, Fixed(59999, 3), utc)
+        later, carry = time.add_sub_carry(TimeDuration(0, 0, Fixed(2, 3)), add)
+        self.assertEqual(carry, 1)
+        self.assertEqual(repr(later.second.value), "Fixed(1, 3)")
+        datetime = DateTime(CalendarDate(1969, 12, 31), time)
+        self.assertEqual(datetime.epoch_seconds(), Fixed(-1, 3))
+        self.assertEqual(DateTime.from_epoch_seconds(Fixed(-1, 3)), datetime)
+
+class TestInference(TestCase):
+    def assertInfers(self, string, format_repr):
+        self.assertEqual(infer_format_repr(string), format_repr)
+        self.assertTrue(Format(format_repr).match(string))
+
+    def test_dates(self):
+        """Infer date formats"""
+        self.assertInfers("19850412", u"YYYYMMDD")
+        self.assertInfers("1985-04-12", u"YYYY-MM-DD")
+        self.assertInfers(u"1985‐04‐12", u"YYYY‐MM‐DD")
+        self.assertInfers("1985-04", u"YYYY-MM")
+        self.assertInfers("1985", u"YYYY")
+        self.assertInfers("19", u"YY")
+        self.assertInfers("1985102", u"YYYYDDD")
+        self.assertInfers("1985-102", u"YYYY-DDD")
+        self.assertInfers("1985W155", u"YYYYWwwD")
+        self.assertInfers("1985-W15-5", u"YYYY-Www-D")
+        self.assertInfers("1985-W15", u"YYYY-Www")
+
+    def test_times(self):
+        """Infer time formats"""
+        self.assertInfers("232050", u"hhmmss")
+        self.assertInfers("T2320", u"Thhmm")
+        self.assertInfers("23:20:50", u"hh:mm:ss")
+        self.assertInfers("23:20,5", u"hh:mm,m")
+        self.assertInfers("23:20:50.123Z", u"hh:mm:ss.sssZ")
+        self.assertInfers("152746+0100", u"hhmmss±hhmm")
+        self.assertInfers("15:27:46-05:00", u"hh:mm:ss±hh:mm")
+        self.assertInfers("15:27:46+01", u"hh:mm:ss±hh")
+
+    def test_datetimes_and_intervals(self):
+        """Infer date and time, duration, and interval formats"""
+        self.assertInfers("19850412T232050Z", u"YYYYMMDDThhmmssZ")
+        self.assertInfers("1985-102T23:20:50,5-04:00",
+                          u"YYYY-DDDThh:mm:ss,s±hh:mm")
+        self.assertInfers("P1Y2M15DT12H30M0S", u"Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S")
+        self.assertInfers("PT0,5S", u"PTnn̲,nn̲S")
+        self.assertInfers("P6W", u"Pnn̲W")
+        self.assertInfers("1985-04-12T23:20:50/P1Y2M15DT12H30M0S",
+                          u"YYYY-MM-DDThh:mm:ss/Pnn̲Ynn̲Mnn̲DTnn̲Hnn̲Mnn̲S")
+        self.assertInfers("R12/19850412T232050/19850625T103000",
+                          u"Rn̲/YYYYMMDDThhmmss/YYYYMMDDThhmmss")
+        for string in ("", "P", "hello", "1985-04-12T", "1985-04-12X",
+                       "23:20:50+1"):
+            self.assertRaises(ValueError, lambda: infer_format_repr(string))
+
+    def test_infer(self):
+        """Infer a format from a sample"""
+        format = Format.infer(["1985-04-12T23:20:50.5Z",
+                               "1985-04-12T23:20:50.25Z"])
+        self.assertEqual(format.read("1985-04-13T00:00:00.125Z"),
+                         DateTime(CalendarDate(1985, 4, 13),
+                                  Time(0, 0, Decimal("0.125"), utc)))
+        self.assertFalse(format.match("1985-04-13T00:00:00Z"))
+        self.assertEqual(type(CachingFormat.infer(["1985-04-12"], maxsize=2)),
+                         CachingFormat)
+        self.assertRaises(ValueError,
+                          lambda: Format.infer(["1985-04-12", "1985-04"]))
+        self.assertRaises(ValueError, lambda: Format.infer([]))
+
+class TestPickle(TestCase):
+    def assertRoundTrip(self, obj):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(obj, protocol))
+            self.assertEqual(type(copy), type(obj))
+            self.assertEqual(copy, obj)
+            self.assertEqual(str(copy), str(obj))
+
+    def test_units(self):
+        """Pickle time units"""
+        self.assertRoundTrip(Year(1985))
+        self.assertRoundTrip(Second(Decimal("50.5")))
+        self.assertRoundTrip(Hours(12))
+        self.assertTrue(pickle.loads(pickle.dumps(Hour(-5, signed=True))).signed)
+
+    def test_representations(self):
+        """Pickle time representations"""
+        april_12 = DateTime(CalendarDate(1985, 4, 12),
+                            Time(23, 20, Decimal("50.5"), UTCOffset(-4, 30)))
+        duration = Duration(1, 2, 15, 12, 30, 0)
+        for obj in (CalendarDate(1985, 4), OrdinalDate(1985, 102),
+                    WeekDate(1985, 15, 5), Time(23, 20, 50, utc), april_12,
+                    duration, WeeksDuration(6), TimeInterval(april_12, duration),
+                    RecurringTimeInterval(12, duration, april_12)):
+            self.assertRoundTrip(obj)
+        self.assertTrue(pickle.loads(pickle.dumps(utc)) is utc)
+
+    def test_copy(self):
+        """Copy time representations"""
+        time = Format("hh:mm:ssZ").read("23:20:50Z")
+        self.assertEqual(copy.deepcopy(time), time)
+        self.assertEqual(copy.copy(time).utcoffset, utc)
+
 class TestCalendarUtils(TestCase):
     def test_leap_year(self):
         """Leap year calculations"""
@@ -602,8 +1033,33 @@ class TestCalendarUtils(TestCase):
         self.assertEqual(days_in_month(2000, 1), 31)
         self.assertEqual(days_in_month(2000, 2), 29)
         self.assertEqual(days_in_month(2001, 2), 28)
+        self.assertEqual(days_in_month(2000, 7), 31)
         self.assertEqual(days_in_month(2000, 12), 31)
 
+    def test_day_numbers(self):
+        """Day numbers relative to 1970-01-01"""
+        self.assertEqual(day_number(1970, 1, 1), 0)
+        self.assertEqual(day_number(1985, 4, 12), 5580)
+        self.assertEqual(day_number(1600, 3, 1), -135080)
+        self.assertEqual(calendar_date(5580), (1985, 4, 12))
+        self.assertEqual(calendar_date(-135081), (1600, 2, 29))
+        self.assertEqual(week_date(5580), (1985, 15, 5))
+        self.assertEqual(week_date(day_number(2010, 1, 3)), (2009, 53, 7))
+        self.assertEqual(week_day_number(2009, 53, 7), day_number(2010, 1, 3))
+
+    def test_epoch(self):
+        """Time points relative to the epoch"""
+        self.assertEqual(CalendarDate(1985, 4, 12).epoch_day(), 5580)
+        self.assertEqual(OrdinalDate(1985, 102).epoch_day(), 5580)
+        self.assertEqual(WeekDate(1985, 15, 5).epoch_day(), 5580)
+        self.assertEqual(CalendarDate(1985, 4).epoch_day(), 5569)
+        self.assertEqual(Time(23, 20, 50).second_of_day(), 84050)
+        self.assertEqual(UTCOffset(-4, 30).total_seconds(), -16200)
+        self.assertEqual(DateTime(CalendarDate(1985, 4, 12),
+                                  Time(23, 20, Decimal("50.5"),
+                                       UTCOffset(-4, 30))).epoch_seconds(),
+                         5580*86400 + 84050 + 16200 + Decimal("0.5"))
+
 class TestCalendarCalculations(TestCase):
     def test_cardinal_arithmetic(self):
         """Cardinal arithmetic"""
@@ -702,6 +1158,519 @@ class TestCalendarCalculations(TestCase):
                          Duration(1, 1, 3, 25, 31),
                          DateTime(CalendarDate(1983, 1, 31), Time(23, 30)))
 
+    def test_datetime_minus_datetime(self):
+        """Elapsed time between time points"""
+        april_12 = DateTime(CalendarDate(1985, 4, 12), Time(23, 20, 50, utc))
+        june_25 = DateTime(CalendarDate(1985, 6, 25),
+                           Time(10, 30, Decimal("0.5"), UTCOffset(-4, 0)))
+        self.assertEqual(june_25 - april_12,
+                         Duration(0, 0, 73, 15, 9, Decimal("10.5")))
+        self.assertEqual(april_12 - april_12, Duration(0, 0, 0, 0, 0, 0))
+        self.assertRaises(ValueError, lambda: april_12 - june_25)
+        self.assertEqual(CalendarDate(1985, 6, 25) - CalendarDate(1985, 4, 12),
+                         Duration(0, 0, 74))
+        self.assertEqual(CalendarDate(1985, 4, 12) - OrdinalDate(1985, 1),
+                         Duration(0, 0, 101))
+        self.assertEqual(TimeInterval(april_12, june_25).span(),
+                         june_25 - april_12)
+        self.assertEqual(TimeInterval(april_12, Duration(0, 1, 3)).span(),
+                         Duration(0, 0, 33, 0, 0, 0))
+
+    def test_time_carry(self):
+        """Time plus or minus duration with carry"""
+        self.assertEqual(Time(23, 20, 50).add_sub_carry(TimeDuration(0, 39, 10),
+                                                        add),
+                         (Time(0, 0, 0), 1))
+        self.assertEqual(Time(0, 1, 1).add_sub_carry(TimeDuration(0, 1, 2),
+                                                     sub),
+                         (Time(23, 59, 59), -1))
+        self.assertEqual(Time(0, 0, Decimal("0.5")).add_sub_carry(
+                TimeDuration(0, 0, 1), sub),
+                         (Time(23, 59, Decimal("59.5")), -1))
+
+    def test_datetime_across_midnight(self):
+        """Datetime plus or minus duration across midnight"""
+        self.assertEqual(DateTime(CalendarDate(1984, 12, 31),
+                                  Time(23, 59, 30, utc)) +
+                         TimeDuration(0, 0, 45),
+                         DateTime(CalendarDate(1985, 1, 1),
+                                  Time(0, 0, 15, utc)))
+        self.assertEqual(DateTime(CalendarDate(1985, 3, 1), Time(0, 0, 15)) -
+                         TimeDuration(0, 0, 45),
+                         DateTime(CalendarDate(1985, 2, 28), Time(23, 59, 30)))
+
+@skipIf(numpy is None, "NumPy is not available")
+class TestExpand(TestCase):
+    """Expansion of recurring time intervals into NumPy arrays"""
+
+    def assertExpands(self, expansion, timepoints):
+        self.assertEqual(list(expansion),
+                         [numpy.datetime64(int(t.epoch_seconds()), "s")
+                          for t in timepoints])
+
+    def test_fixed(self):
+        """Fixed-length durations"""
+        start = DateTime(CalendarDate(2024, 1, 1), Time(0, 0, 0, utc))
+        r = RecurringTimeInterval(100000, start, TimeDuration(0, 1, 0))
+        expansion = r.expand()
+        self.assertEqual(expansion.dtype, numpy.dtype("datetime64[s]"))
+        self.assertEqual(len(expansion), 100000)
+        self.assertEqual(str(expansion[-1]), "2024-03-10T10:39:00")
+        self.assertExpands(r.expand(end=start + TimeDuration(0, 3, 0)),
+                           [start + TimeDuration(0, k, 0) for k in range(3)])
+        self.assertEqual(str(r.expand(resolution="ms")[1]),
+                         "2024-01-01T00:01:00.000")
+
+        # An interval given by its end-points recurs with its length.
+        end = DateTime(CalendarDate(2024, 1, 1), Time(1, 30, 0, utc))
+        r = RecurringTimeInterval(3, start, end)
+        self.assertExpands(r.expand(start=end),
+                           [end, DateTime(CalendarDate(2024, 1, 1),
+                                          Time(3, 0, 0, utc))])
+
+    def test_fractional(self):
+        """Fractional steps are exact, and floored only once"""
+        start = DateTime(CalendarDate(1985, 4, 12),
+                         Time(23, 20, Decimal("50.25"), utc))
+        r = RecurringTimeInterval(5, start, TimeDuration(0, 0, Decimal("1.5")))
+        self.assertEqual([str(t)[17:] for t in r.expand()],
+                         ["50", "51", "53", "54", "56"])
+        self.assertEqual([str(t)[17:] for t in r.expand(resolution="ms")],
+                         ["50.250", "51.750", "53.250", "54.750", "56.250"])
+        r = RecurringTimeInterval(4, start, TimeDuration(0, 0, Fixed(5, 1)))
+        self.assertEqual([str(t)[17:] for t in r.expand()],
+                         ["50", "50", "51", "51"])
+        r = RecurringTimeInterval(3, start,
+                                  TimeDuration(0, 0, Decimal("0.000000001")))
+        self.assertEqual([str(t)[17:] for t in r.expand(resolution="ns")],
+                         ["50.250000000", "50.250000001", "50.250000002"])
+
+    def test_calendar(self):
+        """Calendar durations clip the day of the month"""
+        start = DateTime(CalendarDate(2024, 1, 31), Time(12, 0, 0, utc))
+        self.assertExpands(RecurringTimeInterval(14, start,
+                                                 Duration(0, 1)).expand(),
+                           [start + Duration(0, k) for k in range(14)])
+        leap_day = DateTime(CalendarDate(2024, 2, 29), Time(0, 0, 0, utc))
+        self.assertExpands(RecurringTimeInterval(5, leap_day,
+                                                 Duration(1)).expand(),
+                           [leap_day + Duration(k) for k in range(5)])
+        self.assertExpands(RecurringTimeInterval(30, start,
+                                                 Duration(0, 1, 1, 1)).expand(
+                start=DateTime(CalendarDate(2025, 1, 1), Time(0, 0, 0, utc)),
+                end=DateTime(CalendarDate(2025, 6, 1), Time(0, 0, 0, utc))),
+                           [start + Duration(0, k, k, k)
+                            for k in range(11, 16)])
+
+    def test_reverse(self):
+        """A duration followed by an end recurs back from the end"""
+        end = DateTime(CalendarDate(2024, 1, 31), Time(12, 0, 0, utc))
+        self.assertExpands(RecurringTimeInterval(3, Duration(0, 1, 1, 1),
+                                                 end).expand(),
+                           [end - Duration(0, k, k, k) for k in (3, 2, 1)])
+
+    def test_unbounded(self):
+        """An unbounded number of recurrences needs a window"""
+        start = DateTime(CalendarDate(2024, 1, 1), Time(0, 0, 0, utc))
+        r = RecurringTimeInterval.from_elements((Recurrences(None), start,
+                                                 Duration(0, 1)))
+        self.assertRaises(ValueError, r.expand)
+        self.assertExpands(r.expand(end=start + Duration(0, 3)),
+                           [start + Duration(0, k) for k in range(3)])
+
+class TestOccurrences(TestCase):
+    """Membership and next-occurrence queries on recurring intervals"""
+
+    def test_fixed(self):
+        """Fixed-length durations"""
+        start = DateTime(CalendarDate(2024, 1, 1), Time(0, 0, 0, utc))
+        r = RecurringTimeInterval(10, start, TimeDuration(1, 30, 0))
+        at = lambda h, m: DateTime(CalendarDate(2024, 1, 1),
+                                   Time(h, m, 0, utc))
+        self.assertEqual(r.occurrence(start), 0)
+        self.assertEqual(r.occurrence(at(1, 29)), 0)
+        self.assertEqual(r.occurrence(at(1, 30)), 1)
+        self.assertEqual(r.occurrence(at(14, 59)), 9)
+        self.assertEqual(r.occurrence(at(15, 0)), None)
+        self.assertFalse(r.covers(start - TimeDuration(0, 0, 1)))
+        self.assertTrue(r.covers(start.epoch_seconds() + 100))
+        self.assertEqual(r.next_start(at(1, 29)), at(1, 30))
+        self.assertEqual(r.next_start(at(1, 30)), at(3, 0))
+        self.assertEqual(r.next_start(start - TimeDuration(0, 0, 1)), start)
+        self.assertEqual(r.next_start(at(13, 30)), None)
+
+        # Fixed-point values and instants are accepted, too.
+        value = FixedPointFormat(u"YYYY-MM-DDThh:mm:ss,ssZ").read(
+            "2024-01-01T01:29:59,99Z")
+        self.assertEqual(r.occurrence(value), 0)
+        self.assertEqual(r.occurrence(value.epoch_seconds() + Fixed(1, 2)), 1)
+        self.assertEqual(r.next_start(value), at(1, 30))
+
+    def test_calendar(self):
+        """Calendar durations"""
+        start = DateTime(CalendarDate(2024, 1, 31), Time(12, 0, 0,
+                                                         UTCOffset(-5, 0)))
+        r = RecurringTimeInterval.from_elements((Recurrences(None), start,
+                                                 Duration(0, 1)))
+        for k in (0, 1, 13, 49, 1000):
+            t = start + Duration(0, k)
+            self.assertEqual(r.occurrence(t), k)
+            self.assertEqual(r.occurrence(t - TimeDuration(0, 0, 1)), k - 1
+                             if k else None)
+            self.assertEqual(r.next_start(t - TimeDuration(0, 0, 1)), t)
+            self.assertEqual(str(r.next_start(t)),
+                             str(start + Duration(0, k + 1)))
+
+    def test_reverse(self):
+        """A duration followed by an end recurs back from the end"""
+        end = DateTime(CalendarDate(2024, 1, 31), Time(12, 0, 0, utc))
+        r = RecurringTimeInterval(3, Duration(0, 1, 1, 1), end)
+        first = end - Duration(0, 3, 3, 3)
+        self.assertEqual(r.occurrence(first), -3)
+        self.assertEqual(r.occurrence(end - TimeDuration(0, 0, 1)), -1)
+        self.assertEqual(r.occurrence(end), None)
+        self.assertEqual(r.next_start(first - Duration(1)), first)
+        self.assertEqual(r.next_start(end - Duration(0, 1, 1, 1)), None)
+
+    def test_cache(self):
+        """Schedule constants are computed once"""
+        start = DateTime(CalendarDate(2024, 1, 1), Time(0, 0, 0, utc))
+        r = RecurringTimeInterval(3, start, Duration(0, 1))
+        self.assertTrue(r.schedule() is not r.constants())
+        self.assertTrue(r.constants() is r.constants())
+        self.assertEqual(r, RecurringTimeInterval(3, start, Duration(0, 1)))
+
+class TestDurationOrder(TestCase):
+    """Canonical forms and ordering of durations"""
+
+    def test_canonical(self):
+        """Canonical (months, seconds) pairs"""
+        self.assertEqual(Duration(1, 2, 3, 4, 5, 6).canonical(),
+                         (14, 3*86400 + 4*3600 + 5*60 + 6))
+        self.assertEqual(WeeksDuration(2).canonical(), (0, 1209600))
+        self.assertEqual(Duration(Decimal("0.5")).canonical(), (6, 0))
+        self.assertRaises(ValueError, Duration(0, Decimal("0.5")).canonical)
+        d = Duration(0, 0, 1)
+        self.assertTrue(d.canonical() is d.canonical())
+
+    def test_total_seconds(self):
+        """Lengths of fixed-length durations"""
+        self.assertEqual(TimeDuration(1, 30, Decimal("0.5")).total_seconds(),
+                         Decimal("5400.5"))
+        self.assertEqual(WeeksDuration(1).total_seconds(), 604800)
+        self.assertEqual(Duration(0, 0, 2).total_seconds(), 172800)
+        self.assertRaises(ValueError, Duration(1).total_seconds)
+
+    def test_normalize(self):
+        """Normalization"""
+        self.assertEqual(str(TimeDuration(0, 90, 0).normalize()), "PT1H30M")
+        self.assertEqual(str(WeeksDuration(1).normalize()), "P7D")
+        self.assertEqual(str(Duration(0, 14, 0, 25, 61, 61).normalize()),
+                         "P1Y2M1DT2H2M1S")
+        self.assertEqual(str(Duration(0, 0, 1, 0, 30, 0).normalize()),
+                         "P1DT0H30M")
+        self.assertEqual(str(Duration(0, 0, 0, 0, 0, 0).normalize()), "PT0S")
+
+    def test_order(self):
+        """Unambiguous comparisons"""
+        self.assertEqual(Duration(0, 0, 1).compare(TimeDuration(24, 0, 0)), 0)
+        self.assertTrue(Duration(0, 0, 1) <= TimeDuration(24, 0, 0))
+        self.assertFalse(Duration(0, 0, 1) < TimeDuration(24, 0, 0))
+        self.assertTrue(WeeksDuration(1) > Duration(0, 0, 6))
+        self.assertTrue(Duration(0, 1) > Duration(0, 0, 27, 23))
+        self.assertTrue(Duration(0, 1) < Duration(0, 0, 31, 0, 0, 1))
+        self.assertTrue(Duration(1) > Duration(0, 11, 27))
+        self.assertTrue(Duration(0, 13) < Duration(1, 0, 32))
+        self.assertEqual(Duration(400).compare(Duration(0, 0, 146097)), 0)
+        self.assertEqual(sorted([Duration(1), WeeksDuration(2),
+                                 TimeDuration(0, 90, 0), Duration(0, 0, 1)]),
+                         [TimeDuration(0, 90, 0), Duration(0, 0, 1),
+                          WeeksDuration(2), Duration(1)])
+
+    def test_anchor(self):
+        """Ambiguous comparisons need an anchor"""
+        month, days = Duration(0, 1), Duration(0, 0, 30)
+        self.assertRaises(ValueError, lambda: month < days)
+        self.assertEqual(month.compare(days, CalendarDate(2024, 2, 1)), -1)
+        self.assertEqual(month.compare(days, CalendarDate(2024, 4, 1)), 0)
+        self.assertEqual(month.compare(days, CalendarDate(2024, 1, 1)), 1)
+        self.assertEqual(days.compare(month, CalendarDate(2024, 1, 31)), 1)
+        self.assertEqual(Duration(1).compare(Duration(0, 0, 365),
+                                             DateTime(CalendarDate(2024, 2, 1),
+                                                      Time(12, 0, 0, utc))),
+                         1)
+        self.assertEqual(Duration(1).compare(Duration(0, 0, 365),
+                                             CalendarDate(2024, 3, 1)), 0)
+
+class TestTrustedConstructors(TestCase):
+    """Constructors that bypass checks and coercions"""
+
+    def assertSame(self, a, b):
+        self.assertEqual(a, b)
+        self.assertEqual(map(type, a), map(type, b))
+        self.assertEqual(type(a), type(b))
+
+    def test_units(self):
+        """Units from valid values"""
+        self.assertSame([Hour.from_value(12)], [Hour(12)])
+        self.assertEqual(Second.from_value(Decimal("1.5")).value,
+                         Decimal("1.5"))
+        self.assertEqual(Hour.from_value(-5, "-").signed, "-")
+        self.assertRaises(AttributeError,
+                          lambda: setattr(Year.from_value(1), "value", 2))
+
+    def test_reps(self):
+        """Representations from valid values"""
+        self.assertSame(CalendarDate.from_ints(1985, 4, 12),
+                        CalendarDate(1985, 4, 12))
+        self.assertSame(CalendarDate.from_ints(1985), CalendarDate(1985))
+        self.assertSame(OrdinalDate.from_ints(1985, 102),
+                        OrdinalDate(1985, 102))
+        self.assertSame(WeekDate.from_ints(1985, 15, 5), WeekDate(1985, 15, 5))
+        self.assertSame(UTCOffset.from_ints(-5, 30), UTCOffset(-5, 30))
+        self.assertSame(Time.from_values(23, 20, Decimal("50.5"), utc),
+                        Time(23, 20, Decimal("50.5"), utc))
+        self.assertSame(Time.from_values(23), Time(23))
+        self.assertSame(Duration.from_values(1, 2, 3, 4, 5, 6),
+                        Duration(1, 2, 3, 4, 5, 6))
+
+    def test_cached_attributes(self):
+        """Dates and times made from elements cache their elements"""
+        time = Time.from_values(23, 20, 50, utc)
+        self.assertTrue(time.__dict__["utcoffset"] is utc)
+        datetime = DateTime.from_elements((CalendarDate.from_ints(1985, 4, 12),
+                                           time))
+        self.assertTrue(datetime.__dict__["time"] is time)
+        interval = TimeInterval.from_elements((datetime, Duration(1)))
+        self.assertFalse("date" in interval.__dict__)
+
+    def test_arithmetic(self):
+        """Arithmetic still checks the range of years"""
+        self.assertSame(CalendarDate(1985, 4, 12) + Duration(0, 1, 20),
+                        CalendarDate(1985, 6, 1))
+        self.assertRaises(InvalidTimeUnit,
+                          lambda: CalendarDate(9999, 12, 31) + Duration(0, 0, 1))
+        self.assertRaises(InvalidTimeUnit,
+                          lambda: CalendarDate(9999) + Duration(1))
+        self.assertRaises(InvalidTimeUnit,
+                          lambda: CalendarDate(9999, 12) + Duration(0, 1))
+        self.assertRaises(InvalidTimeUnit,
+                          lambda: CalendarDate(0, 1) - Duration(9999, 1))
+        # Years are checked by magnitude, so borrowing a year from year 0
+        # is fine, just as subtracting one is.
+        self.assertEqual((CalendarDate(0, 1) - Duration(0, 1)).elements,
+                         (Year(-1), Month(12), Day(None)))
+        self.assertEqual((CalendarDate(0) - Duration(1)).year, Year(-1))
+        self.assertSame(CalendarDate(9998, 12) + Duration(0, 1),
+                        CalendarDate(9999, 1))
+        self.assertRaises(InvalidTimeUnit,
+                          lambda: DateTime.from_epoch_seconds(10**12))
+
+class TestSortKey(TestCase):
+    def test_key(self):
+        """Sort keys agree with the instants that representations read as"""
+        for format_repr, string in ((u"YYYY-MM-DDThh:mm:ssZ",
+                                     "1985-04-12T23:20:50Z"),
+                                    (u"YYYYDDDThhmmss±hhmm",
+                                     "1985102T232050-0330"),
+                                    (u"YYYY-Www-DThh:mm:ss,ss±hh",
+                                     "1985-W15-5T23:20:50,25+01"),
+                                    (u"YYYYMMDDThh:mm,mm", "19850412T23:20,25")):
+            format = Format(format_repr)
+            self.assertEqual(format.key(string),
+                             format.read(string).epoch_seconds() * 10**9)
+        self.assertEqual(Format(u"YYYY-MM").key("1985-04"),
+                         CalendarDate(1985, 4, 1).epoch_seconds() * 10**9)
+        self.assertEqual(Format(u"hh:mm,mm̲").key("00:00,000000000001"), 0)
+
+        # A signed year is an expanded year, not an offset from UTC.
+        expanded = Format(u"±YYYY-MM-DD")
+        for string in ("-1985-04-12", "+1985-04-12"):
+            self.assertEqual(expanded.key(string),
+                             expanded.read(string).epoch_seconds() * 10**9)
+        self.assertTrue(expanded.key("-1985-04-12") < 0 <
+                        expanded.key("+1985-04-12"))
+        self.assertRaises(ValueError,
+                          lambda: Format(u"YYYY-MM").key("1985-4"))
+        self.assertRaises(ValueError,
+                          lambda: Format(u"YYYY-MM").key("1985-04-12"))
+        self.assertRaises(ValueError, lambda: Format(u"hh,hh̲").key("12"))
+        self.assertRaises(ValueError, lambda: Format(u"PnnW").key("P12W"))
+        self.assertRaises(ValueError,
+                          lambda: Format(u"YYYY/YYYY").key("1985/1986"))
+
+    def test_sort_key(self):
+        """Sort representations in mixed formats"""
+        strings = ["1985-04-12T23:20:50Z",
+                   "19850412T232051Z",
+                   "1985-04-12T23:20:50.5+01:00",
+                   "1985-102T22:20:50Z",
+                   "1985W155T232050-03:30",
+                   "1985-04-12",
+                   "1985-04",
+                   "1985-04-12T23:20:50",
+                   u"1985‐04‐12T23:20"]
+        self.assertEqual(sorted(strings, key=sort_key),
+                         ["1985-04",
+                          "1985-04-12",
+                          "1985-102T22:20:50Z",
+                          "1985-04-12T23:20:50.5+01:00",
+                          u"1985‐04‐12T23:20",
+                          "1985-04-12T23:20:50Z",
+                          "1985-04-12T23:20:50",
+                          "19850412T232051Z",
+                          "1985W155T232050-03:30"])
+        self.assertRaises(ValueError, lambda: sort_key("P1D"))
+        self.assertRaises(ValueError, lambda: sort_key("hello"))
+
+class TestTranscoder(TestCase):
+    def assertTranscodes(self, source, target, string, expected):
+        transcoder = Format(source).transcoder(Format(target))
+        self.assertEqual(transcoder.transcode(string), expected)
+
+    def test_fields(self):
+        """Transcode fields from their positions, as read and format do"""
+        for source, target, string in \
+                ((u"YYYYMMDDThhmmssZ", u"YYYY-MM-DDThh:mm:ssZ",
+                  "20240115T103000Z"),
+                 (u"YYYY-MM-DDThh:mm:ss,ss±hh:mm", u"YYYYMMDDThhmmss.ss±hhmm",
+                  "1985-04-12T23:20:50,25-04:00"),
+                 (u"YYYY-MM-DDThh:mm:ss", u"YYYY-MM-DDThh:mm",
+                  "1985-04-12T23:20:50"),
+                 (u"YYYY-Www-DThh:mm", u"YYYY-WwwThh", "1985-W15-5T23:20"),
+                 (u"hh:mm:ss", u"Thhmmss", "23:20:50"),
+                 (u"YYYY-MM-DD", u"±YYYYY-MM-DD", "1985-04-12"),
+                 (u"YYYY-MM-DDThh:mm,mm̲", u"YYYY-MM-DDThh:mm,mmm",
+                  "1985-04-12T23:20,5")):
+            self.assertTranscodes(source, target, string,
+                                  Format(target).format(
+                                      Format(source).read(string)))
+
+    def test_date_forms(self):
+        """Convert between calendar, ordinal, and week dates"""
+        self.assertTranscodes(u"YYYY-DDDThh:mm", u"YYYYMMDDThhmm",
+                              "1985-102T23:20", "19850412T2320")
+        self.assertTranscodes(u"YYYY-MM-DD", u"YYYY-Www-D",
+                              "2008-12-29", "2009-W01-1")
+        self.assertTranscodes(u"YYYYWwwD", u"YYYYDDD", "2009W011", "2008364")
+        self.assertTranscodes(u"YYYY-Www-D", u"YYYY", "2009-W01-1", "2008")
+        self.assertTranscodes(u"±YYYYY-DDD", u"±YYYYY-MM-DD",
+                              "-00001-060", "-00001-03-01")
+        self.assertRaises(ValueError,
+                          lambda: Format(u"YYYY-MM").transcoder(
+                              Format(u"YYYY-DDD")))
+
+    def test_offsets_and_fractions(self):
+        """Transcode offsets from UTC and decimal fractions"""
+        self.assertTranscodes(u"hh:mmZ", u"hh:mm±hh:mm", "23:20Z",
+                              "23:20+00:00")
+        self.assertTranscodes(u"hh:mm±hh", u"hh:mm±hh:mm", "23:20-04",
+                              "23:20-04:00")
+        self.assertTranscodes(u"hh:mm±hh:mm", u"hhmm±hhmm", "23:20-00:30",
+                              "2320-0030")
+        self.assertTranscodes(u"hh:mm:ss,sss", u"hh:mm:ss.s", "23:20:50,999",
+                              "23:20:50.9")
+        self.assertTranscodes(u"hh:mm:ss", u"hh:mm:ss,ss", "23:20:50",
+                              "23:20:50,00")
+        for source, target in ((u"hh:mm±hh:mm", u"hh:mmZ"),
+                               (u"hh:mmZ", u"hh:mm"),
+                               (u"hh:mm", u"hh:mm:ss"),
+                               (u"Pnn̲D", u"PnnD")):
+            self.assertRaises(ValueError,
+                              lambda: Format(source).transcoder(
+                                  Format(target)))
+        transcoder = Format(u"hh:mm").transcoder(Format(u"hhmm"))
+        self.assertRaises(ValueError, lambda: transcoder.transcode("23:2"))
+
+    def test_narrowing(self):
+        """Refuse values that don't fit the target format"""
+        transcoder = Format(u"±YYYYY-MM-DD").transcoder(Format(u"YYYY-MM-DD"))
+        self.assertEqual(transcoder.transcode("+01985-04-12"), "1985-04-12")
+        for string in ("+12345-04-12", "-01985-04-12"):
+            self.assertRaises(ValueError,
+                              lambda: transcoder.transcode(string))
+        transcoder = Format(u"±YYYYY-DDD").transcoder(Format(u"YYYY-MM-DD"))
+        self.assertEqual(transcoder.transcode("+01985-102"), "1985-04-12")
+        self.assertRaises(ValueError,
+                          lambda: transcoder.transcode("+12345-102"))
+        for source, target in ((u"YYYY-MM-DD", u"YYYY/YYYY"),
+                               (u"YYYY/YYYY", u"YYYY"),
+                               (u"PnnD", u"PnnD")):
+            try:
+                Format(source).transcoder(Format(target))
+            except ValueError as e:
+                self.assertEqual(str(e), "can only transcode representations "
+                                         "of time points")
+            else:
+                self.fail("transcoded %s to %s" % (source, target))
+
+    def test_transcode_many(self):
+        """Transcode a stream of lines"""
+        transcoder = Format(u"YYYYMMDD").transcoder(Format(u"YYYY-MM-DD"))
+        lines = StringIO("19850412\n19850413\r\n19850414")
+        for out in (StringIO(), io.BytesIO()):
+            lines.seek(0)
+            self.assertTrue(transcoder.transcode_many(lines, out) is out)
+            self.assertEqual(out.getvalue(),
+                             "1985-04-12\n1985-04-13\n1985-04-14\n")
+        out = transcoder.transcode_many(["19850412"]*3, bytearray(), ",",
+                                        bufsize=2)
+        self.assertEqual(out, bytearray("1985-04-12,"*3))
+
+class TestLazyDateTime(TestCase):
+    format = Format(u"YYYY-MM-DDThh:mm:ss±hh:mm")
+    string = "1985-04-12t23:20:50-04:00"
+
+    def test_lazy(self):
+        """Read a lazy value only when its elements are needed"""
+        value = LazyDateTime(self.string, self.format)
+        self.assertFalse("elements" in value.__dict__)
+        self.assertEqual(str(value), self.string)
+        self.assertFalse("elements" in value.__dict__)
+        self.assertEqual(value.hour, Hour(23))
+        self.assertTrue("elements" in value.__dict__)
+        self.assertEqual(str(value), self.string)
+
+    def test_values(self):
+        """Lazy values behave like the values they represent"""
+        value = LazyDateTime(self.string, self.format)
+        eager = self.format.read(self.string)
+        self.assertEqual(value, eager)
+        self.assertEqual(hash(value), hash(eager))
+        self.assertEqual(value.epoch_seconds(), eager.epoch_seconds())
+        self.assertEqual(value.date, CalendarDate(1985, 4, 12))
+        later = value + Duration(0, 0, 1)
+        self.assertEqual(type(later), DateTime)
+        self.assertEqual(str(later), "1985-04-13T23:20:50-04:00")
+        copied = pickle.loads(pickle.dumps(value))
+        self.assertEqual(type(copied), DateTime)
+        self.assertEqual(copied, eager)
+        self.assertRaises(AttributeError, lambda: setattr(value, "x", 1))
+
+    def test_own_format(self):
+        """Format lazy values with the format they're read with"""
+        strings = ["1985-04-12T23:20:50-04:00", "1985-04-13T00:00:00+01:00"]
+        self.assertEqual(self.format.format(LazyDateTime(strings[0],
+                                                         self.format)),
+                         strings[0])
+        out = self.format.format_many([LazyDateTime(string, self.format)
+                                       for string in strings], bytearray())
+        self.assertEqual(out, bytearray("".join(string + "\n"
+                                                for string in strings)))
+
+    def test_invalid(self):
+        """Validate representations up front"""
+        self.assertRaises(StopFormat,
+                          lambda: LazyDateTime("1985-04-31T23:20:50-04:00",
+                                               self.format))
+        for string, format in (("1985-04-12", u"YYYY-MM-DD"),
+                               ("23:20:50", u"hh:mm:ss"),
+                               ("1985-04-12T23:20/P1D",
+                                u"YYYY-MM-DDThh:mm/PnD"),
+                               ("P1DT12H", u"PnDTnnH")):
+            self.assertRaises(TypeError,
+                              lambda: LazyDateTime(string, format))
+
 def suite():
     return TestSuite([TestLoader().loadTestsFromTestCase(cls) \
                           for cls in (TestTimeUnit,
@@ -719,8 +1688,23 @@ def suite():
                                       TestTimeInterval,
                                       TestRecurringTimeInterval,
                                       TestStandardFormats,
+                                      TestMatch,
+                                      TestFormatReader,
+                                      TestCachingFormat,
+                                      TestFormatInto,
+                                      TestValues,
+                                      TestFixedPoint,
+                                      TestInference,
+                                      TestPickle,
                                       TestCalendarUtils,
-                                      TestCalendarCalculations)])
+                                      TestCalendarCalculations,
+                                      TestExpand,
+                                      TestOccurrences,
+                                      TestDurationOrder,
+                                      TestTrustedConstructors,
+                                      TestSortKey,
+                                      TestTranscoder,
+                                      TestLazyDateTime)])
 
 def run(runner=TextTestRunner, **args):
     return runner(**args).run(suite())
@@ -0,0 +1,60 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+from decimal import Decimal
+from unittest import *
+
+from iso8601 import *
+from timearray import *
+
+class TestDateTimeArray(TestCase):
+    values = [DateTime(CalendarDate(1985, 4, 12), Time(23, 20, 50, utc)),
+              DateTime(CalendarDate(1985, 4, 12),
+                       Time(15, 27, 46, UTCOffset(-5, 0))),
+              DateTime(OrdinalDate(1985, 102), Time(10, 15, None, utc)),
+              DateTime(WeekDate(1985, 15, 5), Time(10, 15, 30, UTCOffset(4))),
+              DateTime(CalendarDate(1985, 4, 13),
+                       Time(0, 0, Decimal("0.25"), UTCOffset(1, 30))),
+              DateTime(CalendarDate(1969, 12, 31), Time(23, Decimal("58.5"))),
+              DateTime(CalendarDate(1985, 4), Time(None))]
+
+    def test_round_trip(self):
+        """Materialize values in their original form"""
+        array = DateTimeArray(self.values, "ms")
+        self.assertEqual(len(array), len(self.values))
+        for i, value in enumerate(self.values):
+            self.assertEqual(array[i], value)
+            self.assertEqual(str(array[i]), str(value))
+
+    def test_instants(self):
+        """Store UTC-normalized instants"""
+        array = DateTimeArray(self.values, "ms")
+        self.assertEqual(list(array.instants[:2]),
+                         [482196050000, 482185666000])
+        self.assertEqual(array.instants[5], -90000)
+        self.assertEqual(DateTimeArray(self.values[4:5]).instants[0],
+                         482198400 - 5400)
+
+    def test_slice(self):
+        """Slices are arrays"""
+        array = DateTimeArray(self.values)[1:3]
+        self.assertTrue(isinstance(array, DateTimeArray))
+        self.assertEqual(list(array), self.values[1:3])
+
+    def test_bisect(self):
+        """Binary search on sorted instants"""
+        array = DateTimeArray(sorted(self.values[:5],
+                                     key=lambda x: x.epoch_seconds()))
+        april_12 = DateTime(CalendarDate(1985, 4, 12), Time(20, 27, 46, utc))
+        self.assertEqual(array.bisect_left(april_12), 2)
+        self.assertEqual(array.bisect_right(april_12), 3)
+        self.assertEqual(array.bisect_left(0), 0)
+
+def suite():
+    return TestSuite([TestLoader().loadTestsFromTestCase(cls) \
+                          for cls in (TestDateTimeArray,)])
+
+def run(runner=TextTestRunner, **args):
+    return runner(**args).run(suite())
+
+if __name__ == "__main__":
+    run(verbosity=2)
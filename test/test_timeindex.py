@@ -0,0 +1,58 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+from unittest import *
+
+from iso8601 import *
+from timeindex import *
+
+def datetime(day, hour, offset=utc):
+    return DateTime(CalendarDate(1985, 4, day), Time(hour, 0, 0, offset))
+
+class TestTimeIndex(TestCase):
+    points = [datetime(12, 23), datetime(12, 10), datetime(13, 1),
+              datetime(12, 18, UTCOffset(-5, 0)), # 23:00Z
+              datetime(11, 12), datetime(14, 0)]
+
+    def test_build(self):
+        """Sort time points by instant"""
+        index = TimeIndex(self.points)
+        self.assertEqual(list(index),
+                         [self.points[i] for i in (4, 1, 0, 3, 2, 5)])
+
+    def test_append(self):
+        """Append in and out of order"""
+        index = TimeIndex()
+        index.extend(self.points)
+        self.assertEqual(list(index), list(TimeIndex(self.points)))
+
+    def test_key(self):
+        """Index arbitrary items by a key function"""
+        events = [(point, i) for i, point in enumerate(self.points)]
+        index = TimeIndex(events, key=lambda event: event[0])
+        self.assertEqual([i for point, i in index], [4, 1, 0, 3, 2, 5])
+
+    def test_select(self):
+        """Select by interval in each of its forms"""
+        index = TimeIndex(self.points)
+        start, end = datetime(12, 0), datetime(13, 0)
+        day = Duration(0, 0, 1)
+        expected = [self.points[i] for i in (1, 0, 3)]
+        self.assertEqual(index.select(TimeInterval(start, end)), expected)
+        self.assertEqual(index.select(TimeInterval(start, day)), expected)
+        self.assertEqual(index.select(TimeInterval(day, end)), expected)
+        self.assertEqual(index.select(start, end), expected)
+        self.assertEqual(index.indices(None, start), (0, 1))
+        self.assertEqual(index.indices(end, None), (4, 6))
+        self.assertEqual(index.select(CalendarDate(1985, 4, 14), None),
+                         [self.points[5]])
+        self.assertRaises(ValueError, lambda: index.select(TimeInterval(day)))
+
+def suite():
+    return TestSuite([TestLoader().loadTestsFromTestCase(cls) \
+                          for cls in (TestTimeIndex,)])
+
+def run(runner=TextTestRunner, **args):
+    return runner(**args).run(suite())
+
+if __name__ == "__main__":
+    run(verbosity=2)
@@ -0,0 +1,149 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""A compact, columnar container for large numbers of date and time values.
+
+Rather than keeping a DateTime (with its nested date, time, offset, and
+units) for every value, a DateTimeArray stores each value as a single
+integer count of some resolution unit since 1970-01-01T00:00:00Z, plus two
+small parallel columns recording the original offset from UTC and the
+representation and accuracy of the value. DateTime objects are rebuilt only
+when individual values are accessed."""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from iso8601 import CalendarDate, OrdinalDate, WeekDate, \
+    UTCOffset, UTC, utc, Time, DateTime, \
+    day_number, calendar_date, week_date, floor_divmod
+
+__all__ = ["DateTimeArray"]
+
+try:
+    array("q")
+    INT64 = "q"
+except ValueError:
+    INT64 = "l" # Python 2 has no "q", but "l" is 64 bits on LP64 platforms
+
+# Special values for the offset column.
+LOCAL = -0x8000 # no offset from UTC; i.e., local time
+ZULU = -0x7FFF # UTC, represented with the UTC designator [Z]
+
+class DateTimeArray(object):
+    """A sequence of DateTime values stored as UTC-normalized instants.
+
+    Instants are integer counts of the chosen resolution, one of "s", "ms",
+    "us", or "ns"; any finer fraction of a second is truncated. Offsets are
+    stored in minutes. The accuracy column packs the kind of date (calendar,
+    ordinal, or week), the number of date and time components present, and
+    whether the offset included minutes, so that each value materializes in
+    its original form."""
+
+    resolutions = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}
+    dates = (CalendarDate, OrdinalDate, WeekDate)
+
+    def __init__(self, values=(), resolution="s"):
+        self.resolution = resolution
+        self.scale = self.resolutions[resolution]
+        self.instants = array(INT64)
+        self.offsets = array("h")
+        self.accuracy = array("B")
+        self.extend(values)
+
+    def instant(self, datetime):
+        """Return the instant of a DateTime at this array's resolution."""
+        return int(floor_divmod(datetime.epoch_seconds() * self.scale, 1)[0])
+
+    def append(self, datetime):
+        date, time = datetime.elements
+        hour, minute, second, offset = time.elements
+        code = (self.dates.index(type(date)) |
+                sum(1 for x in date.elements if x) << 2 |
+                sum(1 for x in (hour, minute, second) if x) << 4)
+        if isinstance(offset, UTC):
+            minutes = ZULU
+        elif offset.elements[0]:
+            minutes = int(offset.total_seconds()) // 60
+            if offset.elements[1]:
+                code |= 1 << 6
+        else:
+            minutes = LOCAL
+        self.instants.append(self.instant(datetime))
+        self.offsets.append(minutes)
+        self.accuracy.append(code)
+
+    def extend(self, datetimes):
+        for datetime in datetimes:
+            self.append(datetime)
+
+    def materialize(self, i):
+        """Build a DateTime from the i'th entry of the columns."""
+        instant, minutes, code = \
+            self.instants[i], self.offsets[i], self.accuracy[i]
+        if minutes == ZULU:
+            offset = utc
+        elif minutes == LOCAL:
+            offset = None
+        else:
+            instant += minutes * 60 * self.scale
+            hours = abs(minutes) // 60
+            offset = UTCOffset.from_ints(-hours if minutes < 0 else hours,
+                                         abs(minutes) % 60 if code & 1 << 6
+                                                          else None)
+
+        day, units = divmod(instant, 86400 * self.scale)
+        cls = self.dates[code & 3]
+        if cls is CalendarDate:
+            ymd = calendar_date(day)
+        elif cls is OrdinalDate:
+            year = calendar_date(day)[0]
+            ymd = (year, day - day_number(year) + 1)
+        else:
+            ymd = week_date(day)
+        date = cls.from_ints(*ymd[:code >> 2 & 3])
+
+        # The lowest-order time component takes any remainder as a fraction.
+        ntime = code >> 4 & 3
+        hms = []
+        for size in (3600, 60, 1)[:ntime]:
+            whole, units = divmod(units, size * self.scale)
+            hms.append(whole)
+        if ntime and units:
+            hms[-1] += Decimal(units) / (size * self.scale)
+        return DateTime.from_elements((date, Time.from_values(
+                    *(hms + [None]*(3 - ntime) + [offset]))))
+
+    def __len__(self):
+        return len(self.instants)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            obj = self.__new__(type(self))
+            obj.resolution, obj.scale = self.resolution, self.scale
+            obj.instants = self.instants[key]
+            obj.offsets = self.offsets[key]
+            obj.accuracy = self.accuracy[key]
+            return obj
+        else:
+            return self.materialize(key)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.materialize(i)
+
+    def key(self, value):
+        return value if isinstance(value, (int, long)) else self.instant(value)
+
+    def bisect_left(self, value, lo=0, hi=None):
+        """Locate the insertion point for a DateTime or an instant in a
+        sorted array, to the left of any equal instants."""
+        return bisect_left(self.instants, self.key(value),
+                           lo, len(self) if hi is None else hi)
+
+    def bisect_right(self, value, lo=0, hi=None):
+        """Like bisect_left, but to the right of any equal instants."""
+        return bisect_right(self.instants, self.key(value),
+                            lo, len(self) if hi is None else hi)
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (type(self).__name__, list(self), self.resolution)
@@ -0,0 +1,77 @@
+# -*- mode: Python; coding: utf-8 -*-
+
+"""A sorted index of time points supporting range queries by time interval.
+
+Each item in the index is keyed by a canonical instant: the number of
+seconds since 1970-01-01T00:00:00Z of a DateTime (see DateTime.epoch_seconds)
+or of the beginning of a date. Keys are computed once, when an item is
+added, and range queries are answered by binary search on the keys."""
+
+from bisect import bisect_left, bisect_right
+
+from iso8601 import TimeInterval
+
+__all__ = ["TimeIndex"]
+
+def instant(timepoint):
+    """Return the canonical instant of a time point."""
+    return timepoint.epoch_seconds()
+
+class TimeIndex(object):
+    """A sequence of items sorted by the instant of their time points.
+
+    If a key function is supplied, it is used to extract a time point from
+    each item; otherwise, the items must be time points themselves."""
+
+    def __init__(self, items=(), key=None):
+        self.key = key
+        # Bulk build: compute each key once, then sort on the keys alone.
+        # The sort is stable, so equal instants keep their input order.
+        pairs = sorted(((self.instant(item), item) for item in items),
+                       key=lambda pair: pair[0])
+        self.keys = [k for k, item in pairs]
+        self.items = [item for k, item in pairs]
+
+    def instant(self, item):
+        return instant(self.key(item) if self.key else item)
+
+    def append(self, item):
+        """Add an item to the index. Adding items in order (or nearly in
+        order) is cheap; out of order items are inserted in place."""
+        k = self.instant(item)
+        if not self.keys or k >= self.keys[-1]:
+            self.keys.append(k)
+            self.items.append(item)
+        else:
+            i = bisect_right(self.keys, k)
+            self.keys.insert(i, k)
+            self.items.insert(i, item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def indices(self, start, end=None):
+        """Return the half-open range of indices of items at or after start
+        and before end. The range may be given as a TimeInterval in any of
+        its forms, or as two time points; either time point may be None to
+        leave that side of the range open."""
+        if isinstance(start, TimeInterval):
+            start, end = start.endpoints()
+        return (0 if start is None else bisect_left(self.keys, instant(start)),
+                len(self.keys) if end is None \
+                    else bisect_left(self.keys, instant(end)))
+
+    def select(self, start, end=None):
+        """Return a list of the items in the given range; see indices."""
+        lo, hi = self.indices(start, end)
+        return self.items[lo:hi]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]